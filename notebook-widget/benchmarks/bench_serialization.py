@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+"""Benchmark the JSON serializers of save_json_files().
+
+Usage: python benchmarks/bench_serialization.py --points 2000000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from wizmap import wizmap
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, default=2000000)
+    parser.add_argument("--seed", type=int, default=202355)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    xs = rng.normal(0, 1, args.points)
+    ys = rng.normal(0, 1, args.points)
+    labels = rng.integers(0, 10, args.points)
+    texts = np.array([f"point {i} with some text" for i in range(args.points)])
+
+    grid_dict = wizmap.generate_contour_dict(
+        xs,
+        ys,
+        labels=labels,
+        group_names=[str(i) for i in range(10)],
+        density_engine="binned",
+    )
+
+    serializers = ["json"]
+    if wizmap.orjson is not None:
+        serializers.append("orjson")
+    else:
+        print("orjson is not installed, only benchmarking the stdlib json.")
+
+    for serializer in serializers:
+        with tempfile.TemporaryDirectory() as output_dir:
+            start = time.perf_counter()
+            wizmap.save_json_files(
+                wizmap.iter_data_rows(xs, ys, texts, labels=labels),
+                grid_dict,
+                output_dir=output_dir,
+                serializer=serializer,
+            )
+            elapsed = time.perf_counter() - start
+
+            data_size = os.path.getsize(os.path.join(output_dir, "data.ndjson"))
+            print(
+                f"{serializer:>6}: {elapsed:.2f}s for {args.points} points "
+                f"({data_size / 2**20:.1f} MiB)"
+            )
+
+
+if __name__ == "__main__":
+    main()
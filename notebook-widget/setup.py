@@ -7,9 +7,9 @@ from setuptools import setup, find_packages
 with open("README.md", "r", encoding="utf8") as readme_file:
     readme = readme_file.read()
 
-requirements = ["numpy", "ipython", "tqdm", "quadtreed3", "ndjson", "scikit-learn"]
+requirements = ["numpy", "ipython", "tqdm", "quadtreed3", "scikit-learn"]
 
-test_requirements: list[str] = []
+test_requirements: list[str] = ["ndjson"]
 
 # TODO: remember to update version in wizmap/__init__.py as well!
 version = "0.1.7"
@@ -41,6 +41,7 @@ setup(
         "Framework :: Jupyter :: JupyterLab :: 3",
     ],
     description="A Python package to run WizMap in your computational notebooks.",
+    entry_points={"console_scripts": ["wizmap=wizmap.cli:main"]},
     install_requires=requirements,
     license="MIT license",
     long_description=readme,
@@ -3,9 +3,19 @@
 """Tests for `wizmap` package."""
 
 
+import json
+import os
+import shlex
+import tempfile
 import unittest
+import urllib.error
+import urllib.request
 
-from wizmap import wizmap
+import ndjson
+import numpy as np
+
+from quadtreed3 import Quadtree
+from wizmap import cli, server, wizmap
 
 
 class TestWizmap(unittest.TestCase):
@@ -19,3 +29,833 @@ class TestWizmap(unittest.TestCase):
 
     def test_000_something(self):
         """Test something."""
+
+    def test_001_binned_density_engine(self):
+        """The binned engine should approximate the sklearn KDE engine."""
+        rng = np.random.default_rng(0)
+        xs = rng.normal(0, 1, 2000).tolist()
+        ys = rng.normal(0, 1, 2000).tolist()
+
+        kde_dict = wizmap.generate_contour_dict(xs, ys, grid_size=50)
+        binned_dict = wizmap.generate_contour_dict(
+            xs, ys, grid_size=50, density_engine="binned"
+        )
+
+        self.assertEqual(kde_dict.keys(), binned_dict.keys())
+        self.assertEqual(kde_dict["xRange"], binned_dict["xRange"])
+        self.assertEqual(binned_dict["sampleSize"], 2000)
+
+        kde_grid = np.array(kde_dict["grid"])
+        binned_grid = np.array(binned_dict["grid"])
+        self.assertLess(np.abs(kde_grid - binned_grid).max(), 0.01 * kde_grid.max())
+
+    def test_002_grouped_grid_density(self):
+        """Grouped density grids should match computing each group separately."""
+        rng = np.random.default_rng(1)
+        xs = rng.normal(0, 1, 500)
+        ys = rng.normal(0, 1, 500)
+        times = np.array(["2021", "2020", "2022"])[rng.integers(0, 3, 500)]
+        x_range, y_range = (-4.0, 4.0), (-4.0, 4.0)
+
+        grouped = wizmap.get_grouped_grid_density(
+            xs, ys, times, x_range, y_range, grid_size=30
+        )
+        self.assertEqual(list(grouped.keys()), ["2020", "2021", "2022"])
+
+        for key, (grid_density, size) in grouped.items():
+            mask = times == key
+            expected, _ = wizmap.get_grid_density(
+                xs[mask], ys[mask], x_range, y_range, grid_size=30
+            )
+            self.assertEqual(size, mask.sum())
+            np.testing.assert_array_equal(grid_density, expected)
+
+    def test_003_parallel_contour_dict(self):
+        """Computing group and time grids in parallel should not change results."""
+        rng = np.random.default_rng(2)
+        xs = rng.normal(0, 1, 300).tolist()
+        ys = rng.normal(0, 1, 300).tolist()
+        labels = rng.integers(0, 2, 300).tolist()
+        times = [str(2000 + i % 3) for i in range(300)]
+        kwargs = {
+            "grid_size": 20,
+            "labels": labels,
+            "group_names": ["a", "b"],
+            "times": times,
+        }
+
+        serial_dict = wizmap.generate_contour_dict(xs, ys, **kwargs)
+        parallel_dict = wizmap.generate_contour_dict(xs, ys, n_jobs=2, **kwargs)
+        self.assertEqual(serial_dict, parallel_dict)
+
+    def test_004_grid_encoding(self):
+        """Encoded grids should decode back to the original grid."""
+        rng = np.random.default_rng(3)
+        grid_density = rng.random((20, 30)) * 0.2
+
+        for grid_encoding, tolerance in [
+            ("json", 1e-4),
+            ("float16", 1e-4),
+            ("uint16", 1e-5),
+            ("uint8", 1e-3),
+        ]:
+            encoded = wizmap.encode_grid(grid_density, grid_encoding)
+            decoded = wizmap.decode_grid(encoded)
+            self.assertEqual(decoded.shape, (20, 30))
+            self.assertLess(np.abs(decoded - grid_density).max(), tolerance)
+
+    def test_005_contour_builder(self):
+        """Streaming chunks into ContourBuilder should match the binned engine."""
+        rng = np.random.default_rng(4)
+        xs = rng.normal(0, 1, 1000)
+        ys = rng.normal(0, 2, 1000)
+        labels = rng.integers(0, 2, 1000)
+        times = np.array(["2020", "2021"])[rng.integers(0, 2, 1000)]
+
+        expected = wizmap.generate_contour_dict(
+            xs,
+            ys,
+            grid_size=30,
+            labels=labels.tolist(),
+            group_names=["a", "b"],
+            times=times.tolist(),
+            density_engine="binned",
+        )
+
+        builder = wizmap.ContourBuilder(
+            (xs.min(), xs.max()),
+            (ys.min(), ys.max()),
+            grid_size=30,
+            group_names=["a", "b"],
+        )
+        for i in range(0, 1000, 300):
+            chunk = slice(i, i + 300)
+            builder.partial_fit(xs[chunk], ys[chunk], labels[chunk], times[chunk])
+
+        self.assertEqual(builder.finalize(), expected)
+
+    def test_006_top_n_sparse(self):
+        """Top n values should be sorted per row and padded with -1."""
+        matrix = wizmap.csr_matrix(
+            np.array([[0.1, 0.0, 0.5, 0.3], [0.0, 0.0, 0.0, 0.0], [0.0, 0.2, 0.0, 0.0]])
+        )
+        indices, values = wizmap.top_n_sparse(matrix, 2)
+
+        np.testing.assert_array_equal(indices, [[2, 3], [-1, -1], [1, -1]])
+        np.testing.assert_allclose(values, [[0.5, 0.3], [0, 0], [0.2, 0]])
+        np.testing.assert_allclose(wizmap.top_n_values_sparse(matrix, indices), values)
+
+        # Ties are ordered by ascending column index
+        matrix = wizmap.csr_matrix(np.array([[0.2, 0.5, 0.2, 0.5, 0.2]]))
+        indices, values = wizmap.top_n_sparse(matrix, 4)
+
+        np.testing.assert_array_equal(indices, [[1, 3, 0, 2]])
+        np.testing.assert_allclose(values, [[0.5, 0.5, 0.2, 0.2]])
+
+    def test_007_aggregate_tile_counts(self):
+        """Aggregated tiles should match tiles merged from the quadtree."""
+        rng = np.random.default_rng(5)
+        xs = rng.normal(0, 1, 300)
+        ys = rng.normal(0, 1, 300)
+        data = [{"x": x, "y": y, "pid": i} for i, (x, y) in enumerate(zip(xs, ys))]
+        count_mat = wizmap.csr_matrix(rng.integers(0, 3, (300, 20)))
+
+        def get_tree_tiles(level):
+            tree = Quadtree()
+            tree.add_all_data(data)
+            root = tree.get_node_representation()
+            rows, columns, row_pos_map = wizmap.merge_leaves_before_level(root, level)
+            tile_mat = wizmap.csr_matrix(
+                (np.ones(len(rows), dtype=np.int64), (rows, columns)),
+                shape=(len(row_pos_map), 300),
+            )
+            return root, tile_mat @ count_mat, row_pos_map
+
+        root, tile_count_mat, _ = get_tree_tiles(6)
+        tile_cells = wizmap.get_tile_cells(root, 6)
+
+        for level in range(5, 2, -1):
+            tile_count_mat, tile_cells = wizmap.aggregate_tile_counts(
+                tile_count_mat, tile_cells
+            )
+            _, expected_count_mat, expected_pos_map = get_tree_tiles(level)
+
+            self.assertEqual(
+                wizmap.get_tile_positions(tile_cells, root.position, level),
+                expected_pos_map,
+            )
+            self.assertEqual((tile_count_mat != expected_count_mat).nnz, 0)
+
+    def test_008_morton_tiles(self):
+        """Morton tiles should match the quadtree's extent, tiles, and order."""
+        rng = np.random.default_rng(6)
+        xs = rng.normal(-3, 2, 500)
+        ys = rng.normal(10, 1, 500)
+        data = [{"x": x, "y": y, "pid": i} for i, (x, y) in enumerate(zip(xs, ys))]
+
+        tree = Quadtree()
+        tree.add_all_data(data)
+        tree_extent = wizmap.get_tree_extent(xs, ys)
+        self.assertEqual(tree_extent, tree.extent())
+
+        root = tree.get_node_representation()
+        rows, columns, row_pos_map = wizmap.merge_leaves_before_level(root, 7)
+
+        tile_rows, tile_cells = wizmap.get_point_tiles(xs, ys, tree_extent, 7)
+        tree_position = tree_extent[0] + tree_extent[1]
+        self.assertEqual(
+            wizmap.get_tile_positions(tile_cells, tree_position, 7), row_pos_map
+        )
+        np.testing.assert_array_equal(tile_rows[columns], rows)
+
+    def test_009_parallel_topic_dict(self):
+        """Extracting topic levels in parallel should not change results."""
+        rng = np.random.default_rng(7)
+        words = np.array(["apple", "banana", "cherry", "grape", "lemon", "mango"])
+        xs = rng.normal(0, 1, 300).tolist()
+        ys = rng.normal(0, 1, 300).tolist()
+        texts = [" ".join(rng.choice(words, 5)) for _ in range(300)]
+
+        serial_dict = wizmap.generate_topic_dict(xs, ys, texts, max_zoom_scale=5)
+        parallel_dict = wizmap.generate_topic_dict(
+            xs, ys, texts, max_zoom_scale=5, n_jobs=2
+        )
+        self.assertEqual(serial_dict, parallel_dict)
+
+        # Worker vocabularies are variable-length, so a long token stays cheap
+        strings = ["apple", "", "x" * 10000, "caf\u00e9"]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path_prefix = os.path.join(temp_dir, "ngrams")
+            wizmap.save_string_array(strings, path_prefix)
+            string_array = wizmap.load_string_array(path_prefix)
+
+            self.assertEqual(len(string_array), 4)
+            self.assertEqual(string_array[-1], "caf\u00e9")
+            self.assertEqual(list(string_array), strings)
+            self.assertEqual(string_array[np.array([2, 0])].tolist(), strings[2::-2])
+            self.assertLess(os.path.getsize(path_prefix + "-bytes.npy"), 11000)
+            del string_array
+
+    def test_010_hashing_count_backend(self):
+        """The hashing backend should stream batches and name its features."""
+        texts = ["apple banana apple", "banana cherry", "the cherry grape"]
+        count_mat, ngrams = wizmap.build_count_matrix(
+            (t for t in texts), count_backend="hashing", n_features=2**10, batch_size=2
+        )
+
+        self.assertEqual(count_mat.shape, (3, 2**10))
+        first_row = count_mat[0]
+        self.assertEqual(
+            dict(zip(ngrams[first_row.indices], first_row.data)),
+            {"apple": 2, "banana": 1},
+        )
+        self.assertEqual(
+            set(ngrams[count_mat.indices]), {"apple", "banana", "cherry", "grape"}
+        )
+
+    def test_011_count_cache(self):
+        """Count matrices should be cached by content and evicted by size."""
+        texts = ["apple banana apple", "banana cherry", "cherry grape"]
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            count_mat, ngrams = wizmap.build_count_matrix(texts, cache_dir=cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+            cached_mat, cached_ngrams = wizmap.build_count_matrix(
+                texts, cache_dir=cache_dir
+            )
+            self.assertEqual((cached_mat != count_mat).nnz, 0)
+            self.assertEqual(list(cached_ngrams), list(ngrams))
+            entry_dir = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+            self.assertTrue(os.path.isfile(os.path.join(entry_dir, "ngrams-bytes.npy")))
+
+            # A different corpus evicts the older entry when the cache is full
+            wizmap.build_count_matrix(texts[:2], cache_dir=cache_dir, cache_max_bytes=1)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+            # Lambdas share one name, so they cannot key the cache
+            with self.assertRaises(ValueError):
+                wizmap.build_count_matrix(
+                    texts, cache_dir=cache_dir, analyzer=lambda t: t.split()
+                )
+
+            # Module-level functions can be cached
+            wizmap.build_count_matrix(texts, cache_dir=cache_dir, analyzer=shlex.split)
+
+    def test_012_parallel_tokenization(self):
+        """Sharded tokenization should match a single vectorizer."""
+        texts = ["apple banana apple", "the banana cherry", "cherry grape", "the"]
+
+        count_mat, ngrams = wizmap.build_count_matrix(texts, ngram_range=(1, 2))
+        sharded_mat, sharded_ngrams = wizmap.build_count_matrix(
+            texts, ngram_range=(1, 2), n_jobs=2, batch_size=1
+        )
+        self.assertEqual((sharded_mat != count_mat).nnz, 0)
+        self.assertEqual(list(sharded_ngrams), list(ngrams))
+
+        # A custom analyzer replaces the default tokenizer
+        count_mat, ngrams = wizmap.build_count_matrix(texts, analyzer=str.split)
+        self.assertIn("the", list(ngrams))
+        self.assertEqual(count_mat.sum(), 9)
+
+        # Errors other than an empty batch are not swallowed
+        with self.assertRaisesRegex(ValueError, "invalid literal"):
+            wizmap.build_count_matrix(texts, analyzer=int, n_jobs=2, batch_size=1)
+
+        # Texts without any words fail like a single vectorizer
+        for n_jobs in [1, 2]:
+            with self.assertRaisesRegex(ValueError, "empty vocabulary"):
+                wizmap.build_count_matrix(["the", "a"], n_jobs=n_jobs, batch_size=1)
+
+    def test_013_compact_topic_encoding(self):
+        """Compact topics should decode to the same [x, y, name] tiles."""
+        rng = np.random.default_rng(7)
+        words = np.array(["apple", "banana", "cherry", "grape", "lemon", "mango"])
+        xs = rng.normal(0, 1, 300).tolist()
+        ys = rng.normal(0, 1, 300).tolist()
+        texts = [" ".join(rng.choice(words, 5)) for _ in range(300)]
+
+        topic_dict = wizmap.generate_topic_dict(xs, ys, texts, max_zoom_scale=5)
+        compact_dict = wizmap.generate_topic_dict(
+            xs, ys, texts, max_zoom_scale=5, topic_encoding="compact"
+        )
+        self.assertEqual(compact_dict["encoding"], "compact")
+        self.assertLessEqual(len(compact_dict["terms"]), len(words))
+        self.assertEqual(wizmap.decode_topic_levels(compact_dict), topic_dict["data"])
+
+    def test_014_streaming_ndjson(self):
+        """Streamed data rows should be written the same as ndjson.dump()."""
+        xs = np.array([0.5, 1.25, -2.0])
+        ys = np.array([1.0, 0.0, 3.5])
+        texts = ["a", 'b "quoted"', "c"]
+        labels = np.array([0, 1, 1])
+
+        data_list = wizmap.generate_data_list(xs, ys, texts, labels=labels)
+        self.assertEqual(data_list[1], [1.25, 0.0, 'b "quoted"', "", 1])
+
+        with tempfile.TemporaryFile("w+", encoding="utf8") as fp:
+            row_num = wizmap.write_ndjson(
+                wizmap.iter_data_rows(xs, ys, texts, labels=labels), fp, chunk_size=2
+            )
+            fp.seek(0)
+            self.assertEqual(row_num, 3)
+            self.assertEqual(fp.read(), ndjson.dumps(data_list))
+
+    def test_015_point_binary_format(self):
+        """Binary point files should round trip rows with float32 coordinates."""
+        rows = [[0.5, 1.0, "a", "2020", 0], [1.25, -2.0, "中文 text", "", 2]]
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            wizmap.save_json_files(iter(rows), {}, output_dir, data_format="binary")
+
+            with open(os.path.join(output_dir, "data.bin"), "rb") as fp:
+                self.assertEqual(wizmap.read_point_binary(fp), rows)
+
+    def test_016_point_shards(self):
+        """Sharded points should cover every point once in Morton order."""
+        rng = np.random.default_rng(7)
+        xs = rng.normal(0, 1, 500).tolist()
+        ys = rng.normal(0, 1, 500).tolist()
+        texts = [f"text {i}" for i in range(500)]
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            manifest = wizmap.save_point_shards(
+                xs, ys, texts, output_dir=output_dir, sample_size=50
+            )
+            mortons = [tile["morton"] for tile in manifest["tiles"]]
+            self.assertEqual(mortons, sorted(mortons))
+
+            loaded_texts = []
+            for entry in [manifest["sample"]] + manifest["tiles"]:
+                start, end = entry["byteRange"]
+                with open(os.path.join(output_dir, entry["file"]), "rb") as fp:
+                    fp.seek(start)
+                    rows = ndjson.loads(fp.read(end - start).decode("utf8"))
+
+                self.assertEqual(len(rows), entry["count"])
+                loaded_texts.extend([row[2] for row in rows])
+
+            self.assertEqual(sorted(loaded_texts), sorted(texts))
+
+        # A failed write closes the shard file and does not write a manifest
+        with tempfile.TemporaryDirectory() as output_dir:
+            with self.assertRaises(TypeError):
+                wizmap.save_point_shards(
+                    xs,
+                    ys,
+                    texts[:-1] + [object()],
+                    output_dir=output_dir,
+                    sample_size=0,
+                )
+            self.assertNotIn("manifest.json", os.listdir(output_dir))
+
+    def test_017_array_inputs(self):
+        """Numpy array inputs should give the same results as lists."""
+        rng = np.random.default_rng(7)
+        words = np.array(["apple", "banana", "cherry", "grape", "lemon", "mango"])
+        xs = rng.normal(0, 1, 300).astype(np.float32)
+        ys = rng.normal(0, 1, 300).astype(np.float32)
+        texts = np.array([" ".join(rng.choice(words, 5)) for _ in range(300)])
+        labels = rng.integers(0, 2, 300)
+
+        list_dict = wizmap.generate_grid_dict(
+            xs.tolist(),
+            ys.tolist(),
+            texts.tolist(),
+            "test",
+            labels=labels.tolist(),
+            group_names=["a", "b"],
+        )
+        array_dict = wizmap.generate_grid_dict(
+            xs, ys, texts, "test", labels=labels, group_names=["a", "b"]
+        )
+        self.assertEqual(list_dict, array_dict)
+
+        data_list = wizmap.generate_data_list(xs, ys, texts, labels=labels)
+        self.assertIsInstance(data_list[0][0], float)
+        self.assertIsInstance(data_list[0][4], int)
+
+        # Floating coordinates are not copied to float64
+        with tempfile.TemporaryDirectory() as output_dir:
+            xs_path = os.path.join(output_dir, "xs.npy")
+            np.save(xs_path, xs)
+            mmap_xs = np.load(xs_path, mmap_mode="r")
+            float_xs = wizmap._as_float_array(mmap_xs)
+            self.assertEqual(float_xs.dtype, np.float32)
+            self.assertTrue(np.shares_memory(float_xs, mmap_xs))
+            del float_xs, mmap_xs
+
+        self.assertEqual(wizmap._as_float_array([1, 2]).dtype, np.float64)
+
+        # Chunked binning and quantization match one chunk
+        grid_range = (-5.0, 5.0)
+        self.assertTrue(
+            np.allclose(
+                wizmap.bin_points(xs, ys, grid_range, grid_range, 20, chunk_size=7),
+                wizmap.bin_points(xs, ys, grid_range, grid_range, 20),
+            )
+        )
+        tree_extent = wizmap.get_tree_extent(xs, ys)
+        self.assertTrue(
+            np.array_equal(
+                wizmap.get_point_cells(xs, ys, tree_extent, 5, chunk_size=7),
+                wizmap.get_point_cells(xs.tolist(), ys.tolist(), tree_extent, 5),
+            )
+        )
+
+        # Pandas Series and pyarrow arrays
+        import pandas as pd
+
+        series_dict = wizmap.generate_grid_dict(
+            pd.Series(xs),
+            pd.Series(ys),
+            pd.Series(texts),
+            "test",
+            labels=pd.Series(labels),
+            group_names=["a", "b"],
+        )
+        self.assertEqual(list_dict, series_dict)
+
+        try:
+            import pyarrow as pa
+        except ImportError:
+            self.skipTest("pyarrow is not installed")
+
+        arrow_dict = wizmap.generate_grid_dict(
+            pa.array(xs),
+            pa.chunked_array([ys[:100], ys[100:]]),
+            pa.array(texts),
+            "test",
+            labels=pa.array(labels),
+            group_names=["a", "b"],
+        )
+        self.assertEqual(list_dict, arrow_dict)
+
+    def test_018_build_from_files(self):
+        """Building from on-disk files should match building from lists."""
+        rng = np.random.default_rng(7)
+        words = np.array(["apple", "banana", "cherry", "grape", "lemon", "mango"])
+        coordinates = rng.normal(0, 1, (300, 2)).astype(np.float32)
+        texts = [" ".join(rng.choice(words, 5)) for _ in range(300)]
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            coordinates_path = os.path.join(output_dir, "coordinates.npy")
+            texts_path = os.path.join(output_dir, "texts.txt")
+            np.save(coordinates_path, coordinates)
+            with open(texts_path, "w", encoding="utf8") as fp:
+                fp.write("\n".join(texts))
+
+            text_file = wizmap.LineTextFile(texts_path)
+            self.assertEqual(len(text_file), 300)
+            self.assertEqual(text_file[299], texts[299])
+            self.assertEqual(list(text_file), texts)
+
+            # Batched and negative indexes
+            self.assertEqual(text_file[-1], texts[-1])
+            taken_texts = text_file.take([5, -300, 2])
+            self.assertEqual(taken_texts, [texts[5], texts[0], texts[2]])
+            taken_texts = wizmap._take_values(text_file, [7, 3])
+            self.assertEqual(taken_texts, [texts[7], texts[3]])
+            with self.assertRaises(IndexError):
+                text_file[300]
+
+            # Only "\n" ends a line, and one trailing "\r" is stripped
+            crlf_path = os.path.join(output_dir, "crlf.txt")
+            with open(crlf_path, "wb") as fp:
+                fp.write(b"first\rline\nsecond\r\nthird\r\r\n")
+
+            crlf_file = wizmap.LineTextFile(crlf_path)
+            self.assertEqual(list(crlf_file), [crlf_file[i] for i in range(3)])
+            self.assertEqual(list(crlf_file), ["first\rline", "second", "third\r"])
+
+            grid_dict = wizmap.build_from_files(
+                coordinates_path, texts_path, output_dir, embedding_name="test"
+            )
+            list_dict = wizmap.generate_grid_dict(
+                coordinates[:, 0].tolist(), coordinates[:, 1].tolist(), texts, "test"
+            )
+            self.assertEqual(grid_dict, list_dict)
+
+            with open(os.path.join(output_dir, "data.ndjson"), encoding="utf8") as fp:
+                self.assertEqual(len(ndjson.load(fp)), 300)
+
+    def test_019_json_serializer(self):
+        """Serializers should support numpy values and give the same JSON."""
+        grid_dict = {"grid": np.array([[0.5, 1.0]]), "data": {3: [np.int64(1)]}}
+        expected = {"grid": [[0.5, 1.0]], "data": {"3": [1]}}
+
+        for serializer in ["json", "auto"]:
+            dumps = wizmap.get_json_serializer(serializer)
+            self.assertEqual(json.loads(dumps(grid_dict)), expected)
+
+        with self.assertRaises(ValueError):
+            wizmap.get_json_serializer("yaml")
+
+        # The default output is the same as the stdlib json module
+        grid_dict = {"grid": [[0.5, float("nan")]], "embeddingName": "test"}
+        with tempfile.TemporaryDirectory() as output_dir:
+            wizmap.save_json_files([[0.0, 1.0, "a"]], grid_dict, output_dir)
+            with open(os.path.join(output_dir, "grid.json"), encoding="utf8") as fp:
+                self.assertEqual(fp.read(), json.dumps(grid_dict))
+
+    def test_020_json_point_records(self):
+        """Json point texts should be extracted once and carried in data rows."""
+        records = [{"t": "apple", "i": "a.png"}, '{"t": "banana"}', "plain text"]
+        labels = [0, 0, 1]
+        config = {"textKey": "t", "groupLabels": [0]}
+
+        texts = wizmap.get_json_point_texts(records, "t", labels, [0])
+        self.assertEqual(list(texts), ["apple", "banana", "plain text"])
+
+        # Texts are parsed again on every pass instead of being kept in a list
+        self.assertIsInstance(texts, wizmap.JsonPointTexts)
+        self.assertEqual([texts[i] for i in range(3)], list(texts))
+
+        # Without labels, all records are json points
+        json_records = ['{"t": "a"}', '{"t": "b"}']
+        json_texts = wizmap.get_json_point_texts(json_records, "t", None, [1])
+        self.assertEqual(list(json_texts), ["a", "b"])
+
+        data_list = wizmap.generate_data_list(
+            [0.0, 1.0, 2.0],
+            [0.0, 1.0, 2.0],
+            records,
+            labels=labels,
+            json_point_content_config=config,
+        )
+        self.assertEqual(json.loads(data_list[0][2]), records[0])
+        self.assertEqual([row[5] for row in data_list], list(texts))
+
+        rows = list(wizmap.iter_data_rows([0.0], [0.0], ["a"], search_texts=["a"]))
+        self.assertEqual(rows, [[0.0, 0.0, "a", "", None, "a"]])
+
+        # File builds carry the search texts of json points
+        with tempfile.TemporaryDirectory() as output_dir:
+            coordinates_path = os.path.join(output_dir, "coordinates.npy")
+            texts_path = os.path.join(output_dir, "texts.txt")
+            np.save(coordinates_path, np.array([[0, 0], [1, 1], [2, 0]], np.float32))
+            with open(texts_path, "w", encoding="utf8") as fp:
+                fp.write('{"t": "apple"}\n{"t": "banana"}\n{"t": "cherry"}')
+
+            wizmap.build_from_files(
+                coordinates_path,
+                texts_path,
+                output_dir,
+                json_point_content_config={"textKey": "t"},
+                cache_dir=os.path.join(output_dir, "cache"),
+            )
+
+            with open(os.path.join(output_dir, "data.ndjson"), encoding="utf8") as fp:
+                rows = ndjson.load(fp)
+            self.assertEqual([row[5] for row in rows], ["apple", "banana", "cherry"])
+
+    def test_021_bundle_server(self):
+        """The shared server should serve in-memory routes."""
+        wizmap_server = server.get_server()
+        self.assertIs(wizmap_server, server.get_server())
+
+        url = wizmap_server.add_route("/test.js", b"console.log(1);", "text/javascript")
+        with urllib.request.urlopen(url) as response:
+            self.assertEqual(response.read(), b"console.log(1);")
+            self.assertEqual(response.headers["Content-Type"], "text/javascript")
+
+        os.environ["WIZMAP_ALLOWED_ORIGINS"] = "http://a.test, http://b.test"
+        try:
+            origins = server.get_notebook_origins()
+        finally:
+            del os.environ["WIZMAP_ALLOWED_ORIGINS"]
+        self.assertEqual(origins[:2], ["http://a.test", "http://b.test"])
+
+    def test_022_data_server(self):
+        """Served files should support ranges, ETags, and precompressed files."""
+        with tempfile.TemporaryDirectory() as output_dir:
+            with open(os.path.join(output_dir, "data.ndjson"), "w") as fp:
+                fp.write('[0.0, 1.0, "a"]\n[1.0, 0.0, "b"]')
+            with open(os.path.join(output_dir, "grid.json"), "w") as fp:
+                fp.write("{}")
+
+            server.precompress_files(output_dir, encodings=["gzip"])
+            data_url, grid_url = server.serve_directory(output_dir)
+
+            request = urllib.request.Request(data_url, headers={"Range": "bytes=0-14"})
+            with urllib.request.urlopen(request) as response:
+                self.assertEqual(response.status, 206)
+                self.assertEqual(response.read(), b'[0.0, 1.0, "a"]')
+
+            request = urllib.request.Request(
+                grid_url, headers={"Accept-Encoding": "gzip"}
+            )
+            with urllib.request.urlopen(request) as response:
+                self.assertEqual(response.headers["Content-Encoding"], "gzip")
+                etag = response.headers["ETag"]
+
+            request = urllib.request.Request(
+                grid_url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag}
+            )
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                urllib.request.urlopen(request)
+            self.assertEqual(context.exception.code, 304)
+
+            # Only allowed origins can read the data from other pages
+            wizmap_server = server.get_server()
+            wizmap_server.allowed_origins.add("http://localhost:8888")
+
+            for origin, allowed_origin in [
+                ("http://localhost:8888", "http://localhost:8888"),
+                ("http://example.com", None),
+            ]:
+                request = urllib.request.Request(data_url, headers={"Origin": origin})
+                with urllib.request.urlopen(request) as response:
+                    self.assertEqual(
+                        response.headers["Access-Control-Allow-Origin"],
+                        allowed_origin,
+                    )
+
+            wizmap_server.allowed_origins.discard("http://localhost:8888")
+
+            # A stale compressed variant should not be served
+            grid_path = os.path.join(output_dir, "grid.json")
+            with open(grid_path, "w") as fp:
+                fp.write('{"new": 1}')
+            gzip_mtime = os.stat(grid_path + ".gz").st_mtime_ns
+            os.utime(grid_path, ns=(gzip_mtime + 10**9, gzip_mtime + 10**9))
+
+            request = urllib.request.Request(
+                grid_url, headers={"Accept-Encoding": "gzip"}
+            )
+            with urllib.request.urlopen(request) as response:
+                self.assertIsNone(response.headers["Content-Encoding"])
+                self.assertEqual(response.read(), b'{"new": 1}')
+
+    def test_023_memory_urls(self):
+        """In-memory data should be streamed without writing files."""
+        data_list = [[0.0, 1.0, "a"], [1.0, 0.0, "b"]]
+        data_url, grid_url = wizmap._get_memory_urls(data_list, {"a": 1}, "json")
+
+        with urllib.request.urlopen(data_url) as response:
+            self.assertEqual(ndjson.loads(response.read().decode()), data_list)
+
+        with urllib.request.urlopen(grid_url) as response:
+            self.assertEqual(json.loads(response.read()), {"a": 1})
+
+        # Rows from a function are generated again on every request
+        xs, ys, texts = np.array([0.0, 1.0]), np.array([1.0, 0.0]), ["a", "b"]
+        data_url, _ = wizmap._get_memory_urls(
+            lambda: wizmap.iter_data_rows(xs, ys, texts), {}, "json"
+        )
+        for _ in range(2):
+            with urllib.request.urlopen(data_url) as response:
+                self.assertEqual(ndjson.loads(response.read().decode()), data_list)
+
+        with self.assertRaises(ValueError):
+            wizmap._get_memory_urls(iter(data_list), {}, "json")
+
+        # Routes of older maps should be removed
+        for _ in range(wizmap.MAX_MEMORY_MAPS):
+            wizmap._get_memory_urls(data_list, {}, "json")
+
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            urllib.request.urlopen(data_url)
+        self.assertEqual(context.exception.code, 404)
+
+    def test_024_append_grid_points(self):
+        """Appending points should match a full build except for stale topics."""
+        rng = np.random.default_rng(2)
+        xs = rng.normal(0, 3, 1000)
+        ys = rng.normal(0, 3, 1000)
+        words = [f"word{i}" for i in range(100)]
+        texts = [" ".join(rng.choice(words, 5)) for _ in range(1000)]
+        x_domain = (np.min(xs), np.max(xs))
+        y_domain = (np.min(ys), np.max(ys))
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            state_dir = os.path.join(temp_dir, "state")
+            output_dir = os.path.join(temp_dir, "output")
+            os.makedirs(output_dir)
+
+            wizmap.build_grid_state(
+                xs[:800],
+                ys[:800],
+                texts[:800],
+                state_dir,
+                output_dir,
+                x_domain=x_domain,
+                y_domain=y_domain,
+            )
+
+            # A failed append keeps the old state, and its rows are dropped when
+            # the append is retried
+            topic_save = wizmap.TopicBuilder.save
+
+            def fail_save(builder, state_dir):
+                raise OSError("No space left on device")
+
+            wizmap.TopicBuilder.save = fail_save
+            try:
+                with self.assertRaises(OSError):
+                    wizmap.append_grid_points(
+                        state_dir,
+                        xs[800:],
+                        ys[800:],
+                        texts[800:],
+                        output_dir=output_dir,
+                    )
+            finally:
+                wizmap.TopicBuilder.save = topic_save
+
+            state_names = sorted(os.listdir(state_dir))
+            self.assertEqual(len(state_names), 2)
+            self.assertEqual(state_names[0], "current")
+
+            grid_dict = wizmap.append_grid_points(
+                state_dir, xs[800:], ys[800:], texts[800:], output_dir=output_dir
+            )
+            full_dict = wizmap.build_grid_state(
+                xs, ys, texts, os.path.join(temp_dir, "full-state")
+            )
+
+            with open(os.path.join(output_dir, "data.ndjson"), "r") as fp:
+                data_list = ndjson.load(fp)
+
+            # Vocabularies are saved as variable-length strings
+            version_dir = wizmap._get_state_version_dir(state_dir)
+            ngram_path = os.path.join(version_dir, "ngrams-bytes.npy")
+            self.assertTrue(os.path.isfile(ngram_path))
+            self.assertEqual(len(os.listdir(state_dir)), 2)
+
+            # Points outside the domain need a new build
+            with self.assertRaises(ValueError):
+                wizmap.append_grid_points(state_dir, [100.0], [100.0], ["far away"])
+
+        self.assertEqual(len(data_list), 1000)
+        self.assertEqual(data_list[800][2], texts[800])
+        self.assertEqual(grid_dict["grid"], full_dict["grid"])
+        self.assertEqual(grid_dict["totalPointSize"], 1000)
+        self.assertEqual(grid_dict["topic"]["extent"], full_dict["topic"]["extent"])
+
+        # Tiles with new points are re-scored the same as a full rebuild
+        tree_extent = grid_dict["topic"]["extent"]
+
+        for level, topics in full_dict["topic"]["data"].items():
+            self.assertEqual(len(grid_dict["topic"]["data"][level]), len(topics))
+
+            new_cells = wizmap.get_point_cells(xs[800:], ys[800:], tree_extent, level)
+            new_cells = set(map(tuple, new_cells.tolist()))
+            appended_names = {
+                (x, y): name for x, y, name in grid_dict["topic"]["data"][level]
+            }
+            rescored_num = 0
+
+            for x, y, name in topics:
+                cell = wizmap.get_point_cells([x], [y], tree_extent, level)[0]
+                if tuple(cell.tolist()) in new_cells:
+                    self.assertEqual(appended_names[(x, y)], name)
+                    rescored_num += 1
+
+            self.assertGreater(rescored_num, 0)
+
+    def test_025_cli_build(self):
+        """The build command should resume from its stage checkpoints."""
+        rng = np.random.default_rng(8)
+        words = np.array(["apple", "banana", "cherry", "grape", "lemon", "mango"])
+        coordinates = rng.normal(0, 1, (300, 2)).astype(np.float32)
+        texts = [" ".join(rng.choice(words, 5)) for _ in range(300)]
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            coordinates_path = os.path.join(temp_dir, "coordinates.npy")
+            texts_path = os.path.join(temp_dir, "texts.txt")
+            output_dir = os.path.join(temp_dir, "output")
+            work_dir = os.path.join(output_dir, ".wizmap-build")
+            np.save(coordinates_path, coordinates)
+            with open(texts_path, "w", encoding="utf8") as fp:
+                fp.write("\n".join(texts))
+
+            argv = ["build", "--coordinates", coordinates_path, "--texts", texts_path]
+            argv += ["-o", output_dir, "--embedding-name", "test"]
+            cli.main(argv)
+
+            with open(os.path.join(output_dir, "grid.json"), "rb") as fp:
+                grid_json = fp.read()
+
+            list_dict = wizmap.generate_grid_dict(
+                coordinates[:, 0], coordinates[:, 1], texts, "test"
+            )
+            self.assertEqual(json.loads(grid_json), json.loads(json.dumps(list_dict)))
+
+            # The vocabulary is saved as variable-length strings
+            count_dir = [d for d in os.listdir(work_dir) if d.startswith("counts-")][0]
+            count_dir = os.path.join(work_dir, count_dir)
+            self.assertIn("ngrams-bytes.npy", os.listdir(count_dir))
+
+            # Interrupt the topic stage after its first level
+            topic_dir = [d for d in os.listdir(work_dir) if d.startswith("topics-")][0]
+            topic_dir = os.path.join(work_dir, topic_dir)
+            os.remove(os.path.join(topic_dir, "done"))
+            level_names = sorted(n for n in os.listdir(topic_dir) if "level" in n)
+            for name in level_names[1:]:
+                os.remove(os.path.join(topic_dir, name))
+
+            cli.main(argv)
+            with open(os.path.join(output_dir, "grid.json"), "rb") as fp:
+                self.assertEqual(fp.read(), grid_json)
+
+            # Changing a contour parameter should keep the other stages
+            stage_dirs = set(os.listdir(work_dir))
+            cli.main(argv + ["--grid-size", "100"])
+            new_stage_dirs = set(os.listdir(work_dir))
+            removed_dirs = list(stage_dirs - new_stage_dirs)
+            self.assertEqual(len(removed_dirs), 1)
+            self.assertTrue(removed_dirs[0].startswith("contours-"))
+
+            # The dtype of a raw coordinate file is part of the stage keys
+            raw_path = os.path.join(temp_dir, "coordinates.bin")
+            coordinates.tofile(raw_path)
+            raw_argv = ["build", "--coordinates", raw_path, "--texts", texts_path]
+            raw_argv += ["-o", output_dir, "--embedding-name", "test"]
+            cli.main(raw_argv + ["--coordinates-dtype", "float32"])
+            stage_dirs = set(os.listdir(work_dir))
+            cli.main(raw_argv + ["--coordinates-dtype", "<f4"])
+            new_stage_dirs = set(os.listdir(work_dir)) - stage_dirs
+            self.assertEqual(
+                sorted(d.split("-")[0] for d in new_stage_dirs), ["contours", "topics"]
+            )
@@ -5,3 +5,4 @@ __email__ = "jayw@zijie.wang"
 __version__ = "0.1.7"
 
 from wizmap.wizmap import *
+from wizmap.server import *
@@ -0,0 +1,477 @@
+"""The wizmap command-line interface.
+
+Usage: wizmap build --coordinates coordinates.npy --texts texts.txt -o output/
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from os.path import join
+from tqdm import tqdm
+from scipy.sparse import csr_matrix
+from wizmap.wizmap import (
+    LineTextFile,
+    ParquetTextColumn,
+    StringArray,
+    _json_default,
+    aggregate_tile_counts,
+    build_count_matrix,
+    generate_contour_dict,
+    get_level_topics,
+    get_point_tiles,
+    get_tree_extent,
+    iter_data_rows,
+    load_coordinates,
+    load_csr_arrays,
+    load_string_array,
+    make_topic_dict,
+    save_csr_arrays,
+    save_json_files,
+    save_string_array,
+    select_topic_levels,
+)
+
+
+def get_file_fingerprint(path: str | None) -> list | None:
+    """Identify an input file by its path, size, and modification time.
+
+    Args:
+        path (str | None): Path to the file
+
+    Returns:
+        list | None: [real path, size, mtime in ns], or None if there is no file
+    """
+    if path is None:
+        return None
+
+    stat = os.stat(path)
+    return [os.path.realpath(path), stat.st_size, stat.st_mtime_ns]
+
+
+def get_stage_dir(work_dir: str, stage: str, settings: dict) -> str:
+    """Get the checkpoint directory of a stage. The directory is keyed by a hash
+    of the stage's settings, so changing a setting invalidates this stage and
+    every stage that depends on it.
+
+    Args:
+        work_dir (str): Directory of all checkpoints
+        stage (str): Name of the stage
+        settings (dict): Inputs and parameters that the stage's output depends
+            on, including the keys of upstream stages
+
+    Returns:
+        str: The checkpoint directory, e.g., "work_dir/topics-<key>"
+    """
+    key = hashlib.sha256(
+        json.dumps(settings, sort_keys=True, default=_json_default).encode()
+    ).hexdigest()[:16]
+
+    return join(work_dir, f"{stage}-{key}")
+
+
+def is_stage_done(stage_dir: str) -> bool:
+    """Check if a stage has completed in its checkpoint directory."""
+    return os.path.isfile(join(stage_dir, "done"))
+
+
+def mark_stage_done(stage_dir: str):
+    """Mark a stage as completed, and remove the stale checkpoints of the same
+    stage with other settings.
+
+    Args:
+        stage_dir (str): The checkpoint directory of the stage
+    """
+    with open(join(stage_dir, "done"), "w", encoding="utf8") as fp:
+        fp.write("")
+
+    work_dir, name = os.path.split(stage_dir)
+    stage = name.rsplit("-", 1)[0]
+
+    for cur_name in os.listdir(work_dir):
+        if cur_name != name and cur_name.rsplit("-", 1)[0] == stage:
+            shutil.rmtree(join(work_dir, cur_name), ignore_errors=True)
+
+
+def write_json_atomic(obj, path: str):
+    """Write a JSON file through a temporary file, so an interrupted write never
+    leaves a partial checkpoint.
+
+    Args:
+        obj: The object to write
+        path (str): Path to the JSON file
+    """
+    fd, temp_path = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(path))
+
+    with os.fdopen(fd, "w", encoding="utf8") as fp:
+        json.dump(obj, fp, default=_json_default)
+
+    os.replace(temp_path, path)
+
+
+def run_contour_stage(args, work_dir: str, xs, ys, labels, times) -> dict:
+    """Generate the density grids, or load them from the checkpoint."""
+    settings = {
+        "coordinates": get_file_fingerprint(args.coordinates),
+        "coordinatesDtype": args.coordinates_dtype,
+        "labels": get_file_fingerprint(args.labels),
+        "times": get_file_fingerprint(args.times),
+        "groupNames": args.group_names,
+        "timeFormat": args.time_format,
+        "gridSize": args.grid_size,
+        "maxSample": args.max_sample,
+        "randomSeed": args.random_seed,
+        "densityEngine": args.density_engine,
+        "gridEncoding": args.grid_encoding,
+    }
+    stage_dir = get_stage_dir(work_dir, "contours", settings)
+    contour_path = join(stage_dir, "contour.json")
+
+    if is_stage_done(stage_dir):
+        print("Loading contours from the checkpoint...")
+        with open(contour_path, "r", encoding="utf8") as fp:
+            return json.load(fp)
+
+    print("Start generating contours...")
+    os.makedirs(stage_dir, exist_ok=True)
+
+    contour_dict = generate_contour_dict(
+        xs,
+        ys,
+        grid_size=args.grid_size,
+        max_sample=args.max_sample,
+        random_seed=args.random_seed,
+        labels=labels,
+        group_names=args.group_names,
+        times=times,
+        time_format=args.time_format,
+        density_engine=args.density_engine,
+        n_jobs=args.n_jobs,
+        grid_encoding=args.grid_encoding,
+    )
+
+    write_json_atomic(contour_dict, contour_path)
+    mark_stage_done(stage_dir)
+
+    return contour_dict
+
+
+def run_count_stage(args, work_dir: str, texts) -> tuple[str, csr_matrix, StringArray]:
+    """Count the words of all texts, or load the count matrix from the
+    checkpoint as memory-mapped arrays."""
+    settings = {
+        # Version of the checkpoint layout, so checkpoints of older layouts are
+        # not read
+        "format": 2,
+        "texts": get_file_fingerprint(args.texts),
+        "textColumn": args.text_column,
+        "stopWords": args.stop_words,
+        "countBackend": args.count_backend,
+        "nFeatures": args.n_features,
+        "ngramRange": args.ngram_range,
+    }
+    stage_dir = get_stage_dir(work_dir, "counts", settings)
+
+    if is_stage_done(stage_dir):
+        print("Loading the count matrix from the checkpoint...")
+    else:
+        print("Start counting words...")
+        os.makedirs(stage_dir, exist_ok=True)
+
+        count_mat, ngrams = build_count_matrix(
+            texts,
+            stop_words=args.stop_words,
+            count_backend=args.count_backend,
+            n_features=args.n_features,
+            batch_size=args.batch_size,
+            ngram_range=tuple(args.ngram_range),
+            n_jobs=args.n_jobs,
+        )
+
+        save_csr_arrays(count_mat, join(stage_dir, "count"))
+        save_string_array(ngrams, join(stage_dir, "ngrams"))
+        mark_stage_done(stage_dir)
+
+    count_mat = load_csr_arrays(join(stage_dir, "count"))
+    ngrams = load_string_array(join(stage_dir, "ngrams"))
+
+    return stage_dir, count_mat, ngrams
+
+
+def run_topic_stage(
+    args, work_dir: str, count_stage_dir: str, xs, ys, count_mat, ngrams
+) -> dict:
+    """Extract the topics of all levels. Each level is saved as its own
+    checkpoint, so an interrupted run resumes from the last finished level."""
+    settings = {
+        "coordinates": get_file_fingerprint(args.coordinates),
+        "coordinatesDtype": args.coordinates_dtype,
+        "counts": os.path.basename(count_stage_dir),
+        "maxZoomScale": args.max_zoom_scale,
+        "svgWidth": args.svg_width,
+        "svgHeight": args.svg_height,
+        "idealTileWidth": args.ideal_tile_width,
+    }
+    stage_dir = get_stage_dir(work_dir, "topics", settings)
+    os.makedirs(stage_dir, exist_ok=True)
+
+    if count_mat.shape[0] != len(xs):
+        raise IndexError("Number of texts must be the same as number of points.")
+
+    tree_extent = get_tree_extent(xs, ys)
+    tree_position = tree_extent[0] + tree_extent[1]
+    x_domain = [float(np.min(xs)), float(np.max(xs))]
+    y_domain = [float(np.min(ys)), float(np.max(ys))]
+
+    min_level, max_level = select_topic_levels(
+        args.max_zoom_scale,
+        args.svg_width,
+        args.svg_height,
+        x_domain,
+        y_domain,
+        tree_extent,
+        args.ideal_tile_width,
+    )
+    min_level, max_level = int(min_level), int(max_level)
+
+    if is_stage_done(stage_dir):
+        print("Loading topics from the checkpoint...")
+    else:
+        print("Start generating multi-level summaries...")
+
+        # Group points into the tiles at the deepest level by their Morton codes
+        tile_rows, tile_cells = get_point_tiles(xs, ys, tree_extent, max_level)
+        tile_mat = csr_matrix(
+            (
+                np.ones(len(tile_rows), dtype=count_mat.dtype),
+                (tile_rows, np.arange(len(tile_rows))),
+            ),
+            shape=(len(tile_cells), len(tile_rows)),
+        )
+        tile_count_mat = tile_mat @ count_mat
+
+        for level in tqdm(range(max_level, min_level - 1, -1)):
+            if level < max_level:
+                tile_count_mat, tile_cells = aggregate_tile_counts(
+                    tile_count_mat, tile_cells
+                )
+
+            # Skip the levels finished by an interrupted run
+            level_path = join(stage_dir, f"level-{level}.json")
+            if os.path.isfile(level_path):
+                continue
+
+            tile_topics = get_level_topics(
+                tile_count_mat,
+                tile_cells,
+                tree_position,
+                level,
+                ngrams,
+                count_mat.shape[0],
+            )
+            write_json_atomic(tile_topics, level_path)
+
+        mark_stage_done(stage_dir)
+
+    # Always read the levels from the checkpoints, so fresh and resumed runs
+    # give the same output
+    level_tile_topics = {}
+    for level in range(min_level, max_level + 1):
+        with open(join(stage_dir, f"level-{level}.json"), "r", encoding="utf8") as fp:
+            level_tile_topics[level] = json.load(fp)
+
+    return make_topic_dict(
+        level_tile_topics,
+        tree_extent,
+        x_domain,
+        y_domain,
+        min_level,
+        max_level,
+        topic_encoding=args.topic_encoding,
+        topic_scores=args.topic_scores,
+    )
+
+
+def build(args):
+    """Run the build pipeline: contours, word counts, topics, and data files.
+    Each finished stage is saved in the work directory, and a rerun skips the
+    stages whose inputs and parameters have not changed."""
+    work_dir = args.work_dir
+    if work_dir is None:
+        work_dir = join(args.output_dir, ".wizmap-build")
+
+    if args.force and os.path.isdir(work_dir):
+        shutil.rmtree(work_dir)
+
+    os.makedirs(work_dir, exist_ok=True)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    coordinates = load_coordinates(args.coordinates, args.coordinates_dtype)
+    xs, ys = coordinates[:, 0], coordinates[:, 1]
+
+    if args.text_column is not None:
+        texts = ParquetTextColumn(args.texts, args.text_column)
+    else:
+        texts = LineTextFile(args.texts)
+
+    if len(texts) != len(xs):
+        raise IndexError("Number of texts must be the same as number of points.")
+
+    labels = None
+    if args.labels is not None:
+        labels = np.load(args.labels, mmap_mode="r")
+
+    times = None
+    if args.times is not None:
+        times = np.load(args.times, mmap_mode="r")
+
+    grid_dict = run_contour_stage(args, work_dir, xs, ys, labels, times)
+    count_stage_dir, count_mat, ngrams = run_count_stage(args, work_dir, texts)
+    grid_dict["topic"] = run_topic_stage(
+        args, work_dir, count_stage_dir, xs, ys, count_mat, ngrams
+    )
+    grid_dict["embeddingName"] = args.embedding_name
+
+    if args.opacity is not None:
+        grid_dict["opacity"] = args.opacity
+
+    print("Start saving data files...")
+    save_json_files(
+        iter_data_rows(xs, ys, texts, times, labels),
+        grid_dict,
+        output_dir=args.output_dir,
+        data_format=args.data_format,
+        serializer=args.serializer,
+    )
+
+    if args.clean:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def get_parser() -> argparse.ArgumentParser:
+    """Create the argument parser of the wizmap command."""
+    parser = argparse.ArgumentParser(
+        prog="wizmap", description="Build WizMap data files from embeddings."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser(
+        "build",
+        help="Build grid and data files with resumable stage checkpoints.",
+        description=build.__doc__,
+    )
+    build_parser.set_defaults(func=build)
+
+    inputs = build_parser.add_argument_group("inputs")
+    inputs.add_argument(
+        "--coordinates",
+        required=True,
+        help="A .npy or raw binary file of (n, 2) projected coordinates",
+    )
+    inputs.add_argument(
+        "--coordinates-dtype",
+        default="float32",
+        help="Data type of a raw coordinate file (default: float32)",
+    )
+    inputs.add_argument(
+        "--texts",
+        required=True,
+        help="A newline-delimited text file, or a Parquet file with --text-column",
+    )
+    inputs.add_argument("--text-column", help="Text column of a Parquet file")
+    inputs.add_argument("--labels", help="A .npy file of integer labels")
+    inputs.add_argument("--group-names", nargs="+", help="Names of the labels")
+    inputs.add_argument("--times", help="A .npy file of time strings")
+    inputs.add_argument("--time-format", help="strptime format of the times")
+
+    outputs = build_parser.add_argument_group("outputs")
+    outputs.add_argument(
+        "-o", "--output-dir", default="./", help="Folder of the output files"
+    )
+    outputs.add_argument(
+        "--work-dir",
+        help="Folder of the stage checkpoints (default: OUTPUT_DIR/.wizmap-build)",
+    )
+    outputs.add_argument(
+        "--clean",
+        action="store_true",
+        help="Remove the checkpoints after a successful build",
+    )
+    outputs.add_argument(
+        "--force", action="store_true", help="Ignore existing checkpoints"
+    )
+    outputs.add_argument("--embedding-name", default="My Embedding")
+    outputs.add_argument("--opacity", type=float)
+    outputs.add_argument(
+        "--data-format", choices=["ndjson", "binary"], default="ndjson"
+    )
+    outputs.add_argument(
+        "--serializer", choices=["auto", "orjson", "json"], default="json"
+    )
+
+    contours = build_parser.add_argument_group("contours")
+    contours.add_argument("--grid-size", type=int, default=200)
+    contours.add_argument("--max-sample", type=int, default=100000)
+    contours.add_argument("--random-seed", type=int, default=202355)
+    contours.add_argument("--density-engine", choices=["kde", "binned"], default="kde")
+    contours.add_argument(
+        "--grid-encoding",
+        choices=["json", "float16", "uint8", "uint16"],
+        default="json",
+    )
+
+    topics = build_parser.add_argument_group("topics")
+    topics.add_argument(
+        "--stop-words",
+        nargs="+",
+        default="english",
+        help='Stop words, or "english" (default: english)',
+    )
+    topics.add_argument(
+        "--count-backend", choices=["count", "hashing"], default="count"
+    )
+    topics.add_argument("--n-features", type=int, default=2**20)
+    topics.add_argument("--batch-size", type=int, default=10000)
+    topics.add_argument(
+        "--ngram-range", type=int, nargs=2, default=[1, 1], metavar=("MIN", "MAX")
+    )
+    topics.add_argument("--max-zoom-scale", type=float, default=30)
+    topics.add_argument("--svg-width", type=int, default=1000)
+    topics.add_argument("--svg-height", type=int, default=1000)
+    topics.add_argument("--ideal-tile-width", type=float, default=35)
+    topics.add_argument("--topic-encoding", choices=["json", "compact"], default="json")
+    topics.add_argument("--topic-scores", action="store_true")
+
+    build_parser.add_argument(
+        "--n-jobs",
+        type=int,
+        default=1,
+        help="Number of processes, -1 means using all CPUs (default: 1)",
+    )
+
+    return parser
+
+
+def main(argv: list[str] | None = None):
+    """Run the wizmap command.
+
+    Args:
+        argv (list[str] | None, optional): Command-line arguments. Defaults to
+            sys.argv[1:].
+    """
+    args = get_parser().parse_args(argv)
+
+    # A single "english" is the built-in stop word list
+    if args.stop_words == ["english"]:
+        args.stop_words = "english"
+
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
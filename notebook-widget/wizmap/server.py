@@ -0,0 +1,460 @@
+"""A local HTTP server that serves WizMap's bundle and data to notebooks."""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import secrets
+import shutil
+import threading
+
+from typing import Callable, Iterable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Precompressed variants of a file, in the order of preference
+COMPRESSED_SUFFIXES = [("br", ".br"), ("gzip", ".gz")]
+
+
+class WizmapServer(ThreadingHTTPServer):
+    """A threaded HTTP server that serves in-memory routes. It runs in a daemon
+    thread, so it stops with the Python process.
+
+    Pages from other origins can only read the responses if their origin is in
+    allowed_origins, so other websites open in the browser cannot read the
+    served data.
+
+    Args:
+        host (str, optional): Host to bind. Defaults to "127.0.0.1".
+        port (int, optional): Port to bind, 0 means a random free port.
+            Defaults to 0.
+        allowed_origins (list[str] | None, optional): Origins of the notebook
+            pages that render WizMap, e.g., "http://localhost:8888". Defaults to
+            None (only pages served by this server).
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        allowed_origins: list[str] | None = None,
+    ):
+        super().__init__((host, port), WizmapRequestHandler)
+        self.routes: dict[str, tuple[bytes | Callable[[], Iterable[bytes]], str]] = {}
+        self.directories: dict[str, str] = {}
+        self.allowed_origins: set[str] = set(allowed_origins or [])
+
+        # A secret salt for directory prefixes, so they cannot be guessed from
+        # the directory paths
+        self.secret = secrets.token_hex(16)
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self) -> str:
+        """The base URL of this server."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def add_route(
+        self,
+        path: str,
+        content: bytes | Callable[[], Iterable[bytes]],
+        content_type: str,
+    ) -> str:
+        """Serve content at a path.
+
+        Args:
+            path (str): URL path, e.g., "/wizmap.js"
+            content (bytes | Callable[[], Iterable[bytes]]): Response body, or a
+                function that returns chunks of the body for each request. The
+                chunks are streamed without loading the whole body in memory.
+            content_type (str): MIME type of the content
+
+        Returns:
+            str: The full URL of the route
+        """
+        self.routes[path] = (content, content_type)
+        return self.url + path
+
+    def remove_route(self, path: str):
+        """Stop serving a route and release its content.
+
+        Args:
+            path (str): URL path of the route
+        """
+        self.routes.pop(path, None)
+
+    def add_directory(self, directory: str) -> str:
+        """Serve the files in a directory. Files are served with precompressed
+        gzip or brotli variants if present, and support range requests and ETag
+        caching.
+
+        Args:
+            directory (str): Path to the directory
+
+        Returns:
+            str: The base URL of the directory, ending with "/"
+        """
+        directory = os.path.realpath(directory)
+        prefix = (
+            "/files/"
+            + hashlib.sha256((self.secret + directory).encode()).hexdigest()[:32]
+        )
+        self.directories[prefix] = directory
+        return f"{self.url}{prefix}/"
+
+
+class WizmapRequestHandler(BaseHTTPRequestHandler):
+    """Handle GET requests to the routes and directories of a WizmapServer."""
+
+    server: WizmapServer
+
+    def do_GET(self):
+        self._handle(send_body=True)
+
+    def do_HEAD(self):
+        self._handle(send_body=False)
+
+    def do_OPTIONS(self):
+        # CORS preflight requests, e.g., for fetch() with a Range header
+        self.send_response(204)
+        self._send_cors_headers()
+        self.send_header("Access-Control-Allow-Methods", "GET, HEAD, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "Range, If-None-Match")
+        self.send_header("Access-Control-Max-Age", "86400")
+        self.end_headers()
+
+    def _send_cors_headers(self):
+        # Only echo allowed origins, as the responses can be the user's data
+        origin = self.headers.get("Origin")
+        self.send_header("Vary", "Origin")
+
+        if origin is None or origin not in self.server.allowed_origins:
+            return
+
+        self.send_header("Access-Control-Allow-Origin", origin)
+        self.send_header(
+            "Access-Control-Expose-Headers",
+            "Content-Length, Content-Range, Content-Encoding, ETag",
+        )
+
+    def _handle(self, send_body: bool):
+        path = unquote(urlsplit(self.path).path)
+
+        # Routes can be removed by other threads, so we look them up once
+        route = self.server.routes.get(path)
+
+        if route is not None:
+            content, content_type = route
+
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self._send_cors_headers()
+
+            if callable(content):
+                # Without a content length, the stream ends when the connection
+                # closes after this response
+                self.end_headers()
+
+                if send_body:
+                    for chunk in content():
+                        self.wfile.write(chunk)
+                return
+
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+
+            if send_body:
+                self.wfile.write(content)
+            return
+
+        file_path = self._get_file_path(path)
+        if file_path is None:
+            self.send_error(404)
+            return
+
+        self._send_file(file_path, send_body)
+
+    def _get_file_path(self, path: str) -> str | None:
+        """Map a URL path to a file in a served directory."""
+        for prefix, directory in self.server.directories.items():
+            if not path.startswith(prefix + "/"):
+                continue
+
+            file_path = os.path.realpath(join_url_path(directory, path[len(prefix) :]))
+
+            # Do not serve files outside of the directory
+            if os.path.commonpath([directory, file_path]) != directory:
+                return None
+
+            if os.path.isfile(file_path):
+                return file_path
+
+        return None
+
+    def _send_file(self, file_path: str, send_body: bool):
+        """Send a file with content negotiation, ETag, and range support."""
+        content_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+        if file_path.endswith(".ndjson"):
+            content_type = "application/x-ndjson"
+
+        # Byte ranges refer to the original file (e.g., shard manifests), so we
+        # only serve precompressed variants for full requests
+        range_header = self.headers.get("Range")
+        encoding = None
+
+        if range_header is None:
+            accept_encoding = self.headers.get("Accept-Encoding", "")
+            source_mtime = os.stat(file_path).st_mtime_ns
+
+            for cur_encoding, suffix in COMPRESSED_SUFFIXES:
+                if cur_encoding not in accept_encoding:
+                    continue
+
+                # Skip variants that are older than the file they compress
+                try:
+                    variant_stat = os.stat(file_path + suffix)
+                except OSError:
+                    continue
+
+                if variant_stat.st_mtime_ns >= source_mtime:
+                    encoding = cur_encoding
+                    file_path += suffix
+                    break
+
+        stat = os.stat(file_path)
+        size = stat.st_size
+        etag = f'"{stat.st_mtime_ns:x}-{size:x}{"-" + encoding if encoding else ""}"'
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self._send_cors_headers()
+            self.end_headers()
+            return
+
+        start, end = 0, size - 1
+        status = 200
+
+        if range_header is not None:
+            byte_range = parse_range_header(range_header, size)
+
+            if byte_range is None:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self._send_cors_headers()
+                self.end_headers()
+                return
+
+            start, end = byte_range
+            status = 206
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept-Encoding")
+        if encoding is not None:
+            self.send_header("Content-Encoding", encoding)
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self._send_cors_headers()
+        self.end_headers()
+
+        if not send_body:
+            return
+
+        with open(file_path, "rb") as fp:
+            fp.seek(start)
+            remaining = end - start + 1
+
+            while remaining > 0:
+                chunk = fp.read(min(2**20, remaining))
+                if len(chunk) == 0:
+                    break
+
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def log_message(self, format, *args):
+        # Do not print every request in the notebook output
+        pass
+
+
+def join_url_path(directory: str, url_path: str) -> str:
+    """Join a URL path to a local directory."""
+    return os.path.join(directory, *[p for p in url_path.split("/") if p != ""])
+
+
+def parse_range_header(range_header: str, size: int) -> tuple[int, int] | None:
+    """Parse a single byte range of a Range header.
+
+    Args:
+        range_header (str): The Range header, e.g., "bytes=0-99" or "bytes=-100"
+        size (int): Size of the file
+
+    Returns:
+        tuple[int, int] | None: The inclusive [start, end] byte range, or None if
+            the range is not satisfiable
+    """
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+
+    if match.group(1) == "":
+        # A suffix range of the last n bytes
+        start = max(size - int(match.group(2)), 0)
+        end = size - 1
+    else:
+        start = int(match.group(1))
+        end = size - 1 if match.group(2) == "" else min(int(match.group(2)), size - 1)
+
+    if start > end or start >= size:
+        return None
+
+    return start, end
+
+
+def get_notebook_origins() -> list[str]:
+    """Get the origins of notebook pages that can read from the local server.
+    They are the origins in the WIZMAP_ALLOWED_ORIGINS environment variable
+    (separated by commas), and the origins of the Jupyter servers running on
+    this machine.
+
+    Returns:
+        list[str]: Origins, e.g., ["http://localhost:8888"]
+    """
+    origins = [
+        origin.strip()
+        for origin in os.environ.get("WIZMAP_ALLOWED_ORIGINS", "").split(",")
+        if origin.strip() != ""
+    ]
+
+    try:
+        from jupyter_server.serverapp import list_running_servers
+    except ImportError:
+        try:
+            from notebook.notebookapp import list_running_servers
+        except ImportError:
+            return origins
+
+    try:
+        servers = list(list_running_servers())
+    except OSError:
+        servers = []
+
+    for server_info in servers:
+        url = urlsplit(server_info["url"])
+        origins.append(f"{url.scheme}://{url.netloc}")
+
+        # Browsers can open a local Jupyter server by either name
+        if url.hostname in ("localhost", "127.0.0.1") and url.port is not None:
+            for hostname in ("localhost", "127.0.0.1"):
+                origins.append(f"{url.scheme}://{hostname}:{url.port}")
+
+    return origins
+
+
+_server: WizmapServer | None = None
+_server_lock = threading.Lock()
+
+
+def get_server() -> WizmapServer:
+    """Get the shared server of this process, and start it on the first call.
+    It allows the origins from get_notebook_origins(). Add other origins to
+    get_server().allowed_origins.
+
+    Returns:
+        WizmapServer: The shared server
+    """
+    global _server
+
+    with _server_lock:
+        if _server is None:
+            _server = WizmapServer(allowed_origins=get_notebook_origins())
+
+    return _server
+
+
+def precompress_files(
+    directory: str,
+    file_names: list[str] | None = None,
+    encodings: list[str] | None = None,
+):
+    """Write compressed variants (.gz and .br) of files for the server.
+
+    Args:
+        directory (str): Directory of the files
+        file_names (list[str] | None, optional): Files to compress. Defaults to
+            all files that are not compressed variants.
+        encodings (list[str] | None, optional): "gzip" and/or "br". Brotli needs
+            the brotli package. Defaults to gzip, and brotli if it is installed.
+    """
+    if encodings is None:
+        encodings = ["gzip"] if brotli is None else ["gzip", "br"]
+
+    if "br" in encodings and brotli is None:
+        raise ImportError("Brotli compression requires brotli.")
+
+    if file_names is None:
+        file_names = [
+            name
+            for name in os.listdir(directory)
+            if os.path.isfile(os.path.join(directory, name))
+            and not name.endswith((".gz", ".br"))
+        ]
+
+    for name in file_names:
+        file_path = os.path.join(directory, name)
+
+        if "gzip" in encodings:
+            with open(file_path, "rb") as src:
+                with gzip.open(file_path + ".gz", "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+
+        if "br" in encodings:
+            with open(file_path, "rb") as src, open(file_path + ".br", "wb") as dst:
+                compressor = brotli.Compressor()
+
+                while True:
+                    chunk = src.read(2**22)
+                    if len(chunk) == 0:
+                        break
+                    dst.write(compressor.process(chunk))
+
+                dst.write(compressor.finish())
+
+
+def serve_directory(
+    directory: str,
+    data_json_name: str = "data.ndjson",
+    grid_json_name: str = "grid.json",
+) -> tuple[str, str]:
+    """Serve an output directory from the local server, and get the URLs of
+    its data and grid files for visualize().
+
+    Args:
+        directory (str): Directory of the files from save_json_files()
+        data_json_name (str, optional): Filename of the data file. Defaults to
+            "data.ndjson".
+        grid_json_name (str, optional): Filename of the grid file. Defaults to
+            "grid.json".
+
+    Returns:
+        str: URL of the data file
+        str: URL of the grid file
+    """
+    base_url = get_server().add_directory(directory)
+    return base_url + data_json_name, base_url + grid_json_name
@@ -3,17 +3,40 @@ import random
 import html
 import base64
 import pkgutil
-import ndjson
 import json
+import math
+import os
+import shutil
+import secrets
+import hashlib
+import inspect
+import tempfile
 
 from os.path import join
+from collections import deque
+from functools import lru_cache
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlencode
 from tqdm import tqdm
 from IPython.display import display_html
-from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
-from quadtreed3 import Quadtree, Node
-from scipy.sparse import csr_matrix
+from wizmap.server import get_server
+from sklearn.feature_extraction import FeatureHasher
+from sklearn.feature_extraction.text import (
+    CountVectorizer,
+    HashingVectorizer,
+    TfidfTransformer,
+)
+from quadtreed3 import Node
+from scipy.sparse import csr_matrix, vstack
+from scipy.signal import fftconvolve
 from sklearn.neighbors import KernelDensity
-from typing import Tuple, TypedDict, Literal
+from typing import Callable, Iterable, Iterator, Tuple, TypedDict, Literal
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 class JsonPointContentConfig(TypedDict):
@@ -47,42 +70,109 @@ class JsonPointContentConfig(TypedDict):
     linkFieldKeys: list[str] | None
 
 
-def generate_contour_dict(
-    xs: list[float],
-    ys: list[float],
-    grid_size: int = 200,
-    max_sample: int = 100000,
-    random_seed: int = 202355,
-    labels: list[int] | None = None,
-    group_names: list[str] | None = None,
-    times: list[str] | None = None,
-    time_format: str | None = None,
-) -> dict:
-    """Generate a grid dictionary object that encodes the contour plot of the
-    projected embedding space.
+def _as_array(values, dtype=None) -> np.ndarray:
+    """Convert a list, np.ndarray, pandas Series, or pyarrow Array/ChunkedArray
+    to a numpy array. Numeric arrays are not copied if they already have the
+    dtype."""
+    if isinstance(values, np.ndarray):
+        array = values
+    elif hasattr(values, "to_pylist"):
+        # pyarrow arrays only copy if there are nulls or multiple chunks
+        array = values.to_numpy(zero_copy_only=False)
+    elif hasattr(values, "to_numpy"):
+        array = values.to_numpy()
+    else:
+        array = np.asarray(values)
+
+    if dtype is not None:
+        array = array.astype(dtype, copy=False)
+
+    return array
+
+
+def _as_float_array(values) -> np.ndarray:
+    """Convert coordinates to a numpy array like _as_array(). Floating arrays
+    (e.g., memory-mapped float32 coordinates) keep their dtype and are not
+    copied, and other values are converted to float64. Computations cast the
+    values to float64 chunk by chunk."""
+    array = _as_array(values)
+
+    if not np.issubdtype(array.dtype, np.floating):
+        array = array.astype(np.float64)
+
+    return array
+
+
+def _iter_values(values: Iterable, chunk_size: int = 10000) -> Iterator:
+    """Iterate over values as Python objects. Numpy arrays, pandas Series, and
+    pyarrow arrays are converted chunk by chunk, so they can be serialized or
+    tokenized without a full list copy."""
+    if isinstance(values, np.ndarray):
+        for start in range(0, len(values), chunk_size):
+            yield from values[start : start + chunk_size].tolist()
+    elif hasattr(values, "to_pylist"):
+        for start in range(0, len(values), chunk_size):
+            yield from values.slice(start, chunk_size).to_pylist()
+    elif hasattr(values, "to_numpy"):
+        yield from _iter_values(values.to_numpy(), chunk_size)
+    else:
+        yield from values
+
+
+def _take_values(values, indexes: list[int]) -> list:
+    """Get the values at the indexes as a list of Python objects."""
+    if isinstance(values, np.ndarray):
+        return values[indexes].tolist()
+    elif hasattr(values, "to_pylist"):
+        return values.take(indexes).to_pylist()
+    elif hasattr(values, "to_numpy"):
+        return values.to_numpy()[indexes].tolist()
+    elif hasattr(values, "take"):
+        # e.g., LineTextFile, which reads all indexes through one file handle
+        return values.take(indexes)
+    else:
+        return [values[i] for i in indexes]
+
+
+def _as_py(value):
+    """Convert a pyarrow or numpy scalar to a Python object."""
+    if hasattr(value, "as_py"):
+        return value.as_py()
+
+    if isinstance(value, np.generic):
+        return value.item()
+
+    return value
+
+
+def get_silverman_bandwidth(n: int, d: int = 2) -> float:
+    """Compute the KDE bandwidth using Silverman's rule.
 
     Args:
-        xs ([float]): A list of x coordinates of projected points
-        ys ([float]): A list of y coordinates of projected points
-        grid_size (int, optional): The resolution of the grid. Defaults to 200.
-        max_sample (int, optional): Max number of samples to compute KDE from.
-            Defaults to 100000.
-        random_seed (int, optional): Seed for the random state. Defaults to 202355.
-        labels ([int]): A list of category labels of projected points. Labels
-            must be consecutive integers starting from 0. Defaults to None.
-        group_names ([str]): Category names associated with the given labels.
-            For example, the group name of label i is group_names[i]. Defaults
-            to None.
-        times ([str]): A list of times associated with data points. Defaults to None.
-        time_format (str): strptime format string to parse the time string in times.
+        n (int): Number of samples
+        d (int, optional): Number of dimensions. Defaults to 2.
 
     Returns:
-        dict: A dictionary object encodes the contour plot.
+        float: The bandwidth
     """
-    projected_emb = np.stack((xs, ys), axis=1)
+    return (n * (d + 2) / 4.0) ** (-1.0 / (d + 4))
 
-    x_min, x_max = np.min(xs), np.max(xs)
-    y_min, y_max = np.min(ys), np.max(ys)
+
+def get_padded_grid_range(
+    x_domain: Tuple[float, float], y_domain: Tuple[float, float]
+) -> Tuple[Tuple[float, float], Tuple[float, float]]:
+    """Get the square grid range that covers the data domain with some padding.
+
+    Args:
+        x_domain ((float, float)): [x min, x max] of the data points
+        y_domain ((float, float)): [y min, y max] of the data points
+
+    Returns:
+        (float, float): [x min, x max] of the grid
+        (float, float): [y min, y max] of the grid
+    """
+    x_min, x_max = x_domain
+    y_min, y_max = y_domain
 
     x_gap = x_max - x_min
     y_gap = y_max - y_min
@@ -106,40 +196,459 @@ def generate_contour_dict(
         x_min -= (y_gap - x_gap) / 2
         x_max += (y_gap - x_gap) / 2
 
-    # Estimate on a 2D grid
-    grid_xs = np.linspace(x_min, x_max, grid_size)
-    grid_ys = np.linspace(y_min, y_max, grid_size)
+    return (x_min, x_max), (y_min, y_max)
+
+
+def bin_points(
+    xs: np.ndarray,
+    ys: np.ndarray,
+    x_range: Tuple[float, float],
+    y_range: Tuple[float, float],
+    grid_size: int,
+    chunk_size: int = 2**20,
+) -> np.ndarray:
+    """Distribute points onto the vertices of a 2D grid with linear binning.
+    Each point splits its unit weight across the four grid vertices around it.
+
+    Args:
+        xs (np.ndarray): x coordinates of the points
+        ys (np.ndarray): y coordinates of the points
+        x_range ((float, float)): [x min, x max] of the grid
+        y_range ((float, float)): [y min, y max] of the grid
+        grid_size (int): The resolution of the grid
+        chunk_size (int, optional): Number of points to bin at a time, which
+            bounds the memory of the float64 temporary arrays. Defaults to 2**20.
+
+    Returns:
+        np.ndarray: A (grid_size, grid_size) array of binned weights. Rows are
+            y positions and columns are x positions, matching np.meshgrid.
+    """
+    dx = (x_range[1] - x_range[0]) / (grid_size - 1)
+    dy = (y_range[1] - y_range[0]) / (grid_size - 1)
+    cell_size = grid_size * grid_size
+    counts = np.zeros(cell_size, dtype=np.float64)
+
+    for start in range(0, len(xs), chunk_size):
+        chunk_xs = np.asarray(xs[start : start + chunk_size], dtype=np.float64)
+        chunk_ys = np.asarray(ys[start : start + chunk_size], dtype=np.float64)
+
+        fx = np.clip((chunk_xs - x_range[0]) / dx, 0, grid_size - 1)
+        fy = np.clip((chunk_ys - y_range[0]) / dy, 0, grid_size - 1)
+
+        ix = np.minimum(fx.astype(np.intp), grid_size - 2)
+        iy = np.minimum(fy.astype(np.intp), grid_size - 2)
+        wx = fx - ix
+        wy = fy - iy
+
+        cell = iy * grid_size + ix
+        counts += np.bincount(cell, weights=(1 - wx) * (1 - wy), minlength=cell_size)
+        counts += np.bincount(cell + 1, weights=wx * (1 - wy), minlength=cell_size)
+        counts += np.bincount(
+            cell + grid_size, weights=(1 - wx) * wy, minlength=cell_size
+        )
+        counts += np.bincount(
+            cell + grid_size + 1, weights=wx * wy, minlength=cell_size
+        )
+
+    return counts.reshape(grid_size, grid_size)
+
+
+def smooth_binned_counts(
+    counts: np.ndarray,
+    bandwidth: float,
+    total: int,
+    x_range: Tuple[float, float],
+    y_range: Tuple[float, float],
+) -> np.ndarray:
+    """Convolve binned point weights with a Gaussian kernel via FFT. The result
+    approximates sklearn's KernelDensity(kernel="gaussian").score_samples()
+    evaluated on the grid vertices.
+
+    Args:
+        counts (np.ndarray): A (grid_size, grid_size) array from bin_points()
+        bandwidth (float): Bandwidth of the Gaussian kernel
+        total (int): Number of binned points, used to normalize the density
+        x_range ((float, float)): [x min, x max] of the grid
+        y_range ((float, float)): [y min, y max] of the grid
+
+    Returns:
+        np.ndarray: A (grid_size, grid_size) density grid
+    """
+    grid_size = counts.shape[0]
+    dx = (x_range[1] - x_range[0]) / (grid_size - 1)
+    dy = (y_range[1] - y_range[0]) / (grid_size - 1)
+
+    # Truncate the kernel at 4 bandwidths, no need to go beyond the grid
+    rx = int(min(grid_size - 1, np.ceil(4 * bandwidth / dx)))
+    ry = int(min(grid_size - 1, np.ceil(4 * bandwidth / dy)))
+
+    kx = np.arange(-rx, rx + 1) * dx
+    ky = np.arange(-ry, ry + 1) * dy
+    kernel = np.exp(-(ky[:, None] ** 2 + kx[None, :] ** 2) / (2 * bandwidth**2))
+    kernel /= 2 * np.pi * bandwidth**2
+
+    density = fftconvolve(counts, kernel, mode="same") / max(total, 1)
+
+    # FFT round-off can leave tiny negative values
+    return np.maximum(density, 0)
+
+
+def get_grid_vertices(
+    x_range: Tuple[float, float], y_range: Tuple[float, float], grid_size: int
+) -> np.ndarray:
+    """Get the coordinates of all vertices of a 2D grid.
+
+    Args:
+        x_range ((float, float)): [x min, x max] of the grid
+        y_range ((float, float)): [y min, y max] of the grid
+        grid_size (int): The resolution of the grid
+
+    Returns:
+        np.ndarray: A (grid_size * grid_size, 2) array of [x, y] coordinates in
+            np.meshgrid's row-major order
+    """
+    grid_xs = np.linspace(x_range[0], x_range[1], grid_size)
+    grid_ys = np.linspace(y_range[0], y_range[1], grid_size)
     xx, yy = np.meshgrid(grid_xs, grid_ys)
 
-    grid = np.vstack([xx.ravel(), yy.ravel()]).transpose()
+    return np.vstack([xx.ravel(), yy.ravel()]).transpose()
+
+
+def get_grid_density(
+    xs: np.ndarray,
+    ys: np.ndarray,
+    x_range: Tuple[float, float],
+    y_range: Tuple[float, float],
+    grid_size: int = 200,
+    max_sample: int = 100000,
+    random_seed: int = 202355,
+    density_engine: Literal["kde", "binned"] = "kde",
+    grid: np.ndarray | None = None,
+) -> Tuple[np.ndarray, int]:
+    """Estimate the density of the given points on a 2D grid.
+
+    Args:
+        xs (np.ndarray): x coordinates of the points
+        ys (np.ndarray): y coordinates of the points
+        x_range ((float, float)): [x min, x max] of the grid
+        y_range ((float, float)): [y min, y max] of the grid
+        grid_size (int, optional): The resolution of the grid. Defaults to 200.
+        max_sample (int, optional): Max number of samples to compute KDE from.
+            Defaults to 100000.
+        random_seed (int, optional): Seed for the random state. Defaults to 202355.
+        density_engine ("kde" | "binned", optional): "kde" fits sklearn's
+            KernelDensity on a random sample of points and evaluates it on every
+            grid cell. "binned" bins all points onto the grid and convolves them
+            with a Gaussian kernel via FFT, which is much faster on large data.
+            Both engines use the same Silverman bandwidth. Defaults to "kde".
+        grid (np.ndarray | None, optional): Precomputed grid vertices from
+            get_grid_vertices(). Pass it to share one grid across many density
+            maps. Defaults to None.
+
+    Returns:
+        np.ndarray: A (grid_size, grid_size) density grid
+        int: Number of points used to estimate the density
+    """
+    xs = _as_float_array(xs)
+    ys = _as_float_array(ys)
 
     # Compute the bandwidth using Silverman's rule
     sample_size = min(max_sample, len(xs))
-    n = sample_size
-    d = projected_emb.shape[1]
-    bw = (n * (d + 2) / 4.0) ** (-1.0 / (d + 4))
+    bw = get_silverman_bandwidth(sample_size)
+
+    if density_engine == "binned":
+        counts = bin_points(xs, ys, x_range, y_range, grid_size)
+        grid_density = smooth_binned_counts(counts, bw, len(xs), x_range, y_range)
+        return grid_density, len(xs)
+
+    if density_engine != "kde":
+        raise ValueError(f"Unknown density engine: {density_engine}")
+
+    # Estimate on a 2D grid
+    if grid is None:
+        grid = get_grid_vertices(x_range, y_range, grid_size)
 
     # We use a random sample to fit the KDE for faster run time
     rng = np.random.default_rng(random_seed)
     random_indexes = rng.choice(
-        range(projected_emb.shape[0]),
-        min(projected_emb.shape[0], sample_size),
+        range(len(xs)),
+        min(len(xs), sample_size),
         replace=False,
     )
+    projected_emb = np.stack(
+        (xs[random_indexes], ys[random_indexes]), axis=1, dtype=np.float64
+    )
 
     kde = KernelDensity(kernel="gaussian", bandwidth=bw)
-    kde.fit(projected_emb[random_indexes, :])
+    kde.fit(projected_emb)
 
     # Sklearn
     log_density = kde.score_samples(grid)
     log_density = np.exp(log_density)
-    grid_density = np.reshape(log_density, xx.shape)
+    grid_density = np.reshape(log_density, (grid_size, grid_size))
+
+    return grid_density, sample_size
+
+
+def _get_n_workers(n_jobs: int | None) -> int:
+    """Resolve the number of worker processes from a scikit-learn style n_jobs.
+
+    Args:
+        n_jobs (int | None): Number of processes. None means 1, and negative
+            values count back from the number of CPUs (-1 means all CPUs).
+
+    Returns:
+        int: Number of worker processes (at least 1)
+    """
+    if n_jobs is None:
+        return 1
+
+    if n_jobs < 0:
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+
+    return max(1, n_jobs)
+
+
+def group_point_indexes(keys: np.ndarray) -> Tuple[list, list[np.ndarray]]:
+    """Group point indexes by their keys in a single pass.
+
+    Args:
+        keys (np.ndarray): The group key of each point
+
+    Returns:
+        list: Sorted unique keys
+        list[np.ndarray]: Point indexes of each unique key, in ascending order
+    """
+    unique_keys, inverse = np.unique(_as_array(keys), return_inverse=True)
+    inverse = inverse.ravel()
+    order = np.argsort(inverse, kind="stable")
+    group_sizes = np.bincount(inverse, minlength=len(unique_keys))
+    group_indexes = np.split(order, np.cumsum(group_sizes)[:-1])
+
+    return unique_keys.tolist(), group_indexes
+
+
+def _get_grid_density_task(kwargs: dict) -> Tuple[np.ndarray, int]:
+    """Run get_grid_density() in a worker process."""
+    return get_grid_density(**kwargs)
+
+
+def get_grouped_grid_density(
+    xs: np.ndarray,
+    ys: np.ndarray,
+    keys: np.ndarray,
+    x_range: Tuple[float, float],
+    y_range: Tuple[float, float],
+    grid_size: int = 200,
+    max_sample: int = 100000,
+    random_seed: int = 202355,
+    density_engine: Literal["kde", "binned"] = "kde",
+    n_jobs: int | None = 1,
+) -> dict:
+    """Estimate one density grid for each unique key (e.g., a label or a time).
+    Points are grouped in a single pass, and all groups share the same grid.
+
+    Args:
+        xs (np.ndarray): x coordinates of the points
+        ys (np.ndarray): y coordinates of the points
+        keys (np.ndarray): The group key of each point
+        x_range ((float, float)): [x min, x max] of the grid
+        y_range ((float, float)): [y min, y max] of the grid
+        grid_size (int, optional): The resolution of the grid. Defaults to 200.
+        max_sample (int, optional): Max number of samples to compute KDE from.
+            Defaults to 100000.
+        random_seed (int, optional): Seed for the random state. Defaults to 202355.
+        density_engine ("kde" | "binned", optional): How to estimate the density.
+            Defaults to "kde".
+        n_jobs (int | None, optional): Number of processes to compute the grids
+            in parallel. -1 means using all CPUs. Each grid still uses the same
+            random_seed, so the results do not depend on n_jobs. Defaults to 1.
+
+    Returns:
+        dict: A dictionary that maps each unique key (in sorted order) to a tuple
+            of its density grid and its number of points
+    """
+    xs = _as_float_array(xs)
+    ys = _as_float_array(ys)
+
+    if len(keys) != len(xs):
+        raise IndexError("Number of keys must be the same as number of points.")
+
+    # The stable grouping keeps points in their original order within each group,
+    # so the KDE samples the same points as it would on the group alone
+    unique_keys, group_indexes = group_point_indexes(keys)
+
+    tasks = [
+        {
+            "xs": xs[indexes],
+            "ys": ys[indexes],
+            "x_range": x_range,
+            "y_range": y_range,
+            "grid_size": grid_size,
+            "max_sample": max_sample,
+            "random_seed": random_seed,
+            "density_engine": density_engine,
+        }
+        for indexes in group_indexes
+    ]
+
+    n_workers = min(_get_n_workers(n_jobs), len(tasks))
+
+    if n_workers > 1:
+        # Executor.map() yields results in the task order
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = list(executor.map(_get_grid_density_task, tasks))
+    else:
+        grid = None
+        if density_engine == "kde":
+            grid = get_grid_vertices(x_range, y_range, grid_size)
+
+        results = [get_grid_density(**task, grid=grid) for task in tasks]
+
+    grouped_density = {}
+
+    for key, indexes, (grid_density, _) in zip(unique_keys, group_indexes, results):
+        grouped_density[key] = (grid_density, len(indexes))
+
+    return grouped_density
+
+
+def encode_grid(
+    grid_density: np.ndarray,
+    grid_encoding: Literal["json", "float16", "uint8", "uint16"] = "json",
+) -> list | dict:
+    """Encode a density grid for grid.json.
+
+    Args:
+        grid_density (np.ndarray): A 2D density grid
+        grid_encoding ("json" | "float16" | "uint8" | "uint16", optional): "json"
+            stores the grid as nested lists of rounded floats. The other options
+            store a base64 string of little-endian binary values. uint8 and uint16
+            quantize the grid linearly, and the original value is
+            `offset + scale * value`. Defaults to "json".
+
+    Returns:
+        list | dict: Nested lists for "json", otherwise an encoded grid object
+            with keys "encoding", "shape", "scale", "offset", and "data"
+    """
+    if grid_encoding == "json":
+        return grid_density.astype(float).round(4).tolist()
+
+    grid_density = np.asarray(grid_density, dtype=np.float64)
+    offset = 0.0
+    scale = 1.0
+
+    if grid_encoding == "float16":
+        values = grid_density.astype("<f2")
+    elif grid_encoding in ("uint8", "uint16"):
+        dtype = np.dtype("<u1") if grid_encoding == "uint8" else np.dtype("<u2")
+        max_int = np.iinfo(dtype).max
+
+        offset = float(np.min(grid_density))
+        value_range = float(np.max(grid_density)) - offset
+        if value_range > 0:
+            scale = value_range / max_int
+
+        values = np.rint((grid_density - offset) / scale).astype(dtype)
+    else:
+        raise ValueError(f"Unknown grid encoding: {grid_encoding}")
+
+    return {
+        "encoding": grid_encoding,
+        "shape": list(grid_density.shape),
+        "scale": scale,
+        "offset": offset,
+        "data": base64.b64encode(values.tobytes()).decode("utf-8"),
+    }
+
+
+def decode_grid(grid: list | dict) -> np.ndarray:
+    """Decode a grid created by encode_grid().
+
+    Args:
+        grid (list | dict): An encoded grid
+
+    Returns:
+        np.ndarray: The 2D density grid
+    """
+    if isinstance(grid, list):
+        return np.array(grid, dtype=np.float64)
+
+    dtype = {"float16": "<f2", "uint8": "<u1", "uint16": "<u2"}[grid["encoding"]]
+    values = np.frombuffer(base64.b64decode(grid["data"]), dtype=dtype)
+    values = values.astype(np.float64) * grid["scale"] + grid["offset"]
+    return values.reshape(grid["shape"])
+
+
+def generate_contour_dict(
+    xs: list[float] | np.ndarray,
+    ys: list[float] | np.ndarray,
+    grid_size: int = 200,
+    max_sample: int = 100000,
+    random_seed: int = 202355,
+    labels: list[int] | np.ndarray | None = None,
+    group_names: list[str] | None = None,
+    times: list[str] | np.ndarray | None = None,
+    time_format: str | None = None,
+    density_engine: Literal["kde", "binned"] = "kde",
+    n_jobs: int | None = 1,
+    grid_encoding: Literal["json", "float16", "uint8", "uint16"] = "json",
+) -> dict:
+    """Generate a grid dictionary object that encodes the contour plot of the
+    projected embedding space. xs, ys, labels, and times can be lists, numpy
+    arrays, pandas Series, or pyarrow arrays, and they are not converted to
+    Python lists.
+
+    Args:
+        xs ([float]): A list of x coordinates of projected points
+        ys ([float]): A list of y coordinates of projected points
+        grid_size (int, optional): The resolution of the grid. Defaults to 200.
+        max_sample (int, optional): Max number of samples to compute KDE from.
+            Defaults to 100000.
+        random_seed (int, optional): Seed for the random state. Defaults to 202355.
+        labels ([int]): A list of category labels of projected points. Labels
+            must be consecutive integers starting from 0. Defaults to None.
+        group_names ([str]): Category names associated with the given labels.
+            For example, the group name of label i is group_names[i]. Defaults
+            to None.
+        times ([str]): A list of times associated with data points. Defaults to None.
+        time_format (str): strptime format string to parse the time string in times.
+        density_engine ("kde" | "binned", optional): How to estimate the density.
+            "binned" uses all points and is much faster on large datasets. See
+            get_grid_density() for details. Defaults to "kde".
+        n_jobs (int | None, optional): Number of processes to compute the group
+            and time grids in parallel. -1 means using all CPUs. Defaults to 1.
+        grid_encoding ("json" | "float16" | "uint8" | "uint16", optional): How to
+            store the grids. The binary encodings make grid.json much smaller and
+            faster to parse. See encode_grid() for details. Defaults to "json".
+
+    Returns:
+        dict: A dictionary object encodes the contour plot.
+    """
+    xs = _as_float_array(xs)
+    ys = _as_float_array(ys)
+
+    x_range, y_range = get_padded_grid_range(
+        (float(np.min(xs)), float(np.max(xs))), (float(np.min(ys)), float(np.max(ys)))
+    )
+
+    grid_density, sample_size = get_grid_density(
+        xs,
+        ys,
+        x_range,
+        y_range,
+        grid_size=grid_size,
+        max_sample=max_sample,
+        random_seed=random_seed,
+        density_engine=density_engine,
+    )
 
     # Export the density dict
-    x_min, x_max, y_min, y_max = float(x_min), float(x_max), float(y_min), float(y_max)
+    x_min, x_max = float(x_range[0]), float(x_range[1])
+    y_min, y_max = float(y_range[0]), float(y_range[1])
 
     grid_density_json = {
-        "grid": grid_density.astype(float).round(4).tolist(),
+        "grid": encode_grid(grid_density, grid_encoding),
         "xRange": [x_min, x_max],
         "yRange": [y_min, y_max],
         "padded": True,
@@ -149,7 +658,9 @@ def generate_contour_dict(
 
     # Add group grids if labels are given
     if labels is not None and group_names is not None:
-        if len(set(labels)) != len(group_names):
+        labels = _as_array(labels)
+
+        if len(np.unique(labels)) != len(group_names):
             raise IndexError(
                 "Number of unique labels must be the same as the length as group_names."
             )
@@ -161,54 +672,32 @@ def generate_contour_dict(
         grid_density_json["groupTotalPointSizes"] = {}
         grid_density_json["groupNames"] = group_names
 
-        for cur_label, name in enumerate(group_names):
-            cur_xs = []
-            cur_ys = []
-
-            for i, label in enumerate(labels):
-                if label == cur_label:
-                    cur_xs.append(xs[i])
-                    cur_ys.append(ys[i])
-
-            cur_projected_emb = np.stack((cur_xs, cur_ys), axis=1)
-
-            # Estimate on a 2D grid
-            grid_xs = np.linspace(x_min, x_max, grid_size)
-            grid_ys = np.linspace(y_min, y_max, grid_size)
-            xx, yy = np.meshgrid(grid_xs, grid_ys)
-
-            grid = np.vstack([xx.ravel(), yy.ravel()]).transpose()
-
-            # Compute the bandwidth using Silverman's rule
-            sample_size = min(max_sample, len(cur_xs))
-            n = sample_size
-            d = cur_projected_emb.shape[1]
-            bw = (n * (d + 2) / 4.0) ** (-1.0 / (d + 4))
-
-            # We use a random sample to fit the KDE for faster run time
-            rng = np.random.default_rng(random_seed)
-            random_indexes = rng.choice(
-                range(cur_projected_emb.shape[0]),
-                min(cur_projected_emb.shape[0], sample_size),
-                replace=False,
-            )
-
-            kde = KernelDensity(kernel="gaussian", bandwidth=bw)
-            kde.fit(cur_projected_emb[random_indexes, :])
+        group_density = get_grouped_grid_density(
+            xs,
+            ys,
+            labels,
+            x_range,
+            y_range,
+            grid_size=grid_size,
+            max_sample=max_sample,
+            random_seed=random_seed,
+            density_engine=density_engine,
+            n_jobs=n_jobs,
+        )
 
-            # Sklearn
-            log_density = kde.score_samples(grid)
-            log_density = np.exp(log_density)
-            grid_density = np.reshape(log_density, xx.shape)
+        for cur_label, name in enumerate(group_names):
+            grid_density, group_size = group_density[cur_label]
 
             # Register this group
-            grid_density_json["groupGrids"][name] = (
-                grid_density.astype(float).round(4).tolist()
+            grid_density_json["groupGrids"][name] = encode_grid(
+                grid_density, grid_encoding
             )
-            grid_density_json["groupTotalPointSizes"][name] = cur_projected_emb.shape[0]
+            grid_density_json["groupTotalPointSizes"][name] = group_size
 
     # Add time grids if times are given
     if times is not None:
+        times = _as_array(times)
+
         if len(times) != len(xs):
             raise IndexError("Number of times must be the same as number of points.")
 
@@ -216,95 +705,374 @@ def generate_contour_dict(
         grid_density_json["timeCounter"] = {}
         grid_density_json["timeFormat"] = time_format
 
-        unique_times = set(times)
+        time_density = get_grouped_grid_density(
+            xs,
+            ys,
+            times,
+            x_range,
+            y_range,
+            grid_size=grid_size,
+            max_sample=max_sample,
+            random_seed=random_seed,
+            density_engine=density_engine,
+            n_jobs=n_jobs,
+        )
+
+        for cur_time, (grid_density, time_size) in time_density.items():
+            # Register this time group
+            grid_density_json["timeGrids"][cur_time] = encode_grid(
+                grid_density, grid_encoding
+            )
+            grid_density_json["timeCounter"][cur_time] = time_size
+
+    return grid_density_json
 
-        for cur_time in unique_times:
-            cur_xs = []
-            cur_ys = []
 
-            for i, time in enumerate(times):
-                if time == cur_time:
-                    cur_xs.append(xs[i])
-                    cur_ys.append(ys[i])
+class ContourBuilder:
+    """Build the contour grid dictionary from chunks of points with bounded
+    memory. Each call to partial_fit() bins a chunk of points onto histograms of
+    a fixed grid, and finalize() smooths the histograms into density grids. The
+    result is the same as generate_contour_dict(density_engine="binned").
 
-            cur_projected_emb = np.stack((cur_xs, cur_ys), axis=1)
+    Args:
+        x_domain ((float, float)): [x min, x max] of all the points
+        y_domain ((float, float)): [y min, y max] of all the points
+        grid_size (int, optional): The resolution of the grid. Defaults to 200.
+        max_sample (int, optional): The number of points used in Silverman's rule
+            is capped at max_sample, as in generate_contour_dict(). Defaults to
+            100000.
+        group_names ([str]): Category names associated with the labels. For
+            example, the group name of label i is group_names[i]. Defaults to None.
+        time_format (str): strptime format string to parse the time string in times.
+    """
 
-            # Estimate on a 2D grid
-            grid_xs = np.linspace(x_min, x_max, grid_size)
-            grid_ys = np.linspace(y_min, y_max, grid_size)
-            xx, yy = np.meshgrid(grid_xs, grid_ys)
+    def __init__(
+        self,
+        x_domain: Tuple[float, float],
+        y_domain: Tuple[float, float],
+        grid_size: int = 200,
+        max_sample: int = 100000,
+        group_names: list[str] | None = None,
+        time_format: str | None = None,
+    ):
+        self.x_domain = [float(x_domain[0]), float(x_domain[1])]
+        self.y_domain = [float(y_domain[0]), float(y_domain[1])]
+        self.x_range, self.y_range = get_padded_grid_range(x_domain, y_domain)
+        self.grid_size = grid_size
+        self.max_sample = max_sample
+        self.group_names = group_names
+        self.time_format = time_format
+
+        self.counts = np.zeros((grid_size, grid_size))
+        self.total = 0
+
+        self.group_counts = None
+        self.group_sizes = None
+        if group_names is not None:
+            self.group_counts = np.zeros((len(group_names), grid_size, grid_size))
+            self.group_sizes = np.zeros(len(group_names), dtype=np.int64)
+
+        self.time_counts: dict = {}
+        self.time_sizes: dict = {}
+
+    def partial_fit(
+        self,
+        xs: np.ndarray,
+        ys: np.ndarray,
+        labels: np.ndarray | None = None,
+        times: np.ndarray | None = None,
+    ):
+        """Add a chunk of points to the histograms.
+
+        Args:
+            xs (np.ndarray): x coordinates of the points in this chunk
+            ys (np.ndarray): y coordinates of the points in this chunk
+            labels (np.ndarray, optional): Category labels of the points in
+                this chunk. Defaults to None.
+            times (np.ndarray, optional): Times of the points in this chunk.
+                Defaults to None.
+
+        Returns:
+            ContourBuilder: This builder
+        """
+        xs = _as_float_array(xs)
+        ys = _as_float_array(ys)
+
+        if len(xs) == 0:
+            return self
+
+        if len(ys) != len(xs):
+            raise IndexError("Number of ys must be the same as number of xs.")
+
+        if (
+            np.min(xs) < self.x_range[0]
+            or np.max(xs) > self.x_range[1]
+            or np.min(ys) < self.y_range[0]
+            or np.max(ys) > self.y_range[1]
+        ):
+            raise ValueError("Points must be inside the builder's domain.")
+
+        self.counts += bin_points(xs, ys, self.x_range, self.y_range, self.grid_size)
+        self.total += len(xs)
+
+        if labels is not None:
+            if self.group_counts is None:
+                raise ValueError("group_names must be set to add labels.")
+
+            if len(labels) != len(xs):
+                raise IndexError(
+                    "Number of labels must be the same as number of points."
+                )
 
-            grid = np.vstack([xx.ravel(), yy.ravel()]).transpose()
+            unique_labels, group_indexes = group_point_indexes(labels)
 
-            # Compute the bandwidth using Silverman's rule
-            sample_size = min(max_sample, len(cur_xs))
-            n = sample_size
-            d = cur_projected_emb.shape[1]
-            bw = (n * (d + 2) / 4.0) ** (-1.0 / (d + 4))
+            for label, indexes in zip(unique_labels, group_indexes):
+                self.group_counts[label] += bin_points(
+                    xs[indexes],
+                    ys[indexes],
+                    self.x_range,
+                    self.y_range,
+                    self.grid_size,
+                )
+                self.group_sizes[label] += len(indexes)
 
-            # We use a random sample to fit the KDE for faster run time
-            rng = np.random.default_rng(random_seed)
-            random_indexes = rng.choice(
-                range(cur_projected_emb.shape[0]),
-                min(cur_projected_emb.shape[0], sample_size),
-                replace=False,
-            )
+        if times is not None:
+            if len(times) != len(xs):
+                raise IndexError(
+                    "Number of times must be the same as number of points."
+                )
 
-            kde = KernelDensity(kernel="gaussian", bandwidth=bw)
-            kde.fit(cur_projected_emb[random_indexes, :])
+            unique_times, time_indexes = group_point_indexes(times)
+
+            for cur_time, indexes in zip(unique_times, time_indexes):
+                if cur_time not in self.time_counts:
+                    self.time_counts[cur_time] = np.zeros(
+                        (self.grid_size, self.grid_size)
+                    )
+                    self.time_sizes[cur_time] = 0
+
+                self.time_counts[cur_time] += bin_points(
+                    xs[indexes],
+                    ys[indexes],
+                    self.x_range,
+                    self.y_range,
+                    self.grid_size,
+                )
+                self.time_sizes[cur_time] += len(indexes)
+
+        return self
+
+    def _get_density(self, counts: np.ndarray, total: int) -> np.ndarray:
+        """Smooth one histogram into a density grid."""
+        if total == 0:
+            return np.zeros_like(counts)
+
+        bw = get_silverman_bandwidth(min(self.max_sample, total))
+        return smooth_binned_counts(counts, bw, total, self.x_range, self.y_range)
+
+    def finalize(
+        self,
+        grid_encoding: Literal["json", "float16", "uint8", "uint16"] = "json",
+    ) -> dict:
+        """Generate the grid dictionary from all the added points.
+
+        Args:
+            grid_encoding ("json" | "float16" | "uint8" | "uint16", optional): How
+                to store the grids. Defaults to "json".
+
+        Returns:
+            dict: A dictionary object encodes the contour plot.
+        """
+        if self.total == 0:
+            raise ValueError("Add points with partial_fit() before finalize().")
+
+        grid_density_json = {
+            "grid": encode_grid(
+                self._get_density(self.counts, self.total), grid_encoding
+            ),
+            "xRange": [float(self.x_range[0]), float(self.x_range[1])],
+            "yRange": [float(self.y_range[0]), float(self.y_range[1])],
+            "padded": True,
+            "sampleSize": self.total,
+            "totalPointSize": self.total,
+        }
 
-            # Sklearn
-            log_density = kde.score_samples(grid)
-            log_density = np.exp(log_density)
-            grid_density = np.reshape(log_density, xx.shape)
+        if self.group_names is not None:
+            grid_density_json["groupGrids"] = {}
+            grid_density_json["groupTotalPointSizes"] = {}
+            grid_density_json["groupNames"] = self.group_names
 
-            # Register this time group
-            grid_density_json["timeGrids"][cur_time] = (
-                grid_density.astype(float).round(4).tolist()
-            )
-            grid_density_json["timeCounter"][cur_time] = cur_projected_emb.shape[0]
+            for cur_label, name in enumerate(self.group_names):
+                group_size = int(self.group_sizes[cur_label])
+                grid_density = self._get_density(
+                    self.group_counts[cur_label], group_size
+                )
 
-    return grid_density_json
+                grid_density_json["groupGrids"][name] = encode_grid(
+                    grid_density, grid_encoding
+                )
+                grid_density_json["groupTotalPointSizes"][name] = group_size
+
+        if len(self.time_counts) > 0:
+            grid_density_json["timeGrids"] = {}
+            grid_density_json["timeCounter"] = {}
+            grid_density_json["timeFormat"] = self.time_format
+
+            for cur_time in sorted(self.time_counts):
+                time_size = self.time_sizes[cur_time]
+                grid_density = self._get_density(self.time_counts[cur_time], time_size)
+
+                grid_density_json["timeGrids"][cur_time] = encode_grid(
+                    grid_density, grid_encoding
+                )
+                grid_density_json["timeCounter"][cur_time] = time_size
+
+        return grid_density_json
+
+    def save(self, state_dir: str):
+        """Save the histograms to a directory, so that more points can be added
+        to a builder from load() later.
+
+        Args:
+            state_dir (str): Directory of the builder state
+        """
+        os.makedirs(state_dir, exist_ok=True)
+        times = list(self.time_counts)
+
+        arrays = {"counts": self.counts}
+        if self.group_counts is not None:
+            arrays["group_counts"] = self.group_counts
+            arrays["group_sizes"] = self.group_sizes
+        if len(times) > 0:
+            arrays["time_counts"] = np.stack([self.time_counts[t] for t in times])
+
+        np.savez(join(state_dir, "contour.npz"), **arrays)
+
+        meta = {
+            "xDomain": self.x_domain,
+            "yDomain": self.y_domain,
+            "gridSize": self.grid_size,
+            "maxSample": self.max_sample,
+            "groupNames": self.group_names,
+            "timeFormat": self.time_format,
+            "total": self.total,
+            "times": times,
+            "timeSizes": [self.time_sizes[t] for t in times],
+        }
+
+        with open(join(state_dir, "contour.json"), "w", encoding="utf8") as fp:
+            json.dump(meta, fp, default=_json_default)
+
+    @classmethod
+    def load(cls, state_dir: str) -> "ContourBuilder":
+        """Load a builder saved by save().
+
+        Args:
+            state_dir (str): Directory of the builder state
+
+        Returns:
+            ContourBuilder: The loaded builder
+        """
+        with open(join(state_dir, "contour.json"), "r", encoding="utf8") as fp:
+            meta = json.load(fp)
+
+        builder = cls(
+            meta["xDomain"],
+            meta["yDomain"],
+            grid_size=meta["gridSize"],
+            max_sample=meta["maxSample"],
+            group_names=meta["groupNames"],
+            time_format=meta["timeFormat"],
+        )
+        builder.total = meta["total"]
+
+        with np.load(join(state_dir, "contour.npz")) as arrays:
+            builder.counts = arrays["counts"]
+
+            if builder.group_names is not None:
+                builder.group_counts = arrays["group_counts"]
+                builder.group_sizes = arrays["group_sizes"]
+
+            for i, cur_time in enumerate(meta["times"]):
+                builder.time_counts[cur_time] = arrays["time_counts"][i]
+                builder.time_sizes[cur_time] = meta["timeSizes"][i]
+
+        return builder
+
+
+def top_n_sparse(matrix: csr_matrix, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the indices and values of the top n values in each row of a sparse
+    matrix. All rows are processed at once on the CSR arrays.
+
+    Args:
+        matrix (csr_matrix): The sparse matrix from which to get the top n values
+        n (int): The number of highest values to extract from each row
+
+    Returns:
+        np.ndarray: A (rows, n) int array of the top n column indices per row,
+            sorted by descending values. Tied values are ordered by ascending
+            column index, so tiles with tied tf-idf scores keep the words that
+            come first in the vocabulary. Rows with fewer than n stored values
+            are padded with -1.
+        np.ndarray: A (rows, n) float array of the corresponding values, padded
+            with 0.
+    """
+    matrix = csr_matrix(matrix)
+    matrix.sum_duplicates()
+    row_num = matrix.shape[0]
+
+    # Sort all stored values by row, then by descending value. Ties are broken
+    # by the column index so the result is deterministic.
+    row_ids = np.repeat(np.arange(row_num), np.diff(matrix.indptr))
+    order = np.lexsort((matrix.indices, -matrix.data, row_ids))
+
+    # Rank of each value within its row
+    ranks = np.arange(len(order)) - matrix.indptr[row_ids[order]]
+    is_top = ranks < n
+    top_order = order[is_top]
+    top_rows = row_ids[top_order]
+    top_ranks = ranks[is_top]
+
+    indices = np.full((row_num, n), -1, dtype=np.int64)
+    values = np.zeros((row_num, n), dtype=np.float64)
+    indices[top_rows, top_ranks] = matrix.indices[top_order]
+    values[top_rows, top_ranks] = matrix.data[top_order]
+
+    return indices, values
 
 
 def top_n_idx_sparse(matrix: csr_matrix, n: int) -> np.ndarray:
     """Return indices of top n values in each row of a sparse matrix
-    Retrieved from:
-        https://github.com/MaartenGr/BERTopic/blob/master/bertopic/_bertopic.py#L2801
     Arguments:
         matrix: The sparse matrix from which to get the top n indices per row
         n: The number of highest values to extract from each row
     Returns:
-        indices: The top n indices per row
+        indices: The top n indices per row, sorted by descending values and
+            padded with -1
     """
-    indices = []
-    for le, ri in zip(matrix.indptr[:-1], matrix.indptr[1:]):
-        n_row_pick = min(n, ri - le)
-        values = matrix.indices[
-            le + np.argpartition(matrix.data[le:ri], -n_row_pick)[-n_row_pick:]
-        ]
-        values = [
-            values[index] if len(values) >= index + 1 else None for index in range(n)
-        ]
-        indices.append(values)
-    return np.array(indices)
+    return top_n_sparse(matrix, n)[0]
 
 
 def top_n_values_sparse(matrix: csr_matrix, indices: np.ndarray) -> np.ndarray:
     """Return the top n values for each row in a sparse matrix
     Arguments:
         matrix: The sparse matrix from which to get the top n indices per row
-        indices: The top n indices per row
+        indices: The top n indices per row, padded with -1
     Returns:
         top_values: The top n scores per row
     """
-    top_values = []
-    for row in range(indices.shape[0]):
-        scores = np.array(
-            [matrix[row, c] if c is not None else 0 for c in indices[row, :]]
-        )
-        top_values.append(scores)
-    return np.array(top_values)
+    indices = np.asarray(indices, dtype=np.int64)
+    rows = np.repeat(np.arange(indices.shape[0]), indices.shape[1])
+    columns = indices.ravel()
+    is_valid = columns >= 0
+
+    top_values = np.zeros(len(columns), dtype=np.float64)
+    if np.any(is_valid):
+        top_values[is_valid] = np.asarray(
+            csr_matrix(matrix)[rows[is_valid], columns[is_valid]]
+        ).ravel()
+
+    return top_values.reshape(indices.shape)
 
 
 def merge_leaves_before_level(root: Node, target_level: int) -> Tuple[list, list, dict]:
@@ -404,7 +1172,7 @@ def merge_leaves_before_level(root: Node, target_level: int) -> Tuple[list, list
     return csr_row_indexes, csr_column_indexes, row_pos_map
 
 
-def get_tile_topics(count_mat, row_pos_map, ngrams, top_k=10):
+def get_tile_topics(count_mat, row_pos_map, ngrams, top_k=10, rows=None):
     """Get the top-k important keywords from all rows in the count_mat.
 
     Args:
@@ -413,19 +1181,20 @@ def get_tile_topics(count_mat, row_pos_map, ngrams, top_k=10):
             leaf node's location in the quadtree
         ngrams (list[str]): Feature names in the count_mat
         top_k (int): Number of keywords to extract
+        rows (np.ndarray | None): Only extract keywords of these rows, while the
+            idf weights are still computed from all rows. The keys of row_pos_map
+            are then indices into rows. Defaults to None (all rows).
     """
 
     # Compute tf-idf score
     t_tf_idf_model = TfidfTransformer()
-    t_tf_idf = t_tf_idf_model.fit_transform(count_mat)
-
-    # Get words with top scores for each tile
-    indices = top_n_idx_sparse(t_tf_idf, top_k)
-    scores = top_n_values_sparse(t_tf_idf, indices)
+    if rows is None:
+        t_tf_idf = t_tf_idf_model.fit_transform(count_mat)
+    else:
+        t_tf_idf = t_tf_idf_model.fit(count_mat).transform(count_mat[rows])
 
-    sorted_indices = np.argsort(scores, 1)
-    indices = np.take_along_axis(indices, sorted_indices, axis=1)
-    scores = np.take_along_axis(scores, sorted_indices, axis=1)
+    # Get words with top scores for each tile (sorted by descending scores)
+    indices, scores = top_n_sparse(t_tf_idf, top_k)
 
     # Store these keywords
     tile_topics = []
@@ -433,9 +1202,9 @@ def get_tile_topics(count_mat, row_pos_map, ngrams, top_k=10):
     for r in row_pos_map:
         word_scores = [
             (ngrams[word_index], round(score, 4))
-            if word_index is not None and score > 0
+            if word_index >= 0 and score > 0
             else ("", 0.00001)
-            for word_index, score in zip(indices[r][::-1], scores[r][::-1])
+            for word_index, score in zip(indices[r].tolist(), scores[r].tolist())
         ]
 
         tile_topics.append({"w": word_scores, "p": row_pos_map[r]})
@@ -443,15 +1212,481 @@ def get_tile_topics(count_mat, row_pos_map, ngrams, top_k=10):
     return tile_topics
 
 
-def extract_level_topics(
-    root: Node,
+def get_tree_extent(xs: np.ndarray, ys: np.ndarray) -> list[list[int]]:
+    """Compute the quadtree extent that covers all points. It is the same extent
+    as quadtreed3.Quadtree: a square that starts at the floored min coordinates,
+    and its side length is the smallest power of 2 that covers the max
+    coordinates.
+
+    Args:
+        xs (np.ndarray): x coordinates of the points
+        ys (np.ndarray): y coordinates of the points
+
+    Returns:
+        list[list[int]]: [[x0, y0], [x1, y1]] of the tree extent
+    """
+    x0, y0 = math.floor(np.min(xs)), math.floor(np.min(ys))
+    x_max, y_max = np.max(xs), np.max(ys)
+
+    length = 1
+    while x_max >= x0 + length or y_max >= y0 + length:
+        length *= 2
+
+    return [[x0, y0], [x0 + length, y0 + length]]
+
+
+def get_point_cells(
+    xs: np.ndarray,
+    ys: np.ndarray,
+    tree_extent: list[list[float]],
+    level: int,
+    chunk_size: int = 2**20,
+) -> np.ndarray:
+    """Quantize points to the integer cells of the tree extent at a level.
+
+    Args:
+        xs (np.ndarray): x coordinates of the points
+        ys (np.ndarray): y coordinates of the points
+        tree_extent (list[list[float]]): [[x0, y0], [x1, y1]] of the tree extent
+        level (int): Level of the cells. There are 2^level x 2^level cells.
+        chunk_size (int, optional): Number of points to quantize at a time.
+            Defaults to 2**20.
+
+    Returns:
+        np.ndarray: A (points, 2) int array of [x index, y index] of each point
+    """
+    (x0, y0), (x1, _) = tree_extent
+    step_size = (x1 - x0) / (2**level)
+    max_index = 2**level - 1
+    cells = np.zeros((len(xs), 2), dtype=np.int64)
+
+    # Cast coordinates to float64 in chunks, so float32 inputs are not copied
+    for start in range(0, len(xs), chunk_size):
+        end = start + chunk_size
+        xis = np.floor_divide(
+            np.asarray(xs[start:end], dtype=np.float64) - x0, step_size
+        )
+        yis = np.floor_divide(
+            np.asarray(ys[start:end], dtype=np.float64) - y0, step_size
+        )
+        cells[start:end, 0] = np.clip(xis, 0, max_index)
+        cells[start:end, 1] = np.clip(yis, 0, max_index)
+
+    return cells
+
+
+def get_morton_codes(cells: np.ndarray, level: int) -> np.ndarray:
+    """Encode cell coordinates as Morton codes (Z-order). At each level, the
+    two bits of a code are the quadrant index (2 * y bit + x bit) used by
+    quadtreed3, so sorting by codes follows the quadtree's depth-first order.
+    The tiles of a coarser level l are the codes shifted by 2 * (level - l).
+
+    Args:
+        cells (np.ndarray): A (n, 2) int array of cell coordinates
+        level (int): Level of the cells
+
+    Returns:
+        np.ndarray: A (n,) int64 array of Morton codes
+    """
+    xis = cells[:, 0].astype(np.int64)
+    yis = cells[:, 1].astype(np.int64)
+    codes = np.zeros(len(cells), dtype=np.int64)
+
+    for b in range(level):
+        codes |= ((xis >> b) & 1) << (2 * b)
+        codes |= ((yis >> b) & 1) << (2 * b + 1)
+
+    return codes
+
+
+def get_point_tiles(
+    xs: np.ndarray, ys: np.ndarray, tree_extent: list[list[float]], level: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Assign points to the non-empty tiles at a quadtree level. The tiles are the
+    same as the leaves of merge_leaves_before_level() and listed in the same
+    depth-first order.
+
+    Args:
+        xs (np.ndarray): x coordinates of the points
+        ys (np.ndarray): y coordinates of the points
+        tree_extent (list[list[float]]): [[x0, y0], [x1, y1]] of the tree extent
+        level (int): Level of the tiles
+
+    Returns:
+        np.ndarray: A (points,) int array of the tile row of each point
+        np.ndarray: A (tiles, 2) int array of tile cell coordinates
+    """
+    point_cells = get_point_cells(xs, ys, tree_extent, level)
+    codes = get_morton_codes(point_cells, level)
+    _, first_index, tile_rows = np.unique(codes, return_index=True, return_inverse=True)
+
+    return tile_rows.ravel(), point_cells[first_index]
+
+
+def get_tile_cells(root: Node, target_level: int) -> np.ndarray:
+    """Get the integer cell coordinates of all tiles at the target level. The root
+    must be merged with merge_leaves_before_level(root, target_level) first, and
+    the tiles are listed in the same order as the rows from that function.
+
+    Args:
+        root (Node): Root node
+        target_level (int): Target level
+
+    Returns:
+        np.ndarray: A (tiles, 2) int array of [x index, y index] of each tile in
+            the 2^target_level x 2^target_level grid of the tree extent
+    """
+    x0, y0, x1, y1 = root.position
+    step_size = (x1 - x0) / (2**target_level)
+
+    tile_cells = []
+    stack = [root]
+
+    while len(stack) > 0:
+        cur_node = stack.pop()
+
+        if cur_node.level >= target_level:
+            # Merged node, its position is the tile
+            xi = round((cur_node.position[0] - x0) / step_size)
+            yi = round((cur_node.position[1] - y0) / step_size)
+            tile_cells.append((xi, yi))
+
+        elif len(cur_node.children) == 0:
+            # Leaf node before the target level, find the tile of its data point
+            x, y = cur_node.data[0]["x"], cur_node.data[0]["y"]
+            tile_cells.append((int((x - x0) // step_size), int((y - y0) // step_size)))
+
+        else:
+            for c in cur_node.children[::-1]:
+                if c is not None:
+                    stack.append(c)
+
+    return np.array(tile_cells, dtype=np.int64).reshape(-1, 2)
+
+
+def get_tile_positions(
+    tile_cells: np.ndarray, tree_position: list[float], level: int
+) -> dict:
+    """Get the bounding boxes of tiles from their cell coordinates.
+
+    Args:
+        tile_cells (np.ndarray): A (tiles, 2) int array of tile cell coordinates
+        tree_position (list[float]): [x0, y0, x1, y1] of the tree extent
+        level (int): Level of the tiles
+
+    Returns:
+        dict: A dictionary that maps row index to the tile's [x0, y0, x1, y1]
+    """
+    x0, y0, x1, _ = tree_position
+    step_size = (x1 - x0) / (2**level)
+
+    row_pos_map = {}
+    for r, (xi, yi) in enumerate(tile_cells.tolist()):
+        xi0, yi0 = x0 + xi * step_size, y0 + yi * step_size
+        xi1, yi1 = xi0 + step_size, yi0 + step_size
+        row_pos_map[r] = list(map(lambda x: round(x, 3), [xi0, yi0, xi1, yi1]))
+
+    return row_pos_map
+
+
+def aggregate_tile_counts(
+    tile_count_mat: csr_matrix, tile_cells: np.ndarray
+) -> Tuple[csr_matrix, np.ndarray]:
+    """Merge tiles into their parent tiles one level up the quadtree.
+
+    Args:
+        tile_count_mat (csr_matrix): Count matrix where each row is a tile
+        tile_cells (np.ndarray): A (tiles, 2) int array of tile cell coordinates
+
+    Returns:
+        csr_matrix: Count matrix where each row is a parent tile
+        np.ndarray: A (parent tiles, 2) int array of parent cell coordinates
+    """
+    parent_cells = tile_cells // 2
+
+    # Order parents by their first child to keep the quadtree traversal order
+    _, first_index, inverse = np.unique(
+        parent_cells, axis=0, return_index=True, return_inverse=True
+    )
+    parent_order = np.argsort(first_index, kind="stable")
+    parent_rows = np.empty_like(parent_order)
+    parent_rows[parent_order] = np.arange(len(parent_order))
+    child_parent_rows = parent_rows[inverse.ravel()]
+
+    # Each parent row is the sum of its children's rows
+    reduce_mat = csr_matrix(
+        (
+            np.ones(len(child_parent_rows), dtype=tile_count_mat.dtype),
+            (child_parent_rows, np.arange(len(child_parent_rows))),
+        ),
+        shape=(len(parent_order), len(child_parent_rows)),
+    )
+
+    return reduce_mat @ tile_count_mat, parent_cells[first_index[parent_order]]
+
+
+def save_csr_arrays(matrix: csr_matrix, path_prefix: str):
+    """Save a CSR matrix as separate .npy arrays, so that it can be loaded as
+    memory-mapped arrays with load_csr_arrays().
+
+    Args:
+        matrix (csr_matrix): The matrix to save
+        path_prefix (str): Path prefix of the saved arrays
+    """
+    matrix = csr_matrix(matrix)
+    np.save(f"{path_prefix}-data.npy", matrix.data)
+    np.save(f"{path_prefix}-indices.npy", matrix.indices)
+    np.save(f"{path_prefix}-indptr.npy", matrix.indptr)
+    np.save(f"{path_prefix}-shape.npy", np.array(matrix.shape, dtype=np.int64))
+
+
+def load_csr_arrays(path_prefix: str, mmap_mode: str | None = "r") -> csr_matrix:
+    """Load a CSR matrix saved by save_csr_arrays().
+
+    Args:
+        path_prefix (str): Path prefix of the saved arrays
+        mmap_mode (str | None, optional): Memory-map mode for np.load(). Defaults
+            to "r".
+
+    Returns:
+        csr_matrix: The loaded matrix
+    """
+    data = np.load(f"{path_prefix}-data.npy", mmap_mode=mmap_mode)
+    indices = np.load(f"{path_prefix}-indices.npy", mmap_mode=mmap_mode)
+    indptr = np.load(f"{path_prefix}-indptr.npy", mmap_mode=mmap_mode)
+    shape = tuple(np.load(f"{path_prefix}-shape.npy").tolist())
+
+    return csr_matrix((data, indices, indptr), shape=shape, copy=False)
+
+
+class StringArray:
+    """A read-only array of strings stored as UTF-8 bytes and int64 offsets.
+    Unlike a fixed-width numpy string array, one long string does not pad every
+    other entry to its width, and both arrays can be memory-mapped.
+
+    Args:
+        offsets (np.ndarray): A (n + 1,) int64 array of byte offsets. String i
+            is data[offsets[i]:offsets[i + 1]].
+        data (np.ndarray): A uint8 array of the concatenated UTF-8 bytes
+    """
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += len(self)
+
+            start, end = self.offsets[index], self.offsets[index + 1]
+            return bytes(self.data[start:end]).decode("utf-8")
+
+        return np.array(
+            [self[i] for i in np.arange(len(self))[index].tolist()], dtype=object
+        )
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        return np.array(list(self), dtype=object if dtype is None else dtype)
+
+
+def save_string_array(strings: Iterable[str], path_prefix: str):
+    """Save strings as UTF-8 bytes and offsets in .npy files, so that they can
+    be loaded as memory-mapped arrays with load_string_array().
+
+    Args:
+        strings (Iterable[str]): The strings to save
+        path_prefix (str): Path prefix of the saved arrays
+    """
+    encoded = [str(string).encode("utf-8") for string in strings]
+
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded], dtype=np.int64)
+
+    np.save(f"{path_prefix}-offsets.npy", offsets)
+    np.save(f"{path_prefix}-bytes.npy", np.frombuffer(b"".join(encoded), np.uint8))
+
+
+def load_string_array(path_prefix: str, mmap_mode: str | None = "r") -> StringArray:
+    """Load strings saved by save_string_array().
+
+    Args:
+        path_prefix (str): Path prefix of the saved arrays
+        mmap_mode (str | None, optional): Memory-map mode for np.load(). Defaults
+            to "r".
+
+    Returns:
+        StringArray: The loaded strings
+    """
+    return StringArray(
+        np.load(f"{path_prefix}-offsets.npy", mmap_mode=mmap_mode),
+        np.load(f"{path_prefix}-bytes.npy", mmap_mode=mmap_mode),
+    )
+
+
+def get_level_topics(
+    tile_count_mat: csr_matrix,
+    tile_cells: np.ndarray,
+    tree_position: list[float],
+    level: int,
+    ngrams: list[str],
+    text_num: int,
+    rows: np.ndarray | None = None,
+) -> list[dict]:
+    """Extract topics for all tiles at one level.
+
+    Args:
+        tile_count_mat (csr_matrix): Count matrix where each row is a tile
+        tile_cells (np.ndarray): A (tiles, 2) int array of tile cell coordinates
+        tree_position (list[float]): [x0, y0, x1, y1] of the tree extent
+        level (int): Level of the tiles
+        ngrams (list[str]): n-gram list for the count vectorizer
+        text_num (int): Number of texts in the corpus
+        rows (np.ndarray | None, optional): Only extract topics of the tiles at
+            these rows. Defaults to None (all tiles).
+
+    Returns:
+        list[dict]: Topics of all tiles (or the given rows) at this level
+    """
+    if rows is not None:
+        tile_cells = tile_cells[rows]
+
+    row_pos_map = get_tile_positions(tile_cells, tree_position, level)
+
+    # Keep one row per text (empty rows after the tiles), so the idf weights
+    # are computed over the same number of rows as a texts x texts tile matrix
+    new_count_mat = csr_matrix(tile_count_mat)
+    new_count_mat = csr_matrix(
+        (
+            new_count_mat.data,
+            new_count_mat.indices,
+            np.pad(
+                new_count_mat.indptr,
+                (0, text_num - new_count_mat.shape[0]),
+                mode="edge",
+            ),
+        ),
+        shape=(text_num, new_count_mat.shape[1]),
+    )
+
+    # Compute t-tf-idf scores and extract keywords
+    return get_tile_topics(new_count_mat, row_pos_map, ngrams, rows=rows)
+
+
+def _get_level_topics_task(kwargs: dict) -> list[dict]:
+    """Run get_level_topics() in a worker process on memory-mapped arrays."""
+    array_dir = kwargs["array_dir"]
+    level = kwargs["level"]
+
+    return get_level_topics(
+        load_csr_arrays(join(array_dir, f"level-{level}")),
+        np.load(join(array_dir, f"level-{level}-cells.npy")),
+        kwargs["tree_position"],
+        level,
+        load_string_array(join(array_dir, "ngrams")),
+        kwargs["text_num"],
+    )
+
+
+def get_level_tile_topics(
+    tile_count_mat: csr_matrix,
+    tile_cells: np.ndarray,
+    tree_position: list[float],
+    ngrams: list[str],
+    text_num: int,
+    min_level: int,
+    max_level: int,
+    n_jobs: int | None = 1,
+) -> dict:
+    """Extract topics for all tiles from max_level to min_level. The tile counts
+    of each level are aggregated from the level below.
+
+    Args:
+        tile_count_mat (csr_matrix): Count matrix where each row is a tile at
+            max_level
+        tile_cells (np.ndarray): A (tiles, 2) int array of tile cell coordinates
+            at max_level
+        tree_position (list[float]): [x0, y0, x1, y1] of the tree extent
+        ngrams (list[str]): n-gram list for the count vectorizer
+        text_num (int): Number of texts in the corpus
+        min_level (int): The coarsest level to extract
+        max_level (int): The deepest level to extract
+        n_jobs (int | None, optional): Number of processes to extract levels in
+            parallel. -1 means using all CPUs. Workers read the tile count
+            matrices from memory-mapped files instead of receiving copies.
+            Defaults to 1.
+
+    Returns:
+        dict: A dictionary that maps each level to its tile topics
+    """
+    level_tile_topics = {}
+    min_level, max_level = int(min_level), int(max_level)
+    levels = list(range(max_level, min_level - 1, -1))
+    n_workers = min(_get_n_workers(n_jobs), len(levels))
+
+    if n_workers <= 1:
+        for level in tqdm(levels):
+            if level < max_level:
+                tile_count_mat, tile_cells = aggregate_tile_counts(
+                    tile_count_mat, tile_cells
+                )
+
+            level_tile_topics[level] = get_level_topics(
+                tile_count_mat, tile_cells, tree_position, level, ngrams, text_num
+            )
+
+        return level_tile_topics
+
+    with tempfile.TemporaryDirectory(prefix="wizmap-") as array_dir:
+        # Write all levels to disk so workers can memory-map them
+        save_string_array(ngrams, join(array_dir, "ngrams"))
+
+        for level in levels:
+            if level < max_level:
+                tile_count_mat, tile_cells = aggregate_tile_counts(
+                    tile_count_mat, tile_cells
+                )
+
+            save_csr_arrays(tile_count_mat, join(array_dir, f"level-{level}"))
+            np.save(join(array_dir, f"level-{level}-cells.npy"), tile_cells)
+
+        tasks = [
+            {
+                "array_dir": array_dir,
+                "level": level,
+                "tree_position": tree_position,
+                "text_num": text_num,
+            }
+            for level in levels
+        ]
+
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = executor.map(_get_level_topics_task, tasks)
+
+            for level, tile_topics in tqdm(zip(levels, results), total=len(levels)):
+                level_tile_topics[level] = tile_topics
+
+    return level_tile_topics
+
+
+def extract_level_topics(
+    root: Node,
     count_mat: csr_matrix,
     texts: list[str],
     ngrams: list[str],
     min_level=None,
     max_level=None,
 ):
-    """Extract topics for all leaf nodes at all levels of the quadtree.
+    """Extract topics for all leaf nodes at all levels of the quadtree. Tiles are
+    extracted from the tree once at max_level, and the tile counts of each coarser
+    level are aggregated from the level below.
 
     Args:
         root (Noe): Quadtree node
@@ -459,36 +1694,36 @@ def extract_level_topics(
         texts (list[str]): A list of all the embeddings' texts
         ngrams (list[str]): n-gram list for the count vectorizer
     """
-
-    level_tile_topics = {}
-
     if min_level is None:
         min_level = 0
 
     if max_level is None:
         max_level = root.height
 
-    for level in tqdm(list(range(max_level, min_level - 1, -1))):
-        # Create a sparse matrix
-        csr_row_indexes, csr_column_indexes, row_node_map = merge_leaves_before_level(
-            root, level
-        )
-
-        csr_data = [1 for _ in range(len(csr_row_indexes))]
-        tile_mat = csr_matrix(
-            (csr_data, (csr_row_indexes, csr_column_indexes)),
-            shape=(len(texts), len(texts)),
-        )
-
-        # Transform the count matrix
-        new_count_mat = tile_mat @ count_mat
+    max_level = int(max_level)
 
-        # Compute t-tf-idf scores and extract keywords
-        tile_topics = get_tile_topics(new_count_mat, row_node_map, ngrams)
+    # Create a sparse matrix for the tiles at the deepest level
+    csr_row_indexes, csr_column_indexes, _ = merge_leaves_before_level(root, max_level)
+    tile_cells = get_tile_cells(root, max_level)
 
-        level_tile_topics[level] = tile_topics
+    csr_data = np.ones(len(csr_row_indexes), dtype=count_mat.dtype)
+    tile_mat = csr_matrix(
+        (csr_data, (csr_row_indexes, csr_column_indexes)),
+        shape=(len(tile_cells), count_mat.shape[0]),
+    )
 
-    return level_tile_topics
+    # Transform the count matrix
+    tile_count_mat = tile_mat @ count_mat
+
+    return get_level_tile_topics(
+        tile_count_mat,
+        tile_cells,
+        root.position,
+        ngrams,
+        len(texts),
+        min_level,
+        max_level,
+    )
 
 
 def select_topic_levels(
@@ -517,159 +1752,2144 @@ def select_topic_levels(
     world_length = max(x_domain[1] - x_domain[0], y_domain[1] - y_domain[0])
     tree_to_world_scale = (tree_extent[1][0] - tree_extent[0][0]) / world_length
 
-    scale = 1
-    selected_levels = []
+    scale = 1
+    selected_levels = []
+
+    while scale <= max_zoom_scale:
+        best_level = 1
+
+        # Check if 'np.inf' exists (NumPy 2.0+) and use it instead of deprecated 'np.Infinity'
+        best_tile_width_diff = np.inf if hasattr(np, "inf") else np.Infinity
+
+        for l in range(1, 21):
+            tile_num = 2**l
+            svg_scaled_length = scale * svg_length * tree_to_world_scale
+            tile_width = svg_scaled_length / tile_num
+
+            if abs(tile_width - ideal_tile_width) < best_tile_width_diff:
+                best_tile_width_diff = abs(tile_width - ideal_tile_width)
+                best_level = l
+
+        selected_levels.append(best_level)
+        scale += 0.5
+
+    return np.min(selected_levels), np.max(selected_levels)
+
+
+def iter_batches(items: Iterable, batch_size: int) -> Iterator[list]:
+    """Split an iterable into lists of at most batch_size items.
+
+    Args:
+        items (Iterable): Items to split
+        batch_size (int): Max number of items in a batch
+
+    Yields:
+        list: A batch of items
+    """
+    batch = []
+
+    for item in items:
+        batch.append(item)
+
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    if len(batch) > 0:
+        yield batch
+
+
+def get_count_cache_key(texts: Iterable[str], settings: dict) -> str:
+    """Compute the content hash of texts and vectorizer settings.
+
+    Args:
+        texts (Iterable[str]): Texts to count
+        settings (dict): JSON serializable vectorizer settings
+
+    Returns:
+        str: A hex digest
+    """
+    hasher = hashlib.sha256()
+    hasher.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+
+    for text in _iter_values(texts):
+        text_bytes = str(text).encode("utf-8")
+        hasher.update(len(text_bytes).to_bytes(8, "little"))
+        hasher.update(text_bytes)
+
+    return hasher.hexdigest()
+
+
+def _get_dir_size(path: str) -> int:
+    """Get the total size of files in a directory."""
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def evict_count_cache(cache_dir: str, cache_max_bytes: int, keep: str | None = None):
+    """Remove the least recently used cache entries until the cache fits in
+    cache_max_bytes.
+
+    Args:
+        cache_dir (str): Cache directory
+        cache_max_bytes (int): Max total size of the cache in bytes
+        keep (str | None, optional): A cache key that should never be removed.
+            Defaults to None.
+    """
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_dir() and not entry.name.startswith("."):
+            entries.append((entry.stat().st_mtime, entry.name, _get_dir_size(entry)))
+
+    total_size = sum(e[2] for e in entries)
+
+    for _, name, size in sorted(entries):
+        if total_size <= cache_max_bytes:
+            break
+
+        if name == keep:
+            continue
+
+        shutil.rmtree(join(cache_dir, name), ignore_errors=True)
+        total_size -= size
+
+
+def _imap_in_pool(fn: Callable, tasks: Iterable, n_workers: int) -> Iterator:
+    """Lazily map a function over tasks in a process pool, yielding results in
+    the task order. At most 2 * n_workers tasks are in flight at a time, so that
+    a long stream of tasks is never fully loaded in memory.
+
+    Args:
+        fn (Callable): A picklable function that takes one task
+        tasks (Iterable): Tasks to process
+        n_workers (int): Number of worker processes. With 1 worker, tasks run in
+            the current process.
+
+    Yields:
+        The result of each task
+    """
+    if n_workers <= 1:
+        yield from map(fn, tasks)
+        return
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = deque()
+
+        for task in tasks:
+            futures.append(executor.submit(fn, task))
+
+            if len(futures) >= 2 * n_workers:
+                yield futures.popleft().result()
+
+        while len(futures) > 0:
+            yield futures.popleft().result()
+
+
+def _count_batch_task(kwargs: dict) -> Tuple[csr_matrix, np.ndarray]:
+    """Count the words in a batch of texts with its own vocabulary."""
+    cv = CountVectorizer(
+        stop_words=kwargs["stop_words"],
+        ngram_range=kwargs["ngram_range"],
+        analyzer=kwargs["analyzer"] or "word",
+    )
+
+    try:
+        count_mat = cv.fit_transform(kwargs["texts"])
+    except ValueError as error:
+        # Only skip batches whose texts are all empty after removing stop words,
+        # other errors (e.g., from a custom analyzer) are raised
+        if "empty vocabulary" not in str(error):
+            raise
+
+        return csr_matrix((len(kwargs["texts"]), 0), dtype=np.int64), np.array([])
+
+    return count_mat, cv.get_feature_names_out()
+
+
+def _hash_batch_task(kwargs: dict) -> Tuple[csr_matrix, np.ndarray, np.ndarray]:
+    """Count the words in a batch of texts with hashed columns. It also returns
+    the column of every unique word in this batch to name the columns."""
+    # HashingVectorizer is FeatureHasher over the analyzed words, we call them
+    # separately to analyze each text once and also look up the words' columns
+    analyzer = HashingVectorizer(
+        stop_words=kwargs["stop_words"],
+        ngram_range=kwargs["ngram_range"],
+        analyzer=kwargs["analyzer"] or "word",
+    ).build_analyzer()
+    hasher = FeatureHasher(
+        n_features=kwargs["n_features"],
+        input_type="string",
+        alternate_sign=False,
+        dtype=np.int64,
+    )
+
+    batch_words = [analyzer(text) for text in kwargs["texts"]]
+    count_mat = hasher.transform(batch_words)
+
+    unique_words = np.array(sorted(set().union(*batch_words)), dtype=object)
+    word_columns = np.array([], dtype=np.int32)
+    if len(unique_words) > 0:
+        word_columns = hasher.transform([[w] for w in unique_words]).indices
+
+    return count_mat, word_columns, unique_words
+
+
+def merge_count_matrices(
+    count_mats: list[csr_matrix], vocabularies: list[np.ndarray]
+) -> Tuple[csr_matrix, np.ndarray]:
+    """Merge count matrices of different texts that are built with their own
+    vocabularies into one matrix over the sorted union vocabulary.
+
+    Args:
+        count_mats (list[csr_matrix]): Count matrices of each batch of texts
+        vocabularies (list[np.ndarray]): Sorted feature names of each matrix
+
+    Returns:
+        csr_matrix: A (all texts, features) count matrix
+        np.ndarray: The sorted feature names
+    """
+    vocabulary = np.array(
+        sorted(set().union(*[v.tolist() for v in vocabularies])), dtype=object
+    )
+
+    aligned_mats = []
+    for count_mat, cur_vocabulary in zip(count_mats, vocabularies):
+        count_mat = csr_matrix(count_mat)
+
+        # Both vocabularies are sorted, so the column order is preserved
+        column_map = np.searchsorted(vocabulary, cur_vocabulary).astype(np.int64)
+        aligned_mats.append(
+            csr_matrix(
+                (count_mat.data, column_map[count_mat.indices], count_mat.indptr),
+                shape=(count_mat.shape[0], len(vocabulary)),
+            )
+        )
+
+    return vstack(aligned_mats, format="csr"), vocabulary
+
+
+def build_count_matrix(
+    texts: Iterable[str],
+    stop_words: list[str] | Literal["english"] = "english",
+    count_backend: Literal["count", "hashing"] = "count",
+    n_features: int = 2**20,
+    batch_size: int = 10000,
+    cache_dir: str | None = None,
+    cache_max_bytes: int = 2**32,
+    ngram_range: Tuple[int, int] = (1, 1),
+    analyzer: Callable[[str], list[str]] | None = None,
+    n_jobs: int | None = 1,
+) -> Tuple[csr_matrix, np.ndarray | StringArray]:
+    """Count the words in all texts.
+
+    Args:
+        texts (Iterable[str]): Texts to count. With the "hashing" backend, it can
+            be any iterable (e.g., a generator that reads a file), and texts are
+            processed in batches without keeping them in memory.
+        stop_words (list[str] | Literal["english"]): Stop words for the vectorizer.
+        count_backend ("count" | "hashing", optional): "count" uses sklearn's
+            CountVectorizer, which builds an unbounded vocabulary in memory.
+            "hashing" hashes words into n_features columns, and keeps the first
+            seen word of each column to name it. Defaults to "count".
+        n_features (int, optional): Number of columns for the "hashing" backend.
+            Defaults to 2**20.
+        batch_size (int, optional): Number of texts in each batch for the
+            "hashing" backend or a parallel run. Defaults to 10000.
+        cache_dir (str | None, optional): A directory to cache count matrices.
+            Entries are keyed by a hash of the texts and the vectorizer settings,
+            and cached matrices are loaded as memory-mapped arrays. texts must
+            be a sequence (not a one-shot iterator) to use the cache. Defaults
+            to None (no cache).
+        cache_max_bytes (int, optional): Max total size of the cache. The least
+            recently used entries are removed first. Defaults to 4 GiB.
+        ngram_range ((int, int), optional): The lower and upper boundary of the
+            n-grams to count. Defaults to (1, 1).
+        analyzer (Callable[[str], list[str]] | None, optional): A custom function
+            that splits a text into features. It replaces the default word
+            tokenizer, stop_words, and ngram_range. It must be picklable (e.g.,
+            a module-level function) when n_jobs > 1. It is identified by its
+            qualified name in the cache key, so lambdas, local functions, and
+            callable objects cannot be used with cache_dir. Defaults to None.
+        n_jobs (int | None, optional): Number of processes to tokenize batches
+            of texts in parallel. -1 means using all CPUs. Batches are merged
+            into the same matrix as a serial run. Defaults to 1.
+
+    Returns:
+        csr_matrix: A (texts, features) count matrix
+        np.ndarray | StringArray: The name of each feature. With the "hashing"
+            backend, unused features have an empty name. Names loaded from the
+            cache are a memory-mapped StringArray.
+    """
+    count_kwargs = {
+        "stop_words": stop_words,
+        "count_backend": count_backend,
+        "n_features": n_features,
+        "batch_size": batch_size,
+        "ngram_range": tuple(ngram_range),
+        "analyzer": analyzer,
+        "n_jobs": n_jobs,
+    }
+
+    if cache_dir is None:
+        return _build_count_matrix(texts, **count_kwargs)
+
+    if iter(texts) is texts:
+        raise ValueError("texts must be a sequence to use the count cache.")
+
+    settings = {
+        # Version of the entry layout, so entries of older layouts are not read
+        "format": 2,
+        "countBackend": count_backend,
+        "stopWords": stop_words if isinstance(stop_words, str) else list(stop_words),
+        "ngramRange": list(ngram_range),
+    }
+    if count_backend == "hashing":
+        settings["nFeatures"] = n_features
+    if analyzer is not None:
+        # Lambdas, closures, bound methods, and callable objects share their
+        # names across different behaviors, so they cannot key the cache
+        if not inspect.isfunction(analyzer) or "<" in analyzer.__qualname__:
+            raise ValueError(
+                "A custom analyzer must be a module-level function to use the "
+                "count cache."
+            )
+
+        settings["analyzer"] = f"{analyzer.__module__}.{analyzer.__qualname__}"
+
+    cache_key = get_count_cache_key(texts, settings)
+    entry_dir = join(cache_dir, cache_key)
+
+    if os.path.isdir(entry_dir):
+        print("Loading the count matrix from the cache...")
+
+        # Mark this entry as recently used
+        os.utime(entry_dir)
+        count_mat = load_csr_arrays(join(entry_dir, "count"))
+        ngrams = load_string_array(join(entry_dir, "ngrams"))
+        return count_mat, ngrams
+
+    count_mat, ngrams = _build_count_matrix(texts, **count_kwargs)
+
+    # Write to a temporary directory first so readers never see partial entries
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=cache_dir)
+    save_csr_arrays(count_mat, join(temp_dir, "count"))
+    save_string_array(ngrams, join(temp_dir, "ngrams"))
+
+    try:
+        os.rename(temp_dir, entry_dir)
+    except OSError:
+        # Another process has written the same entry
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    evict_count_cache(cache_dir, cache_max_bytes, keep=cache_key)
+
+    return count_mat, ngrams
+
+
+def _build_count_matrix(
+    texts: Iterable[str],
+    stop_words: list[str] | Literal["english"],
+    count_backend: Literal["count", "hashing"],
+    n_features: int,
+    batch_size: int,
+    ngram_range: Tuple[int, int],
+    analyzer: Callable[[str], list[str]] | None,
+    n_jobs: int | None,
+) -> Tuple[csr_matrix, np.ndarray]:
+    """Count the words in all texts without caching. See build_count_matrix()."""
+    if count_backend not in ("count", "hashing"):
+        raise ValueError(f"Unknown count backend: {count_backend}")
+
+    n_workers = _get_n_workers(n_jobs)
+    texts = _iter_values(texts)
+
+    if count_backend == "count" and n_workers <= 1:
+        cv = CountVectorizer(
+            stop_words=stop_words,
+            ngram_range=ngram_range,
+            analyzer=analyzer or "word",
+        )
+        count_mat = cv.fit_transform(texts)
+        return count_mat, cv.get_feature_names_out()
+
+    tasks = (
+        {
+            "texts": batch,
+            "stop_words": stop_words,
+            "ngram_range": ngram_range,
+            "analyzer": analyzer,
+            "n_features": n_features,
+        }
+        for batch in iter_batches(texts, batch_size)
+    )
+
+    if count_backend == "count":
+        count_mats, vocabularies = [], []
+
+        for count_mat, vocab in _imap_in_pool(_count_batch_task, tasks, n_workers):
+            count_mats.append(count_mat)
+            vocabularies.append(vocab)
+
+        if len(count_mats) == 0:
+            raise ValueError("texts is empty.")
+
+        # Raise the same error as a single vectorizer if no batch has words
+        if all(len(vocab) == 0 for vocab in vocabularies):
+            raise ValueError(
+                "empty vocabulary; perhaps the documents only contain stop words"
+            )
+
+        return merge_count_matrices(count_mats, vocabularies)
+
+    ngrams = np.full(n_features, "", dtype=object)
+    batch_count_mats = []
+
+    for count_mat, word_columns, unique_words in _imap_in_pool(
+        _hash_batch_task, tasks, n_workers
+    ):
+        batch_count_mats.append(count_mat)
+
+        # Name new columns by their first seen word
+        is_new = ngrams[word_columns] == ""
+        ngrams[word_columns[is_new]] = unique_words[is_new]
+
+    if len(batch_count_mats) == 0:
+        raise ValueError("texts is empty.")
+
+    count_mat = vstack(batch_count_mats, format="csr")
+    return count_mat, ngrams
+
+
+def encode_topic_levels(
+    level_tile_topics: dict,
+    min_level: int,
+    max_level: int,
+    term_num: int = 4,
+    topic_scores: bool = False,
+) -> dict:
+    """Encode the topics of all levels in a compact format. All levels share
+    one term table, and each level stores base64 strings of little-endian typed
+    arrays: tile center x and y coordinates (float32), term indices (term_num
+    per tile), and optionally term scores (float32). Term indices start from 1,
+    and 0 means no term. They are uint16 if the table is small enough, otherwise
+    uint32.
+
+    Args:
+        level_tile_topics (dict): Topics of tiles at each level
+        min_level (int): The min level to encode
+        max_level (int): The max level to encode
+        term_num (int, optional): Number of top terms to keep for each tile.
+            Defaults to 4.
+        topic_scores (bool, optional): Whether to keep the term scores.
+            Defaults to False.
+
+    Returns:
+        dict: A dictionary with keys "encoding", "terms", "termNum", "termType",
+            and "data"
+    """
+    term_ids = {}
+    level_arrays = {}
+
+    for cur_level in range(min_level, max_level + 1):
+        cur_topics = level_tile_topics[cur_level]
+        xs = np.zeros(len(cur_topics), dtype="<f4")
+        ys = np.zeros(len(cur_topics), dtype="<f4")
+        terms = np.zeros((len(cur_topics), term_num), dtype=np.int64)
+        scores = np.zeros((len(cur_topics), term_num), dtype="<f4")
+
+        for i, topic in enumerate(cur_topics):
+            xs[i] = round((topic["p"][0] + topic["p"][2]) / 2, 3)
+            ys[i] = round((topic["p"][1] + topic["p"][3]) / 2, 3)
+
+            for j, (word, score) in enumerate(topic["w"][:term_num]):
+                if word != "":
+                    terms[i, j] = term_ids.setdefault(word, len(term_ids) + 1)
+                scores[i, j] = score
+
+        level_arrays[cur_level] = (xs, ys, terms, scores)
+
+    term_type = "uint16" if len(term_ids) <= np.iinfo(np.uint16).max else "uint32"
+    term_dtype = "<u2" if term_type == "uint16" else "<u4"
+    data = {}
+
+    for cur_level, (xs, ys, terms, scores) in level_arrays.items():
+        data[cur_level] = {
+            "x": base64.b64encode(xs.tobytes()).decode("utf-8"),
+            "y": base64.b64encode(ys.tobytes()).decode("utf-8"),
+            "t": base64.b64encode(terms.astype(term_dtype).tobytes()).decode("utf-8"),
+        }
+
+        if topic_scores:
+            data[cur_level]["s"] = base64.b64encode(scores.tobytes()).decode("utf-8")
+
+    return {
+        "encoding": "compact",
+        "terms": list(term_ids),
+        "termNum": term_num,
+        "termType": term_type,
+        "data": data,
+    }
+
+
+def decode_topic_levels(topic_dict: dict) -> dict:
+    """Decode the topic levels of a topic dictionary into [x, y, name] lists.
+
+    Args:
+        topic_dict (dict): A topic dictionary with "json" or "compact" encoding
+
+    Returns:
+        dict: Lists of [x, y, name] topics at each level
+    """
+    if topic_dict.get("encoding", "json") == "json":
+        return topic_dict["data"]
+
+    # Index 0 is the empty term
+    terms = [""] + topic_dict["terms"]
+    term_dtype = "<u2" if topic_dict["termType"] == "uint16" else "<u4"
+    term_num = topic_dict["termNum"]
+    data = {}
+
+    for level, level_data in topic_dict["data"].items():
+        xs = np.frombuffer(base64.b64decode(level_data["x"]), dtype="<f4")
+        ys = np.frombuffer(base64.b64decode(level_data["y"]), dtype="<f4")
+        term_ids = np.frombuffer(base64.b64decode(level_data["t"]), dtype=term_dtype)
+        term_ids = term_ids.reshape(-1, term_num)
+
+        data[level] = [
+            [round(float(x), 3), round(float(y), 3), "-".join(terms[t] for t in row)]
+            for x, y, row in zip(xs, ys, term_ids.tolist())
+        ]
+
+    return data
+
+
+def make_topic_dict(
+    level_tile_topics: dict,
+    tree_extent: list[list[float]],
+    x_domain: Tuple[float, float],
+    y_domain: Tuple[float, float],
+    min_level: int,
+    max_level: int,
+    topic_encoding: Literal["json", "compact"] = "json",
+    topic_scores: bool = False,
+) -> dict:
+    """Create the topic dictionary from the tile topics of all levels.
+
+    Args:
+        level_tile_topics (dict): Topics of tiles at each level
+        tree_extent (list[list[float]]): [[x0, y0], [x1, y1]] of the tree extent
+        x_domain ((float, float)): [x min, x max] of the points
+        y_domain ((float, float)): [y min, y max] of the points
+        min_level (int): The min level to include
+        max_level (int): The max level to include
+        topic_encoding ("json" | "compact", optional): How to store the topics,
+            see generate_topic_dict(). Defaults to "json".
+        topic_scores (bool, optional): Whether to store the term scores in the
+            "compact" encoding. Defaults to False.
+
+    Returns:
+        dict: A dictionary object encodes the topics.
+    """
+    # Create a dictionary to store the topics at different scale levels
+    data_dict = {
+        "extent": tree_extent,
+        "data": {},
+        "range": [
+            float(x_domain[0]),
+            float(y_domain[0]),
+            float(x_domain[1]),
+            float(y_domain[1]),
+        ],
+    }
+
+    if topic_encoding == "compact":
+        data_dict.update(
+            encode_topic_levels(
+                level_tile_topics, min_level, max_level, topic_scores=topic_scores
+            )
+        )
+        return data_dict
+
+    for cur_level in range(min_level, max_level + 1):
+        cur_topics = level_tile_topics[cur_level]
+        data_dict["data"][cur_level] = []
+
+        for topic in cur_topics:
+            # Get the topic name
+            name = "-".join([p[0] for p in topic["w"][:4]])
+            x = (topic["p"][0] + topic["p"][2]) / 2
+            y = (topic["p"][1] + topic["p"][3]) / 2
+            data_dict["data"][cur_level].append([round(x, 3), round(y, 3), name])
+
+    return data_dict
+
+
+def generate_topic_dict(
+    xs: list[float] | np.ndarray,
+    ys: list[float] | np.ndarray,
+    texts: list[str] | np.ndarray,
+    max_zoom_scale=30,
+    svg_width=1000,
+    svg_height=1000,
+    ideal_tile_width=35,
+    stop_words: list[str] | Literal["english"] = "english",
+    n_jobs: int | None = 1,
+    count_backend: Literal["count", "hashing"] = "count",
+    n_features: int = 2**20,
+    batch_size: int = 10000,
+    cache_dir: str | None = None,
+    cache_max_bytes: int = 2**32,
+    ngram_range: Tuple[int, int] = (1, 1),
+    analyzer: Callable[[str], list[str]] | None = None,
+    topic_encoding: Literal["json", "compact"] = "json",
+    topic_scores: bool = False,
+):
+    """Generate a topic dictionary object that encodes the topics of different
+    regions in the embedding map across scales. xs, ys, and texts can be lists,
+    numpy arrays, pandas Series, or pyarrow arrays. Texts are tokenized in
+    chunks without converting the whole array to a Python list.
+
+    Args:
+        xs ([float]): A list of x coordinates of projected points
+        ys ([float]): A list of y coordinates of projected points
+        texts ([str]): A list of documents associated with points
+        max_zoom_scale (float): The maximal zoom scale (default to zoom x 30)
+        svg_width (float): The approximate size of the wizmap window
+        svg_height (float): The approximate size of the wizmap window
+        stop_words (list[str] | Literal["english"]): Stop words for the count vectorizer.
+        n_jobs (int | None, optional): Number of processes to tokenize texts and
+            extract topics of different levels in parallel. -1 means using all
+            CPUs. Defaults to 1.
+        count_backend ("count" | "hashing", optional): How to count words. Use
+            "hashing" to stream texts in batches with a bounded feature space
+            when the corpus does not fit in memory. See build_count_matrix().
+            Defaults to "count".
+        n_features (int, optional): Number of features for the "hashing"
+            backend. Defaults to 2**20.
+        batch_size (int, optional): Number of texts per batch for the "hashing"
+            backend. Defaults to 10000.
+        cache_dir (str | None, optional): A directory to cache the count matrix
+            across runs on the same texts. Defaults to None (no cache).
+        cache_max_bytes (int, optional): Max total size of the cache. Defaults
+            to 4 GiB.
+        ngram_range ((int, int), optional): The lower and upper boundary of the
+            n-grams to count. Defaults to (1, 1).
+        analyzer (Callable[[str], list[str]] | None, optional): A custom function
+            that splits a text into features, replacing the default tokenizer,
+            stop_words, and ngram_range. It must be picklable when n_jobs > 1.
+            Defaults to None.
+        topic_encoding ("json" | "compact", optional): "json" stores each tile
+            as [x, y, "word1-word2-word3-word4"]. "compact" stores a shared term
+            table and typed arrays of tile coordinates and term indices for
+            each level (see encode_topic_levels()). Defaults to "json".
+        topic_scores (bool, optional): Whether to store the tf-idf scores of the
+            terms in the "compact" encoding. Defaults to False.
+
+    Returns:
+        dict: A dictionary object encodes the contour plot.
+    """
+    if topic_encoding not in ("json", "compact"):
+        raise ValueError(f"Unknown topic encoding: {topic_encoding}")
+
+    xs = _as_float_array(xs)
+    ys = _as_float_array(ys)
+
+    # Compute the quadtree extent
+    tree_extent = get_tree_extent(xs, ys)
+    tree_position = tree_extent[0] + tree_extent[1]
+
+    # Build the count matrix
+    count_mat, ngrams = build_count_matrix(
+        texts,
+        stop_words=stop_words,
+        count_backend=count_backend,
+        n_features=n_features,
+        batch_size=batch_size,
+        cache_dir=cache_dir,
+        cache_max_bytes=cache_max_bytes,
+        ngram_range=ngram_range,
+        analyzer=analyzer,
+        n_jobs=n_jobs,
+    )
+
+    if count_mat.shape[0] != len(xs):
+        raise IndexError("Number of texts must be the same as number of points.")
+
+    x_domain = [float(np.min(xs)), float(np.max(xs))]
+    y_domain = [float(np.min(ys)), float(np.max(ys))]
+
+    # Get suggestions of quadtree levels to extract
+    min_level, max_level = select_topic_levels(
+        max_zoom_scale,
+        svg_width,
+        svg_height,
+        x_domain,
+        y_domain,
+        tree_extent,
+        ideal_tile_width,
+    )
+    min_level, max_level = int(min_level), int(max_level)
+
+    # Group points into the tiles at the deepest level by their Morton codes
+    tile_rows, tile_cells = get_point_tiles(xs, ys, tree_extent, max_level)
+    tile_mat = csr_matrix(
+        (
+            np.ones(len(tile_rows), dtype=count_mat.dtype),
+            (tile_rows, np.arange(len(tile_rows))),
+        ),
+        shape=(len(tile_cells), len(tile_rows)),
+    )
+    tile_count_mat = tile_mat @ count_mat
+
+    # Generate topics
+    level_tile_topics = get_level_tile_topics(
+        tile_count_mat,
+        tile_cells,
+        tree_position,
+        ngrams,
+        count_mat.shape[0],
+        min_level,
+        max_level,
+        n_jobs=n_jobs,
+    )
+
+    return make_topic_dict(
+        level_tile_topics,
+        tree_extent,
+        x_domain,
+        y_domain,
+        min_level,
+        max_level,
+        topic_encoding=topic_encoding,
+        topic_scores=topic_scores,
+    )
+
+
+class TopicBuilder:
+    """Build the topic dictionary from chunks of points, and update it when new
+    points arrive. The builder keeps the word counts of the tiles at the deepest
+    level and the topics of all levels. finalize() only recomputes the topics of
+    tiles that have received points since the last call, and reuses the others.
+    Recomputed tiles use the idf weights of the whole corpus, so the topics of
+    unchanged tiles can drift from a full rebuild as the corpus grows.
+
+    Args:
+        x_domain ((float, float)): [x min, x max] of all the points, including
+            the points to be added later
+        y_domain ((float, float)): [y min, y max] of all the points, including
+            the points to be added later
+        max_zoom_scale (float): The maximal zoom scale (default to zoom x 30)
+        svg_width (float): The approximate size of the wizmap window
+        svg_height (float): The approximate size of the wizmap window
+        ideal_tile_width (float): The ideal tile width in pixels
+        count_backend ("count" | "hashing", optional): The backend of the count
+            matrices given to partial_fit(), see build_count_matrix(). Defaults
+            to "count".
+    """
+
+    def __init__(
+        self,
+        x_domain: Tuple[float, float],
+        y_domain: Tuple[float, float],
+        max_zoom_scale=30,
+        svg_width=1000,
+        svg_height=1000,
+        ideal_tile_width=35,
+        count_backend: Literal["count", "hashing"] = "count",
+    ):
+        self.x_domain = [float(x_domain[0]), float(x_domain[1])]
+        self.y_domain = [float(y_domain[0]), float(y_domain[1])]
+        self.max_zoom_scale = max_zoom_scale
+        self.svg_width = svg_width
+        self.svg_height = svg_height
+        self.ideal_tile_width = ideal_tile_width
+        self.count_backend = count_backend
+
+        self.tree_extent = get_tree_extent(
+            np.array(self.x_domain), np.array(self.y_domain)
+        )
+        min_level, max_level = select_topic_levels(
+            max_zoom_scale,
+            svg_width,
+            svg_height,
+            self.x_domain,
+            self.y_domain,
+            self.tree_extent,
+            ideal_tile_width,
+        )
+        self.min_level, self.max_level = int(min_level), int(max_level)
+
+        # [x min, y min, x max, y max] of the added points
+        self.point_range = None
+        self.text_num = 0
+
+        self.ngrams = None
+        self.tile_count_mat = None
+        self.tile_codes = np.zeros(0, dtype=np.int64)
+        self.tile_cells = np.zeros((0, 2), dtype=np.int64)
+
+        # Morton codes of the deepest tiles with new points since finalize()
+        self.touched_codes = np.zeros(0, dtype=np.int64)
+
+        # Topics of each level, keyed by the tile's Morton code
+        self.level_topics: dict[int, dict] = {}
+
+    def partial_fit(
+        self,
+        xs: np.ndarray,
+        ys: np.ndarray,
+        count_mat: csr_matrix,
+        ngrams: np.ndarray,
+    ):
+        """Add the word counts of a chunk of points to their tiles.
+
+        Args:
+            xs (np.ndarray): x coordinates of the points in this chunk
+            ys (np.ndarray): y coordinates of the points in this chunk
+            count_mat (csr_matrix): A (points, features) count matrix of the
+                texts in this chunk from build_count_matrix()
+            ngrams (np.ndarray): The name of each feature in count_mat
+
+        Returns:
+            TopicBuilder: This builder
+        """
+        xs = _as_float_array(xs)
+        ys = _as_float_array(ys)
+
+        if len(xs) == 0:
+            return self
+
+        if len(ys) != len(xs):
+            raise IndexError("Number of ys must be the same as number of xs.")
+
+        if count_mat.shape[0] != len(xs):
+            raise IndexError("Number of texts must be the same as number of points.")
+
+        (x0, y0), (x1, y1) = self.tree_extent
+        if np.min(xs) < x0 or np.max(xs) >= x1 or np.min(ys) < y0 or np.max(ys) >= y1:
+            raise ValueError("Points must be inside the builder's tree extent.")
+
+        count_mat = csr_matrix(count_mat)
+        ngrams = np.asarray(ngrams, dtype=object)
+
+        # Align the features of the new counts with the existing tiles
+        if self.ngrams is None:
+            self.ngrams = ngrams.copy()
+            self.tile_count_mat = csr_matrix((0, len(ngrams)), dtype=count_mat.dtype)
+
+        elif self.count_backend == "hashing":
+            if len(ngrams) != len(self.ngrams):
+                raise IndexError(
+                    "Number of hashed features must be the same as the builder's."
+                )
+
+            # Name new columns by their first seen word
+            is_new = (self.ngrams == "") & (ngrams != "")
+            self.ngrams[is_new] = ngrams[is_new]
+
+        else:
+            tile_num = self.tile_count_mat.shape[0]
+            merged_mat, self.ngrams = merge_count_matrices(
+                [self.tile_count_mat, count_mat], [self.ngrams, ngrams]
+            )
+            self.tile_count_mat = merged_mat[:tile_num]
+            count_mat = merged_mat[tile_num:]
+
+        # Merge the new points into the deepest tiles, sorted by Morton codes
+        cells = get_point_cells(xs, ys, self.tree_extent, self.max_level)
+        codes = get_morton_codes(cells, self.max_level)
+
+        tile_codes, first_index, inverse = np.unique(
+            np.concatenate([self.tile_codes, codes]),
+            return_index=True,
+            return_inverse=True,
+        )
+        inverse = inverse.ravel()
+
+        reduce_mat = csr_matrix(
+            (
+                np.ones(len(inverse), dtype=count_mat.dtype),
+                (inverse, np.arange(len(inverse))),
+            ),
+            shape=(len(tile_codes), len(inverse)),
+        )
+        self.tile_count_mat = reduce_mat @ vstack(
+            [self.tile_count_mat, count_mat], format="csr"
+        )
+        self.tile_cells = np.concatenate([self.tile_cells, cells])[first_index]
+        self.tile_codes = tile_codes
+        self.touched_codes = np.union1d(self.touched_codes, codes)
+        self.text_num += len(xs)
+
+        cur_range = [np.min(xs), np.min(ys), np.max(xs), np.max(ys)]
+        if self.point_range is None:
+            self.point_range = [float(x) for x in cur_range]
+        else:
+            self.point_range = [
+                float(min(self.point_range[0], cur_range[0])),
+                float(min(self.point_range[1], cur_range[1])),
+                float(max(self.point_range[2], cur_range[2])),
+                float(max(self.point_range[3], cur_range[3])),
+            ]
+
+        return self
+
+    def finalize(
+        self,
+        topic_encoding: Literal["json", "compact"] = "json",
+        topic_scores: bool = False,
+    ) -> dict:
+        """Generate the topic dictionary. Only the tiles with new points since
+        the last call are recomputed.
+
+        Args:
+            topic_encoding ("json" | "compact", optional): How to store the
+                topics, see generate_topic_dict(). Defaults to "json".
+            topic_scores (bool, optional): Whether to store the term scores in
+                the "compact" encoding. Defaults to False.
+
+        Returns:
+            dict: A dictionary object encodes the topics.
+        """
+        if self.text_num == 0:
+            raise ValueError("Add points with partial_fit() before finalize().")
+
+        tree_position = self.tree_extent[0] + self.tree_extent[1]
+        tile_count_mat, tile_cells = self.tile_count_mat, self.tile_cells
+        level_tile_topics = {}
+
+        for level in tqdm(range(self.max_level, self.min_level - 1, -1)):
+            if level < self.max_level:
+                tile_count_mat, tile_cells = aggregate_tile_counts(
+                    tile_count_mat, tile_cells
+                )
+
+            codes = get_morton_codes(tile_cells, level)
+            cached_topics = self.level_topics.get(level, {})
+            cached_codes = np.fromiter(cached_topics, dtype=np.int64)
+
+            # Parent tiles of the touched tiles are the codes shifted by 2 bits
+            # per level
+            touched_codes = self.touched_codes >> (2 * (self.max_level - level))
+            rows = np.flatnonzero(
+                np.isin(codes, touched_codes) | ~np.isin(codes, cached_codes)
+            )
+
+            topics = [cached_topics.get(c) for c in codes.tolist()]
+
+            if len(rows) > 0:
+                new_topics = get_level_topics(
+                    tile_count_mat,
+                    tile_cells,
+                    tree_position,
+                    level,
+                    self.ngrams,
+                    self.text_num,
+                    rows=None if len(rows) == len(codes) else rows,
+                )
+
+                for r, topic in zip(rows.tolist(), new_topics):
+                    topics[r] = topic
+
+            self.level_topics[level] = dict(zip(codes.tolist(), topics))
+            level_tile_topics[level] = topics
+
+        self.touched_codes = np.zeros(0, dtype=np.int64)
+
+        return make_topic_dict(
+            level_tile_topics,
+            self.tree_extent,
+            (self.point_range[0], self.point_range[2]),
+            (self.point_range[1], self.point_range[3]),
+            self.min_level,
+            self.max_level,
+            topic_encoding=topic_encoding,
+            topic_scores=topic_scores,
+        )
+
+    def save(self, state_dir: str):
+        """Save the tile counts and topics to a directory, so that more points
+        can be added to a builder from load() later.
+
+        Args:
+            state_dir (str): Directory of the builder state
+        """
+        os.makedirs(state_dir, exist_ok=True)
+
+        save_csr_arrays(self.tile_count_mat, join(state_dir, "tiles"))
+        np.save(join(state_dir, "tile-codes.npy"), self.tile_codes)
+        np.save(join(state_dir, "tile-cells.npy"), self.tile_cells)
+        np.save(join(state_dir, "touched-codes.npy"), self.touched_codes)
+        save_string_array(self.ngrams, join(state_dir, "ngrams"))
+
+        meta = {
+            "xDomain": self.x_domain,
+            "yDomain": self.y_domain,
+            "maxZoomScale": self.max_zoom_scale,
+            "svgWidth": self.svg_width,
+            "svgHeight": self.svg_height,
+            "idealTileWidth": self.ideal_tile_width,
+            "countBackend": self.count_backend,
+            "pointRange": self.point_range,
+            "textNum": self.text_num,
+            "levelTopics": {
+                level: list(topics.items())
+                for level, topics in self.level_topics.items()
+            },
+        }
+
+        with open(join(state_dir, "topic.json"), "w", encoding="utf8") as fp:
+            json.dump(meta, fp, default=_json_default)
+
+    @classmethod
+    def load(cls, state_dir: str) -> "TopicBuilder":
+        """Load a builder saved by save().
+
+        Args:
+            state_dir (str): Directory of the builder state
+
+        Returns:
+            TopicBuilder: The loaded builder
+        """
+        with open(join(state_dir, "topic.json"), "r", encoding="utf8") as fp:
+            meta = json.load(fp)
+
+        builder = cls(
+            meta["xDomain"],
+            meta["yDomain"],
+            max_zoom_scale=meta["maxZoomScale"],
+            svg_width=meta["svgWidth"],
+            svg_height=meta["svgHeight"],
+            ideal_tile_width=meta["idealTileWidth"],
+            count_backend=meta["countBackend"],
+        )
+        builder.point_range = meta["pointRange"]
+        builder.text_num = meta["textNum"]
+        builder.level_topics = {
+            int(level): dict(topics) for level, topics in meta["levelTopics"].items()
+        }
+
+        # Load arrays into memory, as partial_fit() replaces them
+        builder.tile_count_mat = load_csr_arrays(join(state_dir, "tiles"), None)
+        builder.tile_codes = np.load(join(state_dir, "tile-codes.npy"))
+        builder.tile_cells = np.load(join(state_dir, "tile-cells.npy"))
+        builder.touched_codes = np.load(join(state_dir, "touched-codes.npy"))
+        builder.ngrams = np.asarray(
+            load_string_array(join(state_dir, "ngrams"), None), dtype=object
+        )
+
+        return builder
+
+
+def generate_grid_dict(
+    xs: list[float] | np.ndarray,
+    ys: list[float] | np.ndarray,
+    texts: list[str] | np.ndarray,
+    embedding_name="My Embedding",
+    grid_size=200,
+    max_sample=100000,
+    random_seed=202355,
+    max_zoom_scale=30,
+    svg_width=1000,
+    svg_height=1000,
+    ideal_tile_width=35,
+    labels: list[int] | np.ndarray | None = None,
+    group_names: list[str] | None = None,
+    times: list[str] | np.ndarray | None = None,
+    time_format: str | None = None,
+    image_label: int | None = None,
+    image_url_prefix: str | None = None,
+    opacity: float | None = None,
+    stop_words: list[str] | Literal["english"] = "english",
+    json_point_content_config: JsonPointContentConfig | None = None,
+    density_engine: Literal["kde", "binned"] = "kde",
+    n_jobs: int | None = 1,
+    grid_encoding: Literal["json", "float16", "uint8", "uint16"] = "json",
+    count_backend: Literal["count", "hashing"] = "count",
+    n_features: int = 2**20,
+    batch_size: int = 10000,
+    cache_dir: str | None = None,
+    cache_max_bytes: int = 2**32,
+    ngram_range: Tuple[int, int] = (1, 1),
+    analyzer: Callable[[str], list[str]] | None = None,
+    topic_encoding: Literal["json", "compact"] = "json",
+    topic_scores: bool = False,
+):
+    """Generate a grid dictionary object that encodes the contour plot and the
+    associated topics of different regions on the projected embedding space.
+    All point inputs can be lists, numpy arrays, pandas Series, or pyarrow
+    arrays.
+
+    Args:
+        xs ([float]): A list of x coordinates of projected points
+        ys ([float]): A list of y coordinates of projected points
+        texts ([str]): A list of documents associated with points
+        embeddingName (str): Custom name of this embedding map
+        grid_size (int, optional): The resolution of the grid. Defaults to 200
+        max_sample (int, optional): Max number of samples to compute KDE from.
+            Defaults to 100000
+        random_seed (int, optional): Seed for the random state. Defaults to 202355
+        max_zoom_scale (float): The maximal zoom scale (default to zoom x 30)
+        svg_width (float): The approximate size of the wizmap window
+        svg_height (float): The approximate size of the wizmap window
+        ideal_tile_width (float): The ideal tile width in pixels
+        labels ([int]): A list of category labels of projected points. Labels
+            must be consecutive integers starting from 0. Defaults to None.
+        group_names ([str]): Category names associated with the given labels.
+            For example, the group name of label i is group_names[i]. Defaults
+            to None.
+        times ([str]): A list of times associated with data points. Defaults to None.
+        time_format (str): strptime format string to parse the time string in times
+        image_label (int): The label corresponds to an image point
+        image_url_prefix (str): The url prefix for all image texts
+        opacity (float): The opacity of data points. If it is None, WizMap will
+            dynamically adjust the opacity values. Defaults to None.
+        stop_words (list[str] | Literal["english"]): A set of stop words to filter out when generating topics.
+        json_point_content_config (JsonPointContentConfig | None): Config for json point.
+            A json point can include both image and text, etc.
+        density_engine ("kde" | "binned", optional): How to estimate the contour
+            density. "binned" uses all points and is much faster on large
+            datasets. Defaults to "kde".
+        n_jobs (int | None, optional): Number of processes to compute density
+            grids, tokenize texts, and extract topic levels in parallel. -1 means
+            using all CPUs. Defaults to 1.
+        grid_encoding ("json" | "float16" | "uint8" | "uint16", optional): How to
+            store the density grids in grid.json. Defaults to "json".
+        count_backend ("count" | "hashing", optional): How to count words for
+            topics. "hashing" streams texts in batches with a bounded feature
+            space, so texts can be a generator. Defaults to "count".
+        n_features (int, optional): Number of features for the "hashing"
+            backend. Defaults to 2**20.
+        batch_size (int, optional): Number of texts per batch for the "hashing"
+            backend. Defaults to 10000.
+        cache_dir (str | None, optional): A directory to cache the topic count
+            matrix. Rerunning with other map parameters on the same texts skips
+            tokenization. Defaults to None (no cache).
+        cache_max_bytes (int, optional): Max total size of the cache. Defaults
+            to 4 GiB.
+        ngram_range ((int, int), optional): The lower and upper boundary of the
+            n-grams to count for topics. Defaults to (1, 1).
+        analyzer (Callable[[str], list[str]] | None, optional): A custom function
+            that splits a text into features for topics, replacing the default
+            tokenizer, stop_words, and ngram_range. It must be picklable when
+            n_jobs > 1. Defaults to None.
+        topic_encoding ("json" | "compact", optional): How to store the topics.
+            "compact" stores a shared term table and typed arrays for each
+            level instead of one string per tile. Defaults to "json".
+        topic_scores (bool, optional): Whether to store the tf-idf scores of the
+            topic terms in the "compact" encoding. Defaults to False.
+
+    Returns:
+        dict: A dictionary object encodes the grid data.
+    """
+    print("Start generating contours...")
+    contour_dict = generate_contour_dict(
+        xs,
+        ys,
+        grid_size=grid_size,
+        max_sample=max_sample,
+        random_seed=random_seed,
+        labels=labels,
+        group_names=group_names,
+        times=times,
+        time_format=time_format,
+        density_engine=density_engine,
+        n_jobs=n_jobs,
+        grid_encoding=grid_encoding,
+    )
+
+    print("Start generating multi-level summaries...")
+    # If the user uses json point, we need to extract the text content first
+    if json_point_content_config is not None:
+        real_texts = get_json_point_texts(
+            texts,
+            json_point_content_config["textKey"],
+            labels,
+            json_point_content_config.get("groupLabels"),
+        )
+    else:
+        real_texts = texts
+
+    topic_dict = generate_topic_dict(
+        xs,
+        ys,
+        real_texts,
+        max_zoom_scale=max_zoom_scale,
+        svg_width=svg_width,
+        svg_height=svg_height,
+        ideal_tile_width=ideal_tile_width,
+        stop_words=stop_words,
+        n_jobs=n_jobs,
+        count_backend=count_backend,
+        n_features=n_features,
+        batch_size=batch_size,
+        cache_dir=cache_dir,
+        cache_max_bytes=cache_max_bytes,
+        ngram_range=ngram_range,
+        analyzer=analyzer,
+        topic_encoding=topic_encoding,
+        topic_scores=topic_scores,
+    )
+
+    # Add meta data to the final output
+    grid_dict = contour_dict
+    grid_dict["topic"] = topic_dict
+    grid_dict["embeddingName"] = embedding_name
+
+    if opacity is not None:
+        grid_dict["opacity"] = opacity
+
+    # Create a config for image points
+    if image_label is not None:
+        image_config: dict[str, int | str | None] = {"imageGroup": image_label}
+
+        if image_url_prefix is not None:
+            image_config["imageURLPrefix"] = image_url_prefix
+
+        grid_dict["image"] = image_config
+
+    if json_point_content_config is not None:
+        grid_dict["jsonPoint"] = json_point_content_config
+
+    return grid_dict
+
+
+class JsonPointTexts:
+    """The text fields of json point records, read lazily as a sequence of
+    texts. Each pass parses the records again, so the texts are never all held
+    in memory.
+
+    Args:
+        records (Iterable): JSON point records, as JSON strings or dictionaries
+        text_key (str): The key of the text field
+        labels (Iterable[int] | None, optional): Category labels of the points.
+            Defaults to None.
+        group_labels (list[int] | None, optional): If it is set with labels,
+            only records whose label is in this list are json points, and the
+            others are plain texts. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        records: Iterable,
+        text_key: str,
+        labels: Iterable[int] | None = None,
+        group_labels: list[int] | None = None,
+    ):
+        self.records = records
+        self.text_key = text_key
+        self.labels = labels
+        self.group_labels = None if group_labels is None else set(group_labels)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, index: int) -> str:
+        record = _as_py(self.records[index])
+        is_json_point = True
+
+        if self.labels is not None and self.group_labels is not None:
+            is_json_point = _as_py(self.labels[index]) in self.group_labels
+
+        return self._get_text(record, is_json_point)
+
+    def __iter__(self) -> Iterator[str]:
+        if self.labels is None or self.group_labels is None:
+            is_json_points = repeat(True)
+        else:
+            is_json_points = (
+                label in self.group_labels for label in _iter_values(self.labels)
+            )
+
+        for record, is_json_point in zip(_iter_values(self.records), is_json_points):
+            yield self._get_text(record, is_json_point)
+
+    def _get_text(self, record, is_json_point: bool) -> str:
+        if isinstance(record, dict):
+            return record[self.text_key]
+
+        if is_json_point:
+            return json.loads(record)[self.text_key]
+
+        return record
+
+
+def get_json_point_texts(
+    records: Iterable,
+    text_key: str,
+    labels: Iterable[int] | None = None,
+    group_labels: list[int] | None = None,
+) -> JsonPointTexts | object:
+    """Extract the text field of json points lazily. Records can be JSON
+    strings, dictionaries, or a pyarrow struct array, whose text field is
+    extracted without converting records to Python objects.
+
+    Args:
+        records (Iterable): JSON point records
+        text_key (str): The key of the text field
+        labels (Iterable[int] | None, optional): Category labels of the points.
+            Defaults to None.
+        group_labels (list[int] | None, optional): If it is set with labels,
+            only records whose label is in this list are json points, and the
+            others are plain texts. Without labels, all records are json
+            points. Defaults to None.
+
+    Returns:
+        JsonPointTexts | object: Texts of the points, which are parsed on every
+            pass, or a pyarrow array of texts for a pyarrow struct array
+    """
+    # Without labels, every record is a json point
+    if labels is None:
+        group_labels = None
+
+    if group_labels is None and hasattr(records, "to_pylist"):
+        if hasattr(records, "field"):
+            return records.field(text_key)
+
+        if hasattr(records, "chunks") and hasattr(records.type, "num_fields"):
+            import pyarrow as pa
+
+            return pa.chunked_array(
+                [chunk.field(text_key) for chunk in records.chunks],
+                type=records.type.field(text_key).type,
+            )
+
+    return JsonPointTexts(records, text_key, labels, group_labels)
+
+
+def iter_data_rows(
+    xs: Iterable[float],
+    ys: Iterable[float],
+    texts: Iterable[str],
+    times: Iterable[str] | None = None,
+    labels: Iterable[int] | None = None,
+    search_texts: Iterable[str] | None = None,
+) -> Iterator[list]:
+    """Lazily generate data points one row at a time. Each row is
+    [x, y, text, time, label, search text], where time is "" and label is None
+    if there are later fields but no times or labels, and the trailing optional
+    fields are omitted. Dictionary texts (structured json points) are written
+    as JSON strings. Numpy arrays, pandas Series, and pyarrow arrays are
+    converted to Python values in chunks.
+
+    Args:
+        xs (Iterable[float]): x coordinates of projected points
+        ys (Iterable[float]): y coordinates of projected points
+        texts (Iterable[str]): Documents associated with points
+        times (Iterable[str], optional): Timestamps associated with points.
+            Defaults to None.
+        labels (Iterable[int], optional): Category labels associated with
+            points. Defaults to None.
+        search_texts (Iterable[str], optional): Pre-extracted texts of json
+            points for the viewer to index, so it does not parse every point.
+            Defaults to None.
+
+    Yields:
+        list: A data point row
+    """
+    texts = (
+        json.dumps(text) if isinstance(text, dict) else text
+        for text in _iter_values(texts)
+    )
+    columns = [_iter_values(xs), _iter_values(ys), texts]
+
+    if times is not None:
+        columns.append(_iter_values(times))
+    elif labels is not None or search_texts is not None:
+        columns.append(repeat(""))
+
+    if labels is not None:
+        columns.append(_iter_values(labels))
+    elif search_texts is not None:
+        columns.append(repeat(None))
+
+    if search_texts is not None:
+        columns.append(_iter_values(search_texts))
+
+    for row in zip(*columns):
+        yield list(row)
+
+
+def generate_data_list(
+    xs: list[float] | np.ndarray,
+    ys: list[float] | np.ndarray,
+    texts: list[str] | np.ndarray,
+    times: list[str] | np.ndarray | None = None,
+    labels: list[int] | np.ndarray | None = None,
+    json_point_content_config: JsonPointContentConfig | None = None,
+) -> list[list]:
+    """Generate a list of data points. Inputs can be lists, numpy arrays,
+    pandas Series, or pyarrow arrays. Use iter_data_rows() to generate rows
+    lazily for large datasets.
+
+    Args:
+        xs (list[float]): A list of x coordinates of projected points
+        ys (list[float]): A list of y coordinates of projected points
+        texts (list[str]): A list of documents associated with points
+        times (list[str], optional): A list of timestamps associated with points.
+            Defaults to [].
+        labels (list[int], optional): A list of category labels associated
+            with points. Defaults to [].
+        json_point_content_config (JsonPointContentConfig, optional): Config for
+            json points. If it is set, texts can also be dictionaries or a
+            pyarrow struct array, and each row carries the extracted text for
+            search. Defaults to None.
+
+    Returns:
+        list[list]: A list of data points.
+    """
+    print("Start generating data list...")
+
+    search_texts = None
+    if json_point_content_config is not None:
+        search_texts = get_json_point_texts(
+            texts,
+            json_point_content_config["textKey"],
+            labels,
+            json_point_content_config.get("groupLabels"),
+        )
+
+    return list(iter_data_rows(xs, ys, texts, times, labels, search_texts))
+
+
+def _json_default(obj):
+    """Convert numpy values for the stdlib json encoder."""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+
+    if isinstance(obj, np.generic):
+        return obj.item()
+
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def get_json_serializer(
+    serializer: Literal["auto", "orjson", "json"] = "json",
+) -> Callable[[object], bytes]:
+    """Get a function that serializes an object to UTF-8 JSON bytes. Both
+    serializers support numpy arrays and scalars, and non-string dictionary
+    keys are converted to strings.
+
+    Args:
+        serializer ("auto" | "orjson" | "json", optional): "orjson" uses the
+            optional orjson package, which serializes numpy arrays natively and
+            writes compact JSON. It writes NaN and infinity as null, and may
+            format floats differently. "json" uses the stdlib json module, and
+            its output is the same as json.dumps(). "auto" uses orjson if it is
+            installed. Defaults to "json".
+
+    Returns:
+        Callable[[object], bytes]: The serialize function
+    """
+    if serializer == "auto":
+        serializer = "json" if orjson is None else "orjson"
+
+    if serializer == "orjson":
+        if orjson is None:
+            raise ImportError("The orjson serializer requires orjson.")
+
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        return lambda obj: orjson.dumps(obj, option=option)
+
+    if serializer == "json":
+        encoder = json.JSONEncoder(default=_json_default)
+        return lambda obj: encoder.encode(obj).encode("utf-8")
+
+    raise ValueError(f"Unknown serializer: {serializer}")
+
+
+def iter_ndjson_chunks(
+    rows: Iterable,
+    chunk_size: int = 10000,
+    serializer: Literal["auto", "orjson", "json"] = "json",
+) -> Iterator[bytes]:
+    """Encode rows as NDJSON in chunks of UTF-8 bytes: one JSON value per line
+    without a trailing newline. With the "json" serializer, the joined chunks
+    are the same as ndjson.dump().
+
+    Args:
+        rows (Iterable): Rows to encode, e.g., from iter_data_rows()
+        chunk_size (int, optional): Number of rows in each chunk. Defaults to
+            10000.
+        serializer ("auto" | "orjson" | "json", optional): JSON serializer, see
+            get_json_serializer(). Defaults to "json".
+
+    Yields:
+        bytes: A chunk of NDJSON
+    """
+    dumps = get_json_serializer(serializer)
+    is_first_chunk = True
+
+    for batch in iter_batches(rows, chunk_size):
+        chunk = b"\n".join([dumps(row) for row in batch])
+
+        if is_first_chunk:
+            is_first_chunk = False
+            yield chunk
+        else:
+            yield b"\n" + chunk
+
+
+def write_ndjson(
+    rows: Iterable,
+    fp,
+    chunk_size: int = 10000,
+    serializer: Literal["auto", "orjson", "json"] = "json",
+) -> int:
+    """Write rows to a file as NDJSON in buffered chunks: one JSON value per
+    line without a trailing newline. With the "json" serializer, the output is
+    the same as ndjson.dump().
+
+    Args:
+        rows (Iterable): Rows to write, e.g., from iter_data_rows()
+        fp: A text file object
+        chunk_size (int, optional): Number of rows in each write. Defaults to
+            10000.
+        serializer ("auto" | "orjson" | "json", optional): JSON serializer, see
+            get_json_serializer(). Defaults to "json".
+
+    Returns:
+        int: Number of written rows
+    """
+    row_num = 0
+
+    def count_rows(rows: Iterable) -> Iterator:
+        nonlocal row_num
+        for row in rows:
+            row_num += 1
+            yield row
+
+    for chunk in iter_ndjson_chunks(count_rows(rows), chunk_size, serializer):
+        fp.write(chunk.decode("utf-8"))
+
+    return row_num
+
+
+POINT_BINARY_MAGIC = b"WZMB"
+
+
+def write_point_binary(rows: Iterable, fp, chunk_size: int = 10000) -> int:
+    """Write data rows in a columnar binary format. All numbers are
+    little-endian, and the file has these sections in order:
+
+    1. Magic bytes b"WZMB", then a uint32 length of the header
+    2. A JSON header {"version", "count", "fieldNum", "times"}, padded with
+       spaces to a multiple of 8 bytes. fieldNum is the number of fields in
+       each row (3, 4, or 5), and times is the table of unique time strings.
+    3. x and y coordinates (float32 each)
+    4. Time indices into the time table (uint32), if fieldNum > 3
+    5. Labels (int32), if fieldNum > 4
+    6. A blob of UTF-8 texts
+    7. Byte offsets of each text in the blob (count + 1 uint64)
+
+    Args:
+        rows (Iterable): Rows of [x, y, text, time, label], e.g., from
+            iter_data_rows()
+        fp: A binary file object
+        chunk_size (int, optional): Number of rows to process at a time.
+            Defaults to 10000.
+
+    Returns:
+        int: Number of written rows
+    """
+    xs, ys, time_indexes, labels = [], [], [], []
+    text_offsets = [np.zeros(1, dtype="<u8")]
+    time_ids = {}
+    field_num = 3
+    text_size = 0
+
+    # Buffer texts in a temporary file, because they come after the columns
+    with tempfile.TemporaryFile() as text_fp:
+        for batch in iter_batches(rows, chunk_size):
+            field_num = len(batch[0])
+            if field_num > 5:
+                raise ValueError("The binary format does not support search texts.")
+
+            xs.append(np.array([row[0] for row in batch], dtype="<f4"))
+            ys.append(np.array([row[1] for row in batch], dtype="<f4"))
+
+            if field_num > 3:
+                time_indexes.append(
+                    np.array(
+                        [time_ids.setdefault(row[3], len(time_ids)) for row in batch],
+                        dtype="<u4",
+                    )
+                )
+
+            if field_num > 4:
+                labels.append(np.array([row[4] for row in batch], dtype="<i4"))
+
+            text_bytes = [row[2].encode("utf-8") for row in batch]
+            text_fp.write(b"".join(text_bytes))
+            text_lengths = np.array([len(t) for t in text_bytes], dtype="<u8")
+            text_offsets.append(text_size + np.cumsum(text_lengths, dtype="<u8"))
+            text_size += int(text_lengths.sum())
+
+        row_num = sum([len(x) for x in xs])
+        header = json.dumps(
+            {
+                "version": 1,
+                "count": row_num,
+                "fieldNum": field_num,
+                "times": list(time_ids),
+            }
+        ).encode("utf-8")
+        header += b" " * (-len(header) % 8)
+
+        fp.write(POINT_BINARY_MAGIC)
+        fp.write(np.array([len(header)], dtype="<u4").tobytes())
+        fp.write(header)
+
+        for column in (xs, ys, time_indexes, labels):
+            for array in column:
+                fp.write(array.tobytes())
+
+        text_fp.seek(0)
+        shutil.copyfileobj(text_fp, fp)
+
+        for array in text_offsets:
+            fp.write(array.tobytes())
+
+    return row_num
+
+
+def read_point_binary(fp) -> list[list]:
+    """Read data rows from the columnar binary format of write_point_binary().
+
+    Args:
+        fp: A binary file object
+
+    Returns:
+        list[list]: Rows of [x, y, text, time, label]
+    """
+    content = fp.read()
+
+    if content[:4] != POINT_BINARY_MAGIC:
+        raise ValueError("The file is not in the wizmap point binary format.")
+
+    header_size = int(np.frombuffer(content, dtype="<u4", count=1, offset=4)[0])
+    header = json.loads(content[8 : 8 + header_size])
+    row_num = header["count"]
+    offset = 8 + header_size
+
+    def read_column(dtype):
+        nonlocal offset
+        array = np.frombuffer(content, dtype=dtype, count=row_num, offset=offset)
+        offset += array.nbytes
+        return array.tolist()
+
+    columns = [read_column("<f4"), read_column("<f4"), []]
+
+    if header["fieldNum"] > 3:
+        columns.append([header["times"][i] for i in read_column("<u4")])
+
+    if header["fieldNum"] > 4:
+        columns.append(read_column("<i4"))
+
+    text_offsets = np.frombuffer(
+        content, dtype="<u8", count=row_num + 1, offset=len(content) - 8 * (row_num + 1)
+    ).tolist()
+    columns[2] = [
+        content[offset + text_offsets[i] : offset + text_offsets[i + 1]].decode("utf-8")
+        for i in range(row_num)
+    ]
+
+    return [list(row) for row in zip(*columns)]
+
+
+def save_json_files(
+    data_list: Iterable,
+    grid_dict: dict,
+    output_dir="./",
+    data_json_name: str | None = None,
+    grid_json_name="grid.json",
+    data_format: Literal["ndjson", "binary"] = "ndjson",
+    serializer: Literal["auto", "orjson", "json"] = "json",
+):
+    """Save the dictionary and list as json files.
+
+    Args:
+        data_list (Iterable): The data list. It can also be a generator from
+            iter_data_rows(), which is written in chunks without keeping all
+            rows in memory.
+        grid_dict (dict): The grid dictionary.
+        output_dir (str, optional): Folder to save the two json files.
+            Defaults to './'.
+        data_json_name (str, optional): Filename of the data file. Defaults to
+            'data.ndjson', or 'data.bin' for the "binary" format.
+        grid_json_name (str, optional): Filename of the grid json file.
+            Defaults to 'grid.json'.
+        data_format ("ndjson" | "binary", optional): "ndjson" writes one JSON
+            array per point. "binary" writes a columnar binary file (see
+            write_point_binary()), which is smaller and faster to load. The
+            viewer detects the binary format by the ".bin" extension.
+            Defaults to "ndjson".
+        serializer ("auto" | "orjson" | "json", optional): JSON serializer for
+            the grid and ndjson files, see get_json_serializer(). "orjson" and
+            "auto" are faster, but the files can differ from the stdlib output.
+            Defaults to "json".
+    """
+    if data_format == "ndjson":
+        if data_json_name is None:
+            data_json_name = "data.ndjson"
+
+        with open(join(output_dir, data_json_name), "w", encoding="utf8") as fp:
+            write_ndjson(data_list, fp, serializer=serializer)
+
+    elif data_format == "binary":
+        if data_json_name is None:
+            data_json_name = "data.bin"
+
+        with open(join(output_dir, data_json_name), "wb") as fp:
+            write_point_binary(data_list, fp)
+
+    else:
+        raise ValueError(f"Unknown data format: {data_format}")
+
+    dumps = get_json_serializer(serializer)
+
+    with open(join(output_dir, grid_json_name), "wb") as fp:
+        fp.write(dumps(grid_dict))
+
+
+def save_point_shards(
+    xs: list[float] | np.ndarray,
+    ys: list[float] | np.ndarray,
+    texts: list[str] | np.ndarray,
+    times: list[str] | np.ndarray | None = None,
+    labels: list[int] | np.ndarray | None = None,
+    output_dir: str = "./",
+    shard_level: int = 4,
+    shard_max_points: int = 100000,
+    sample_size: int = 10000,
+    random_seed: int = 202355,
+    manifest_name: str = "manifest.json",
+) -> dict:
+    """Save data points as NDJSON shards in quadtree (Morton) order, so a viewer
+    can load a coarse overview first and fetch the points of visible tiles on
+    demand. Rows have the same layout as iter_data_rows(), and every row ends
+    with a newline, so each byte range is a valid NDJSON chunk.
+
+    A random sample of points is written to "sample.ndjson". The other points
+    are grouped into the tiles at shard_level and written in Morton order to
+    "points-<i>.ndjson" files. A file holds whole tiles and at most
+    shard_max_points points, unless one tile is larger than that. Loading the
+    sample and all tiles gives every point exactly once.
+
+    The manifest has keys "version", "extent" (the quadtree extent), "level",
+    "sample" ({"file", "byteRange", "count"}), and "tiles", a list of
+    {"tile": [x index, y index], "morton", "file", "byteRange", "count"},
+    where byteRange is [start, end) in the file.
+
+    Args:
+        xs (list[float]): x coordinates of projected points
+        ys (list[float]): y coordinates of projected points
+        texts (list[str]): Documents associated with points. It can also be a
+            numpy array, pandas Series, or pyarrow array.
+        times (list[str], optional): Timestamps associated with points.
+            Defaults to None.
+        labels (list[int], optional): Category labels associated with points.
+            Defaults to None.
+        output_dir (str, optional): Folder to save the shards and the manifest.
+            Defaults to "./".
+        shard_level (int, optional): Quadtree level of the tiles. Defaults to 4.
+        shard_max_points (int, optional): Max number of points in a shard file.
+            Defaults to 100000.
+        sample_size (int, optional): Number of points in the sample shard.
+            Defaults to 10000.
+        random_seed (int, optional): Random seed for sampling. Defaults to
+            202355.
+        manifest_name (str, optional): Filename of the manifest. Defaults to
+            "manifest.json".
+
+    Returns:
+        dict: The manifest
+    """
+    xs = _as_float_array(xs)
+    ys = _as_float_array(ys)
+
+    if len(xs) != len(ys) or len(xs) != len(texts):
+        raise IndexError("xs, ys, and texts must have the same length.")
+
+    tree_extent = get_tree_extent(xs, ys)
+    point_cells = get_point_cells(xs, ys, tree_extent, shard_level)
+    codes = get_morton_codes(point_cells, shard_level)
+
+    # Points in the sample are not repeated in the tile shards
+    rng = np.random.default_rng(random_seed)
+    is_sample = np.zeros(len(xs), dtype=bool)
+    is_sample[rng.choice(len(xs), min(sample_size, len(xs)), replace=False)] = True
+    sample_indexes = np.flatnonzero(is_sample)
+
+    tile_indexes = np.flatnonzero(~is_sample)
+    tile_indexes = tile_indexes[np.argsort(codes[tile_indexes], kind="stable")]
+    tile_codes, tile_starts, tile_counts = np.unique(
+        codes[tile_indexes], return_index=True, return_counts=True
+    )
+
+    encoder = json.JSONEncoder()
+
+    def write_rows(fp, indexes: np.ndarray) -> list[int]:
+        """Write rows of the given points and return the byte range."""
+        start = fp.tell()
+
+        for batch in iter_batches(indexes.tolist(), 10000):
+            rows = iter_data_rows(
+                xs[batch],
+                ys[batch],
+                _take_values(texts, batch),
+                None if times is None else _take_values(times, batch),
+                None if labels is None else _take_values(labels, batch),
+            )
+            fp.write(b"".join([(encoder.encode(r) + "\n").encode() for r in rows]))
+
+        return [start, fp.tell()]
+
+    manifest = {
+        "version": 1,
+        "extent": tree_extent,
+        "level": shard_level,
+        "sample": {"file": "sample.ndjson", "count": len(sample_indexes)},
+        "tiles": [],
+    }
+
+    with open(join(output_dir, "sample.ndjson"), "wb") as fp:
+        manifest["sample"]["byteRange"] = write_rows(fp, sample_indexes)
+
+    # Group whole tiles into shard files first, so each file is written and
+    # closed in one block
+    shards = []
+    shard_points = 0
+
+    for tile in zip(tile_codes, tile_starts, tile_counts):
+        if len(shards) == 0 or shard_points + tile[2] > shard_max_points:
+            shards.append([])
+            shard_points = 0
+
+        shards[-1].append(tile)
+        shard_points += tile[2]
+
+    for file_num, shard_tiles in enumerate(shards):
+        file_name = f"points-{file_num}.ndjson"
+
+        with open(join(output_dir, file_name), "wb") as fp:
+            for code, start, tile_count in shard_tiles:
+                byte_range = write_rows(fp, tile_indexes[start : start + tile_count])
+
+                manifest["tiles"].append(
+                    {
+                        "tile": point_cells[tile_indexes[start]].tolist(),
+                        "morton": int(code),
+                        "file": file_name,
+                        "byteRange": byte_range,
+                        "count": int(tile_count),
+                    }
+                )
+
+    with open(join(output_dir, manifest_name), "w", encoding="utf8") as manifest_fp:
+        json.dump(manifest, manifest_fp)
+
+    return manifest
+
+
+def _decode_line(line: bytes) -> str:
+    """Decode a line without its newline, and strip one trailing carriage return."""
+    return (line[:-1] if line.endswith(b"\r") else line).decode("utf-8")
+
+
+class LineTextFile:
+    """A newline-delimited text file that is read lazily as a sequence of texts.
+    It scans the file once to index the byte offset of each line, and then
+    reads lines from disk on demand. Texts must not contain newlines.
+
+    Args:
+        path (str): Path to a UTF-8 text file with one text per line
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        line_ends = []
+        file_size = 0
+
+        with open(path, "rb") as fp:
+            while True:
+                chunk = fp.read(2**24)
+                if len(chunk) == 0:
+                    break
+
+                newlines = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == 10)
+                line_ends.append(newlines.astype(np.int64) + file_size)
+                file_size += len(chunk)
+
+        line_ends = np.concatenate(line_ends + [np.zeros(0, dtype=np.int64)])
+
+        # The last line may not end with a newline
+        if file_size > 0 and (len(line_ends) == 0 or line_ends[-1] != file_size - 1):
+            line_ends = np.append(line_ends, file_size)
+
+        self.offsets = np.concatenate([[0], line_ends + 1]).astype(np.int64)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        return self.take([index])[0]
+
+    def take(self, indexes: Iterable[int]) -> list[str]:
+        """Read the texts at the indexes through one file handle. Lines are read
+        in the order of their offsets, so sampled texts are read in one pass.
+
+        Args:
+            indexes (Iterable[int]): Indexes of the texts. Negative indexes
+                count from the end.
+
+        Returns:
+            list[str]: The texts in the order of the indexes
+        """
+        indexes = np.asarray(indexes, dtype=np.int64).reshape(-1)
+        indexes = np.where(indexes < 0, indexes + len(self), indexes)
+
+        if np.any((indexes < 0) | (indexes >= len(self))):
+            raise IndexError("LineTextFile index out of range")
+
+        texts = [""] * len(indexes)
+
+        with open(self.path, "rb") as fp:
+            for i in np.argsort(indexes, kind="stable").tolist():
+                start = self.offsets[indexes[i]]
+                end = self.offsets[indexes[i] + 1] - 1
+                fp.seek(start)
+                texts[i] = _decode_line(fp.read(end - start))
+
+        return texts
+
+    def __iter__(self) -> Iterator[str]:
+        # Binary lines only split on b"\n", the same as the offset index
+        with open(self.path, "rb") as fp:
+            for line in fp:
+                yield _decode_line(line[:-1] if line.endswith(b"\n") else line)
+
+
+class ParquetTextColumn:
+    """A text column in a Parquet file that is read lazily as a sequence of
+    texts, one record batch or row group at a time. It requires pyarrow.
+
+    Args:
+        path (str): Path to a Parquet file
+        column (str): Name of the text column
+        batch_size (int, optional): Number of rows to read at a time when
+            iterating. Defaults to 10000.
+    """
+
+    def __init__(self, path: str, column: str, batch_size: int = 10000):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as error:
+            raise ImportError("Reading Parquet files requires pyarrow.") from error
+
+        self.path = path
+        self.column = column
+        self.batch_size = batch_size
+        self.parquet_file = pq.ParquetFile(path)
 
-    while scale <= max_zoom_scale:
-        best_level = 1
+        metadata = self.parquet_file.metadata
+        row_group_sizes = [
+            metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)
+        ]
+        self.row_group_starts = np.concatenate([[0], np.cumsum(row_group_sizes)])
+        self._cached_row_group = (-1, None)
 
-        # Check if 'np.inf' exists (NumPy 2.0+) and use it instead of deprecated 'np.Infinity'
-        best_tile_width_diff = np.inf if hasattr(np, "inf") else np.Infinity
+    def __len__(self) -> int:
+        return int(self.row_group_starts[-1])
 
-        for l in range(1, 21):
-            tile_num = 2**l
-            svg_scaled_length = scale * svg_length * tree_to_world_scale
-            tile_width = svg_scaled_length / tile_num
+    def __getitem__(self, index: int) -> str:
+        row_group = int(np.searchsorted(self.row_group_starts, index, "right")) - 1
 
-            if abs(tile_width - ideal_tile_width) < best_tile_width_diff:
-                best_tile_width_diff = abs(tile_width - ideal_tile_width)
-                best_level = l
+        if self._cached_row_group[0] != row_group:
+            table = self.parquet_file.read_row_group(row_group, columns=[self.column])
+            self._cached_row_group = (row_group, table.column(0))
 
-        selected_levels.append(best_level)
-        scale += 0.5
+        index -= int(self.row_group_starts[row_group])
+        return self._cached_row_group[1][index].as_py()
 
-    return np.min(selected_levels), np.max(selected_levels)
+    def __iter__(self) -> Iterator[str]:
+        for batch in self.parquet_file.iter_batches(
+            batch_size=self.batch_size, columns=[self.column]
+        ):
+            yield from batch.column(0).to_pylist()
 
 
-def generate_topic_dict(
-    xs: list[float],
-    ys: list[float],
-    texts: list[str],
-    max_zoom_scale=30,
-    svg_width=1000,
-    svg_height=1000,
-    ideal_tile_width=35,
-    stop_words: list[str] | Literal["english"] = "english",
-):
-    """Generate a topic dictionary object that encodes the topics of different
-    regions in the embedding map across scales.
+def load_coordinates(path: str, dtype: str = "float32") -> np.ndarray:
+    """Memory-map a file of 2D coordinates.
 
     Args:
-        xs ([float]): A list of x coordinates of projected points
-        ys ([float]): A list of y coordinates of projected points
-        texts ([str]): A list of documents associated with points
-        max_zoom_scale (float): The maximal zoom scale (default to zoom x 30)
-        svg_width (float): The approximate size of the wizmap window
-        svg_height (float): The approximate size of the wizmap window
-        stop_words (list[str] | Literal["english"]): Stop words for the count vectorizer.
+        path (str): Path to a .npy file of a (n, 2) array, or a raw binary file
+            of interleaved x and y values
+        dtype (str, optional): Data type of a raw binary file. Defaults to
+            "float32".
 
     Returns:
-        dict: A dictionary object encodes the contour plot.
+        np.ndarray: A (n, 2) memory-mapped array
     """
-    data = []
+    if path.endswith(".npy"):
+        coordinates = np.load(path, mmap_mode="r")
+    else:
+        coordinates = np.memmap(path, dtype=dtype, mode="r").reshape(-1, 2)
 
-    # Create data array
-    for i, x in enumerate(xs):
-        cur_data = {
-            "x": x,
-            "y": ys[i],
-            "pid": i,
-        }
-        data.append(cur_data)
+    if coordinates.ndim != 2 or coordinates.shape[1] != 2:
+        raise ValueError("Coordinates must be a (n, 2) array.")
 
-    # Build the quadtree
-    tree = Quadtree()
-    tree.add_all_data(data)
+    return coordinates
 
-    # Build the count matrix
-    root = tree.get_node_representation()
 
-    cv = CountVectorizer(stop_words=stop_words, ngram_range=(1, 1))
-    count_mat = cv.fit_transform(texts)
-    ngrams = cv.get_feature_names_out()
+def build_from_files(
+    coordinates_path: str,
+    texts_path: str,
+    output_dir: str = "./",
+    embedding_name: str = "My Embedding",
+    text_column: str | None = None,
+    labels_path: str | None = None,
+    times_path: str | None = None,
+    coordinates_dtype: str = "float32",
+    data_format: Literal["ndjson", "binary"] = "ndjson",
+    **grid_kwargs,
+) -> dict:
+    """Build the grid and data files from on-disk arrays without loading the
+    corpus into Python objects. Coordinates, labels, and times are
+    memory-mapped, and texts are streamed from disk in every stage. For large
+    corpora, count_backend="hashing" also bounds the memory of topic
+    extraction.
 
-    xs = [d["x"] for d in data]
-    ys = [d["y"] for d in data]
-    x_domain = [np.min(xs), np.max(xs)]
-    y_domain = [np.min(ys), np.max(ys)]
+    Args:
+        coordinates_path (str): Path to a .npy or raw binary file of (n, 2)
+            coordinates (see load_coordinates())
+        texts_path (str): Path to a newline-delimited text file, or a Parquet
+            file if text_column is given
+        output_dir (str, optional): Folder to save the grid and data files.
+            Defaults to "./".
+        embedding_name (str, optional): Name of the embedding. Defaults to
+            "My Embedding".
+        text_column (str | None, optional): Name of the text column in a
+            Parquet file. Defaults to None.
+        labels_path (str | None, optional): Path to a .npy file of integer
+            labels. Defaults to None.
+        times_path (str | None, optional): Path to a .npy file of time strings.
+            Defaults to None.
+        coordinates_dtype (str, optional): Data type of a raw coordinate file.
+            Defaults to "float32".
+        data_format ("ndjson" | "binary", optional): Format of the data file
+            (see save_json_files()). Defaults to "ndjson".
+        **grid_kwargs: Other arguments for generate_grid_dict(), e.g.,
+            group_names, density_engine, or count_backend
 
-    # Get suggestions of quadtree levels to extract
-    min_level, max_level = select_topic_levels(
-        max_zoom_scale,
-        svg_width,
-        svg_height,
-        x_domain,
-        y_domain,
-        tree.extent(),
-        ideal_tile_width,
-    )
+    Returns:
+        dict: The grid dictionary
+    """
+    coordinates = load_coordinates(coordinates_path, coordinates_dtype)
+    xs, ys = coordinates[:, 0], coordinates[:, 1]
 
-    # Generate topics
-    level_tile_topics = extract_level_topics(
-        root, count_mat, texts, ngrams, min_level=min_level, max_level=max_level
-    )
+    if text_column is not None:
+        texts = ParquetTextColumn(texts_path, text_column)
+    else:
+        texts = LineTextFile(texts_path)
 
-    # Create a dictionary to store the topics at different scale levels
-    data_dict = {
-        "extent": tree.extent(),
-        "data": {},
-        "range": [
-            float(x_domain[0]),
-            float(y_domain[0]),
-            float(x_domain[1]),
-            float(y_domain[1]),
-        ],
-    }
+    if len(texts) != len(xs):
+        raise IndexError("Number of texts must be the same as number of points.")
 
-    for cur_level in range(min_level, max_level + 1):
-        cur_topics = level_tile_topics[cur_level]
-        data_dict["data"][cur_level] = []
+    labels = None
+    if labels_path is not None:
+        labels = np.load(labels_path, mmap_mode="r")
 
-        for topic in cur_topics:
-            # Get the topic name
-            name = "-".join([p[0] for p in topic["w"][:4]])
-            x = (topic["p"][0] + topic["p"][2]) / 2
-            y = (topic["p"][1] + topic["p"][3]) / 2
-            cur_data = {"x": round(x, 3), "y": round(y, 3), "n": name, "l": cur_level}
-            data_dict["data"][cur_level].append([round(x, 3), round(y, 3), name])
+    times = None
+    if times_path is not None:
+        times = np.load(times_path, mmap_mode="r")
 
-    return data_dict
+    grid_dict = generate_grid_dict(
+        xs,
+        ys,
+        texts,
+        embedding_name,
+        labels=labels,
+        times=times,
+        **grid_kwargs,
+    )
+
+    search_texts = None
+    json_point_content_config = grid_kwargs.get("json_point_content_config")
+    if json_point_content_config is not None:
+        search_texts = get_json_point_texts(
+            texts,
+            json_point_content_config["textKey"],
+            labels,
+            json_point_content_config.get("groupLabels"),
+        )
 
+    print("Start saving data files...")
+    save_json_files(
+        iter_data_rows(xs, ys, texts, times, labels, search_texts),
+        grid_dict,
+        output_dir=output_dir,
+        data_format=data_format,
+    )
 
-def generate_grid_dict(
-    xs: list[float],
-    ys: list[float],
-    texts: list[str],
+    return grid_dict
+
+
+def build_grid_state(
+    xs: list[float] | np.ndarray,
+    ys: list[float] | np.ndarray,
+    texts: list[str] | np.ndarray,
+    state_dir: str,
+    output_dir: str | None = None,
     embedding_name="My Embedding",
+    x_domain: Tuple[float, float] | None = None,
+    y_domain: Tuple[float, float] | None = None,
     grid_size=200,
     max_sample=100000,
-    random_seed=202355,
     max_zoom_scale=30,
     svg_width=1000,
     svg_height=1000,
     ideal_tile_width=35,
-    labels: list[int] | None = None,
+    labels: list[int] | np.ndarray | None = None,
     group_names: list[str] | None = None,
-    times: list[str] | None = None,
+    times: list[str] | np.ndarray | None = None,
     time_format: str | None = None,
-    image_label: int | None = None,
-    image_url_prefix: str | None = None,
     opacity: float | None = None,
     stop_words: list[str] | Literal["english"] = "english",
-    json_point_content_config: JsonPointContentConfig | None = None,
-):
-    """Generate a grid dictionary object that encodes the contour plot and the
-    associated topics of different regions on the projected embedding space.
+    count_backend: Literal["count", "hashing"] = "count",
+    n_features: int = 2**20,
+    batch_size: int = 10000,
+    ngram_range: Tuple[int, int] = (1, 1),
+    n_jobs: int | None = 1,
+    grid_encoding: Literal["json", "float16", "uint8", "uint16"] = "json",
+    topic_encoding: Literal["json", "compact"] = "json",
+    topic_scores: bool = False,
+    serializer: Literal["auto", "orjson", "json"] = "json",
+) -> dict:
+    """Generate a grid dictionary and save the builder state, so that new points
+    can be added later with append_grid_points() at a cost that scales with
+    the new points. The contours use the "binned" density engine.
+
+    New points must fall inside the map's domain. Set x_domain and y_domain
+    larger than the current points to leave room for growth; otherwise, points
+    outside the domain require a new build.
 
     Args:
         xs ([float]): A list of x coordinates of projected points
         ys ([float]): A list of y coordinates of projected points
         texts ([str]): A list of documents associated with points
-        embeddingName (str): Custom name of this embedding map
+        state_dir (str): Directory to save the builder state
+        output_dir (str | None, optional): Folder to save the data and grid
+            files. Defaults to None (not saving files).
+        embedding_name (str): Custom name of this embedding map
+        x_domain ((float, float) | None, optional): [x min, x max] of the map.
+            Defaults to the range of xs.
+        y_domain ((float, float) | None, optional): [y min, y max] of the map.
+            Defaults to the range of ys.
         grid_size (int, optional): The resolution of the grid. Defaults to 200
-        max_sample (int, optional): Max number of samples to compute KDE from.
-            Defaults to 100000
-        random_seed (int, optional): Seed for the random state. Defaults to 202355
+        max_sample (int, optional): Cap of the number of points used in
+            Silverman's rule. Defaults to 100000
         max_zoom_scale (float): The maximal zoom scale (default to zoom x 30)
         svg_width (float): The approximate size of the wizmap window
         svg_height (float): The approximate size of the wizmap window
@@ -677,144 +3897,307 @@ def generate_grid_dict(
         labels ([int]): A list of category labels of projected points. Labels
             must be consecutive integers starting from 0. Defaults to None.
         group_names ([str]): Category names associated with the given labels.
-            For example, the group name of label i is group_names[i]. Defaults
-            to None.
+            Defaults to None.
         times ([str]): A list of times associated with data points. Defaults to None.
         time_format (str): strptime format string to parse the time string in times
-        image_label (int): The label corresponds to an image point
-        image_url_prefix (str): The url prefix for all image texts
-        opacity (float): The opacity of data points. If it is None, WizMap will
-            dynamically adjust the opacity values. Defaults to None.
-        stop_words (list[str] | Literal["english"]): A set of stop words to filter out when generating topics.
-        json_point_content_config (JsonPointContentConfig | None): Config for json point.
-            A json point can include both image and text, etc.
+        opacity (float): The opacity of data points. Defaults to None.
+        stop_words (list[str] | Literal["english"]): Stop words for the vectorizer.
+        count_backend ("count" | "hashing", optional): How to count words for
+            topics, see build_count_matrix(). Defaults to "count".
+        n_features (int, optional): Number of features for the "hashing"
+            backend. Defaults to 2**20.
+        batch_size (int, optional): Number of texts per batch for the "hashing"
+            backend. Defaults to 10000.
+        ngram_range ((int, int), optional): The lower and upper boundary of the
+            n-grams to count for topics. Defaults to (1, 1).
+        n_jobs (int | None, optional): Number of processes to tokenize texts.
+            -1 means using all CPUs. Defaults to 1.
+        grid_encoding ("json" | "float16" | "uint8" | "uint16", optional): How to
+            store the density grids. Defaults to "json".
+        topic_encoding ("json" | "compact", optional): How to store the topics.
+            Defaults to "json".
+        topic_scores (bool, optional): Whether to store the tf-idf scores of the
+            topic terms in the "compact" encoding. Defaults to False.
+        serializer ("auto" | "orjson" | "json", optional): JSON serializer for
+            the saved files, see get_json_serializer(). Defaults to "json".
 
     Returns:
         dict: A dictionary object encodes the grid data.
     """
-    print("Start generating contours...")
-    contour_dict = generate_contour_dict(
-        xs,
-        ys,
+    xs = _as_float_array(xs)
+    ys = _as_float_array(ys)
+
+    if x_domain is None:
+        x_domain = (float(np.min(xs)), float(np.max(xs)))
+
+    if y_domain is None:
+        y_domain = (float(np.min(ys)), float(np.max(ys)))
+
+    settings = {
+        "embeddingName": embedding_name,
+        "opacity": opacity,
+        "stopWords": stop_words if isinstance(stop_words, str) else list(stop_words),
+        "countBackend": count_backend,
+        "nFeatures": n_features,
+        "batchSize": batch_size,
+        "ngramRange": list(ngram_range),
+        "gridEncoding": grid_encoding,
+        "topicEncoding": topic_encoding,
+        "topicScores": topic_scores,
+        "serializer": serializer,
+    }
+
+    contour_builder = ContourBuilder(
+        x_domain,
+        y_domain,
         grid_size=grid_size,
         max_sample=max_sample,
-        random_seed=random_seed,
-        labels=labels,
         group_names=group_names,
-        times=times,
         time_format=time_format,
     )
-
-    print("Start generating multi-level summaries...")
-    # If the user uses json point, we need to extract the text content first
-    if json_point_content_config is not None:
-        real_texts = [
-            json.loads(d)[json_point_content_config["textKey"]] for d in texts
-        ]
-    else:
-        real_texts = texts
-    topic_dict = generate_topic_dict(
-        xs,
-        ys,
-        real_texts,
+    topic_builder = TopicBuilder(
+        x_domain,
+        y_domain,
         max_zoom_scale=max_zoom_scale,
         svg_width=svg_width,
         svg_height=svg_height,
         ideal_tile_width=ideal_tile_width,
-        stop_words=stop_words,
+        count_backend=count_backend,
     )
 
-    # Add meta data to the final output
-    grid_dict = contour_dict
-    grid_dict["topic"] = topic_dict
-    grid_dict["embeddingName"] = embedding_name
-
-    if opacity is not None:
-        grid_dict["opacity"] = opacity
+    return _update_grid_state(
+        state_dir,
+        settings,
+        contour_builder,
+        topic_builder,
+        xs,
+        ys,
+        texts,
+        labels,
+        times,
+        output_dir,
+        n_jobs=n_jobs,
+        append=False,
+    )
 
-    # Create a config for image points
-    if image_label is not None:
-        image_config: dict[str, int | str | None] = {"imageGroup": image_label}
 
-        if image_url_prefix is not None:
-            image_config["imageURLPrefix"] = image_url_prefix
+def append_grid_points(
+    state_dir: str,
+    xs: list[float] | np.ndarray,
+    ys: list[float] | np.ndarray,
+    texts: list[str] | np.ndarray,
+    labels: list[int] | np.ndarray | None = None,
+    times: list[str] | np.ndarray | None = None,
+    output_dir: str | None = None,
+    n_jobs: int | None = 1,
+) -> dict:
+    """Add new points to a map saved by build_grid_state(). Only the new texts
+    are tokenized. The new points are added to the density histograms, the
+    topics of the tiles with new points are recomputed while the other topics
+    are reused, and the new rows are appended to the data file. The builder
+    state is updated in place.
 
-        grid_dict["image"] = image_config
+    Args:
+        state_dir (str): Directory of the builder state
+        xs ([float]): x coordinates of the new points
+        ys ([float]): y coordinates of the new points
+        texts ([str]): Documents associated with the new points
+        labels ([int]): Category labels of the new points. Required if the map
+            has groups. Defaults to None.
+        times ([str]): Times of the new points. Required if the map has time
+            grids. Defaults to None.
+        output_dir (str | None, optional): Folder of the existing data and grid
+            files. The new rows are appended to data.ndjson, and grid.json is
+            rewritten. Rows left by an earlier call that failed before saving
+            the state are removed first. Defaults to None (not saving files).
+        n_jobs (int | None, optional): Number of processes to tokenize texts.
+            -1 means using all CPUs. Defaults to 1.
 
-    if json_point_content_config is not None:
-        grid_dict["jsonPoint"] = json_point_content_config
+    Returns:
+        dict: A dictionary object encodes the grid data of all points.
+    """
+    version_dir = _get_state_version_dir(state_dir)
+
+    with open(join(version_dir, "settings.json"), "r", encoding="utf8") as fp:
+        settings = json.load(fp)
+
+    contour_builder = ContourBuilder.load(version_dir)
+    topic_builder = TopicBuilder.load(version_dir)
+
+    if contour_builder.group_names is not None and labels is None:
+        raise ValueError("labels are required to add points to a map with groups.")
+
+    if len(contour_builder.time_counts) > 0 and times is None:
+        raise ValueError("times are required to add points to a map with times.")
+
+    return _update_grid_state(
+        state_dir,
+        settings,
+        contour_builder,
+        topic_builder,
+        _as_float_array(xs),
+        _as_float_array(ys),
+        texts,
+        labels,
+        times,
+        output_dir,
+        n_jobs=n_jobs,
+        append=True,
+    )
 
-    return grid_dict
 
+def _update_grid_state(
+    state_dir: str,
+    settings: dict,
+    contour_builder: ContourBuilder,
+    topic_builder: TopicBuilder,
+    xs: np.ndarray,
+    ys: np.ndarray,
+    texts: list[str] | np.ndarray,
+    labels: list[int] | np.ndarray | None,
+    times: list[str] | np.ndarray | None,
+    output_dir: str | None,
+    n_jobs: int | None,
+    append: bool,
+) -> dict:
+    """Add points to the builders, then save the files and the builder state.
+    See build_grid_state() and append_grid_points()."""
+    if labels is not None:
+        labels = _as_array(labels)
 
-def generate_data_list(
-    xs: list[float],
-    ys: list[float],
-    texts: list[str],
-    times: list[str] | None = None,
-    labels: list[int] | None = None,
-) -> list[list]:
-    """Generate a list of data points.
+    if times is not None:
+        times = _as_array(times)
+
+    print("Start updating contours...")
+    contour_builder.partial_fit(xs, ys, labels, times)
+    grid_dict = contour_builder.finalize(settings["gridEncoding"])
+
+    print("Start updating multi-level summaries...")
+    count_mat, ngrams = build_count_matrix(
+        texts,
+        stop_words=settings["stopWords"],
+        count_backend=settings["countBackend"],
+        n_features=settings["nFeatures"],
+        batch_size=settings["batchSize"],
+        ngram_range=tuple(settings["ngramRange"]),
+        n_jobs=n_jobs,
+    )
+    topic_builder.partial_fit(xs, ys, count_mat, ngrams)
+    grid_dict["topic"] = topic_builder.finalize(
+        settings["topicEncoding"], settings["topicScores"]
+    )
+    grid_dict["embeddingName"] = settings["embeddingName"]
 
-    Args:
-        xs (list[float]): A list of x coordinates of projected points
-        ys (list[float]): A list of y coordinates of projected points
-        texts (list[str]): A list of documents associated with points
-        times (list[str], optional): A list of timestamps associated with points.
-            Defaults to [].
-        labels (list[int], optional): A list of category labels associated
-            with points. Defaults to [].
+    if settings["opacity"] is not None:
+        grid_dict["opacity"] = settings["opacity"]
 
-    Returns:
-        list[list]: A list of data points.
-    """
-    print("Start generating data list...")
+    if output_dir is not None:
+        print("Start saving data files...")
+        rows = iter_data_rows(xs, ys, texts, times, labels)
+        serializer = settings["serializer"]
 
-    data_list = []
+        data_path = join(output_dir, "data.ndjson")
 
-    for i, x in enumerate(xs):
-        cur_row = [x, ys[i], texts[i]]
+        if append:
+            # Drop rows of an earlier append that failed before saving the state,
+            # so that retrying it does not duplicate them
+            if settings.get("dataPath") == os.path.realpath(data_path):
+                os.truncate(data_path, settings["dataSize"])
 
-        if times is not None:
-            cur_row.append(times[i])
+            is_empty = os.path.getsize(data_path) == 0
 
-            if labels is not None:
-                cur_row.append(labels[i])
+            # The existing file has no trailing newline
+            with open(data_path, "ab") as fp:
+                for chunk in iter_ndjson_chunks(rows, serializer=serializer):
+                    fp.write(chunk if is_empty else b"\n" + chunk)
+                    is_empty = False
 
+            with open(join(output_dir, "grid.json"), "wb") as fp:
+                fp.write(get_json_serializer(serializer)(grid_dict))
         else:
-            if labels is not None:
-                cur_row.append("")
-                cur_row.append(labels[i])
+            save_json_files(
+                rows, grid_dict, output_dir=output_dir, serializer=serializer
+            )
 
-        data_list.append(cur_row)
+        # Rows after this size are rolled back if the state below is not saved
+        settings["dataPath"] = os.path.realpath(data_path)
+        settings["dataSize"] = os.path.getsize(data_path)
 
-    return data_list
+    # Write a new version of the state, and then switch to it by replacing one
+    # small file, so a failed update always keeps the old state
+    os.makedirs(state_dir, exist_ok=True)
+    old_version_dir = _get_state_version_dir(state_dir)
 
+    # Remove versions of updates that crashed before switching to them
+    for entry in os.scandir(state_dir):
+        if entry.name.startswith("version-") and entry.path != old_version_dir:
+            shutil.rmtree(entry.path, ignore_errors=True)
 
-def save_json_files(
-    data_list: list,
-    grid_dict: dict,
-    output_dir="./",
-    data_json_name="data.ndjson",
-    grid_json_name="grid.json",
-):
-    """Save the dictionary and list as json files.
+    version_dir = tempfile.mkdtemp(prefix="version-", dir=state_dir)
+    is_saved = False
 
-    Args:
-        data_list (list): The data list.
-        grid_dict (dict): The grid dictionary.
-        output_dir (str, optional): Folder to save the two json files.
-            Defaults to './'.
-        data_json_name (str, optional): Filename of the data json file.
-            Defaults to 'data.ndjson'.
-        grid_json_name (str, optional): Filename of the grid json file.
-            Defaults to 'grid.json'.
-    """
-    with open(join(output_dir, data_json_name), "w", encoding="utf8") as fp:
-        ndjson.dump(data_list, fp)
+    try:
+        with open(join(version_dir, "settings.json"), "w", encoding="utf8") as fp:
+            json.dump(settings, fp)
 
-    with open(join(output_dir, grid_json_name), "w", encoding="utf8") as fp:
-        json.dump(grid_dict, fp)
+        contour_builder.save(version_dir)
+        topic_builder.save(version_dir)
+
+        fd, temp_path = tempfile.mkstemp(prefix=".tmp-", dir=state_dir)
+        with os.fdopen(fd, "w", encoding="utf8") as fp:
+            fp.write(os.path.basename(version_dir))
+
+        os.replace(temp_path, join(state_dir, "current"))
+        is_saved = True
+    finally:
+        if not is_saved:
+            shutil.rmtree(version_dir, ignore_errors=True)
+
+    if old_version_dir != state_dir:
+        shutil.rmtree(old_version_dir, ignore_errors=True)
+
+    return grid_dict
+
+
+def _get_state_version_dir(state_dir: str) -> str:
+    """Get the directory of the current version of a builder state. States of
+    older versions keep their files in state_dir."""
+    current_path = join(state_dir, "current")
+
+    if not os.path.isfile(current_path):
+        return state_dir
+
+    with open(current_path, "r", encoding="utf8") as fp:
+        return join(state_dir, fp.read().strip())
+
+
+_HTML_TOP = """<!DOCTYPE html><html lang="en"><head><meta charset="UTF-8" /><meta name="viewport" content="width=device-width, initial-scale=1.0" /><title>WizMap</title><style>html {font-size: 16px;-moz-osx-font-smoothing: grayscale;-webkit-font-smoothing: antialiased;text-rendering: optimizeLegibility;-webkit-text-size-adjust: 100%;-moz-text-size-adjust: 100%;scroll-behavior: smooth;}html, body {position: relative;width: 100%;height: 100%;overscroll-behavior: none;}body {margin: 0px;padding: 0px;box-sizing: border-box;font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Oxygen-Sans, Ubuntu, Cantarell, 'Helvetica Neue', sans-serif;color: hsl(0, 0%, 29%);font-size: 1em;font-weight: 400;line-height: 1.5;}*, ::after, ::before {box-sizing: inherit;}a {color: rgb(0, 100, 200);text-decoration: none;}a:hover {text-decoration: underline;}a:visited {color: rgb(0, 80, 160);}label {display: block;}input, select, textarea {font-family: inherit;font-size: inherit;-webkit-padding: 0 0;padding: 0;margin: 0 0 0 0;box-sizing: border-box;border: 1px solid #ccc;border-radius: 2px;}input:disabled {color: #ccc;}button {all: unset;outline: none;cursor: pointer;}</style>"""
+_HTML_BOTTOM = """</head><body><div id="app"></div></body></html>"""
+
+
+@lru_cache(maxsize=None)
+def _get_bundle_js() -> bytes:
+    """Read the bundled JS file once per process."""
+    # Read local JS file (for development only)
+    # with open("./wizmap.js", "r") as fp:
+    #     js_string = fp.read()
+    # return bytes(js_string, encoding="utf-8")
+
+    return pkgutil.get_data(__name__, "wizmap.js")
+
+
+@lru_cache(maxsize=None)
+def _get_escaped_bundle_html() -> str:
+    """Get the escaped html head with the base64 encoded JS bundle. It is the
+    same for all widgets, so we only encode and escape it once per process."""
+    js_base64 = base64.b64encode(_get_bundle_js()).decode("utf-8")
+
+    return html.escape(
+        _HTML_TOP
+        + """<script defer src='data:text/javascript;base64,{}'></script>""".format(
+            js_base64
+        )
+    )
 
 
 def _make_html(data_url, grid_url):
@@ -832,21 +4215,6 @@ def _make_html(data_url, grid_url):
     Return:
         HTML code with deferred JS code in base64 format
     """
-    # HTML template for WizMap widget
-    html_top = """<!DOCTYPE html><html lang="en"><head><meta charset="UTF-8" /><meta name="viewport" content="width=device-width, initial-scale=1.0" /><title>WizMap</title><style>html {font-size: 16px;-moz-osx-font-smoothing: grayscale;-webkit-font-smoothing: antialiased;text-rendering: optimizeLegibility;-webkit-text-size-adjust: 100%;-moz-text-size-adjust: 100%;scroll-behavior: smooth;}html, body {position: relative;width: 100%;height: 100%;overscroll-behavior: none;}body {margin: 0px;padding: 0px;box-sizing: border-box;font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Oxygen-Sans, Ubuntu, Cantarell, 'Helvetica Neue', sans-serif;color: hsl(0, 0%, 29%);font-size: 1em;font-weight: 400;line-height: 1.5;}*, ::after, ::before {box-sizing: inherit;}a {color: rgb(0, 100, 200);text-decoration: none;}a:hover {text-decoration: underline;}a:visited {color: rgb(0, 80, 160);}label {display: block;}input, select, textarea {font-family: inherit;font-size: inherit;-webkit-padding: 0 0;padding: 0;margin: 0 0 0 0;box-sizing: border-box;border: 1px solid #ccc;border-radius: 2px;}input:disabled {color: #ccc;}button {all: unset;outline: none;cursor: pointer;}</style>"""
-    html_bottom = """</head><body><div id="app"></div></body></html>"""
-
-    # Read the bundled JS file
-    js_b = pkgutil.get_data(__name__, "wizmap.js")
-
-    # Read local JS file (for development only)
-    # with open("./wizmap.js", "r") as fp:
-    #     js_string = fp.read()
-    # js_b = bytes(js_string, encoding="utf-8")
-
-    # Encode the JS & CSS with base 64
-    js_base64 = base64.b64encode(js_b).decode("utf-8")
-
     # Pass data into JS by using another script to dispatch an event
     messenger_js = f"""
         (function() {{
@@ -859,42 +4227,168 @@ def _make_html(data_url, grid_url):
     messenger_js = messenger_js.encode()
     messenger_js_base64 = base64.b64encode(messenger_js).decode("utf-8")
 
-    # Inject the JS to the html template
-    html_str = (
-        html_top
-        + """<script defer src='data:text/javascript;base64,{}'></script>""".format(
-            js_base64
-        )
-        + """<script defer src='data:text/javascript;base64,{}'></script>""".format(
+    # Inject the JS to the html template. html.escape() works character by
+    # character, so we can escape the cached bundle and the rest separately.
+    html_str = html.escape(
+        """<script defer src='data:text/javascript;base64,{}'></script>""".format(
             messenger_js_base64
         )
-        + html_bottom
+        + _HTML_BOTTOM
+    )
+
+    return _get_escaped_bundle_html() + html_str
+
+
+def _get_bundle_page_url() -> str:
+    """Serve WizMap's page and JS bundle from the local server, and return the
+    URL of the page. The page reads the data and grid URLs from its query."""
+    server = get_server()
+
+    if "/wizmap.html" not in server.routes:
+        messenger_js = """
+            (function() {
+                const params = new URLSearchParams(window.location.search);
+                const event = new Event('wizmapData');
+                event.dataURL = params.get('data');
+                event.gridURL = params.get('grid');
+                document.dispatchEvent(event);
+            }())
+        """
+        page = (
+            _HTML_TOP
+            + """<script defer src='/wizmap.js'></script>"""
+            + """<script defer src='/wizmap-messenger.js'></script>"""
+            + _HTML_BOTTOM
+        )
+
+        server.add_route("/wizmap.js", _get_bundle_js(), "text/javascript")
+        server.add_route(
+            "/wizmap-messenger.js", messenger_js.encode(), "text/javascript"
+        )
+        server.add_route("/wizmap.html", page.encode(), "text/html; charset=utf-8")
+
+    return server.url + "/wizmap.html"
+
+
+# The local server keeps the data of the latest in-memory maps, and the routes
+# of older maps are removed to release their memory
+MAX_MEMORY_MAPS = 8
+_memory_map_paths: deque = deque()
+
+
+def _get_memory_urls(
+    data_list: Iterable | Callable[[], Iterable],
+    grid_dict: dict,
+    serializer: Literal["auto", "orjson", "json"] = "json",
+) -> Tuple[str, str]:
+    """Serve an in-memory data list and grid dictionary from the local server
+    without writing files, and return their URLs. The grid dictionary is
+    serialized once, and the data rows are serialized in chunks while they are
+    streamed to the browser.
+
+    Args:
+        data_list (Iterable | Callable[[], Iterable]): Data rows from
+            generate_data_list(), or a function without arguments that returns
+            the rows, e.g., lambda: iter_data_rows(xs, ys, texts). The function
+            is called on every request, so rows are generated while they are
+            streamed. One-shot iterators (e.g., generators) are not supported.
+        grid_dict (dict): The grid dictionary
+        serializer ("auto" | "orjson" | "json", optional): JSON serializer, see
+            get_json_serializer(). Defaults to "json".
+
+    Returns:
+        str: URL of the data
+        str: URL of the grid
+    """
+    # Each request streams the data again, which would be empty for a generator
+    if callable(data_list):
+        get_rows = data_list
+    elif iter(data_list) is data_list:
+        raise ValueError(
+            "A one-shot iterator cannot be served more than once. Pass a list of "
+            "rows, or a function that returns the rows, e.g., "
+            "lambda: iter_data_rows(xs, ys, texts)."
+        )
+    else:
+
+        def get_rows():
+            return data_list
+
+    server = get_server()
+    # A random prefix, so other pages cannot guess the URLs
+    prefix = f"/memory/{secrets.token_hex(16)}"
+
+    while len(_memory_map_paths) >= MAX_MEMORY_MAPS:
+        for path in _memory_map_paths.popleft():
+            server.remove_route(path)
+
+    grid_url = server.add_route(
+        f"{prefix}/grid.json",
+        get_json_serializer(serializer)(grid_dict),
+        "application/json",
+    )
+    data_url = server.add_route(
+        f"{prefix}/data.ndjson",
+        lambda: iter_ndjson_chunks(get_rows(), serializer=serializer),
+        "application/x-ndjson",
     )
+    _memory_map_paths.append([f"{prefix}/grid.json", f"{prefix}/data.ndjson"])
 
-    return html.escape(html_str)
+    return data_url, grid_url
 
 
-def visualize(data_url, grid_url, height=700):
+def visualize(
+    data_url: str | Iterable | Callable[[], Iterable],
+    grid_url: str | dict,
+    height=700,
+    bundle_mode: Literal["inline", "server"] = "inline",
+):
     """
     Render WizMap in the output cell.
 
     Args:
-        data_url(str): URL to the data json file
-        grid_url(str): URL to the grid json file
+        data_url(str | Iterable | Callable[[], Iterable]): URL to the data json
+            file, in-memory data rows from generate_data_list(), or a function
+            that returns the rows, e.g., lambda: iter_data_rows(xs, ys, texts)
+        grid_url(str | dict): URL to the grid json file, or an in-memory grid
+            dictionary from generate_grid_dict(). In-memory data are streamed
+            from a local server without writing files, so the browser must be
+            able to reach the kernel's localhost. With the "inline" bundle, the
+            notebook's origin must also be allowed by the server, see
+            get_notebook_origins().
         width(int): Width of the main visualization window
         height(int): Height of the whole window
+        bundle_mode("inline" | "server"): "inline" embeds the JS bundle in the
+            iframe, so the notebook works offline and after being shared.
+            "server" serves the bundle once from a local server, and each call
+            only renders a small iframe that links to it. The browser must be
+            able to reach the kernel's localhost. Defaults to "inline".
 
     Return:
         HTML code with deferred JS code in base64 format
     """
-    html_str = _make_html(data_url, grid_url)
+    if not isinstance(data_url, str) or not isinstance(grid_url, str):
+        if isinstance(data_url, str) or isinstance(grid_url, str):
+            raise ValueError("data_url and grid_url must be both URLs or both data.")
+
+        data_url, grid_url = _get_memory_urls(data_url, grid_url)
 
     # Randomly generate an ID for the iframe to avoid collision
     iframe_id = "wizmap-iframe-" + str(int(random.random() * 1e8))
 
+    if bundle_mode == "inline":
+        html_str = _make_html(data_url, grid_url)
+        iframe_source = f'srcdoc="{html_str}"'
+    elif bundle_mode == "server":
+        page_url = _get_bundle_page_url()
+        query = urlencode({"data": data_url, "grid": grid_url})
+        iframe_source = f'src="{html.escape(page_url + "?" + query)}"'
+    else:
+        raise ValueError(f"Unknown bundle mode: {bundle_mode}")
+
     iframe = f"""
         <iframe
-            srcdoc="{html_str}"
+            {iframe_source}
             frameBorder="0"
             width="100%"
             height="{height}px"
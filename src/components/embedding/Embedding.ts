@@ -34,6 +34,8 @@ import type {
 } from '../../types/embedding-types';
 import d3 from '../../utils/d3-import';
 import {
+  decodeGrid,
+  decodeTopicData,
   downloadJSON,
   parseJSONTransform,
   rectsIntersect,
@@ -542,6 +544,18 @@ export class Embedding {
     if (gridData === undefined) {
       throw Error('Fail to load grid data.');
     }
+
+    // Decode grids and topics that are stored as compact binary values
+    gridData.grid = decodeGrid(gridData.grid);
+    for (const grids of [gridData.timeGrids, gridData.groupGrids]) {
+      if (grids !== undefined) {
+        for (const key of Object.keys(grids)) {
+          grids[key] = decodeGrid(grids[key]);
+        }
+      }
+    }
+    gridData.topic = decodeTopicData(gridData.topic);
+
     this.gridData = gridData;
 
     // Initialize the data scales
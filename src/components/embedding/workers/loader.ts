@@ -13,6 +13,7 @@ import { config } from '../../../config/config';
 
 const DEBUG = config.debug;
 const POINT_THRESHOLD = 5000;
+const POINT_BINARY_MAGIC = 'WZMB';
 
 let pendingDataPoints: PromptPoint[] = [];
 let loadedPointCount = 0;
@@ -32,7 +33,12 @@ self.onmessage = (e: MessageEvent<LoaderWorkerMessage>) => {
       timeit('Stream data', true);
 
       const url = e.data.payload.url;
-      startLoadData(url);
+      // Detect the binary format by the file extension (ignoring the query)
+      if (url.split(/[?#]/)[0].endsWith('.bin')) {
+        startLoadBinaryData(url);
+      } else {
+        startLoadData(url);
+      }
       break;
     }
 
@@ -83,6 +89,73 @@ const startLoadData = (url: string) => {
   });
 };
 
+/**
+ * Load the UMAP data in the columnar binary format (see write_point_binary()
+ * in the Python package)
+ * @param url URL to the binary file
+ */
+const startLoadBinaryData = (url: string) => {
+  fetch(url).then(async response => {
+    if (!response.ok) {
+      console.error('Failed to load data', response);
+      return;
+    }
+
+    const buffer = await response.arrayBuffer();
+    const view = new DataView(buffer);
+    const textDecoder = new TextDecoder();
+
+    const magic = textDecoder.decode(new Uint8Array(buffer, 0, 4));
+    if (magic !== POINT_BINARY_MAGIC) {
+      console.error('Unknown binary data format', magic);
+      return;
+    }
+
+    const headerSize = view.getUint32(4, true);
+    const header = JSON.parse(
+      textDecoder.decode(new Uint8Array(buffer, 8, headerSize))
+    ) as { count: number; fieldNum: number; times: string[] };
+    const count = header.count;
+
+    // Sections follow the header in the order of x, y, time, label, texts, and
+    // the text offsets are at the end of the file
+    const xOffset = 8 + headerSize;
+    const yOffset = xOffset + count * 4;
+    const timeOffset = yOffset + count * 4;
+    const labelOffset = timeOffset + (header.fieldNum > 3 ? count * 4 : 0);
+    const textOffset = labelOffset + (header.fieldNum > 4 ? count * 4 : 0);
+    const textIndexOffset = buffer.byteLength - (count + 1) * 8;
+
+    for (let i = 0; i < count; i++) {
+      const textStart = Number(view.getBigUint64(textIndexOffset + i * 8, true));
+      const textEnd = Number(
+        view.getBigUint64(textIndexOffset + (i + 1) * 8, true)
+      );
+
+      const point: UMAPPointStreamData = [
+        view.getFloat32(xOffset + i * 4, true),
+        view.getFloat32(yOffset + i * 4, true),
+        textDecoder.decode(
+          new Uint8Array(buffer, textOffset + textStart, textEnd - textStart)
+        )
+      ];
+
+      if (header.fieldNum > 3) {
+        point.push(header.times[view.getUint32(timeOffset + i * 4, true)]);
+      }
+
+      if (header.fieldNum > 4) {
+        point.push(view.getInt32(labelOffset + i * 4, true));
+      }
+
+      processPointStream(point);
+    }
+
+    timeit('Stream data', DEBUG);
+    pointStreamFinished();
+  });
+};
+
 /**
  * Process one data point
  * @param point Loaded data point
@@ -99,10 +172,14 @@ const processPointStream = (point: UMAPPointStreamData) => {
     promptPoint.time = point[3]!;
   }
 
-  if (point.length > 4) {
+  if (point.length > 4 && point[4] !== null) {
     promptPoint.groupID = point[4]!;
   }
 
+  if (point.length > 5) {
+    promptPoint.searchText = point[5]!;
+  }
+
   pendingDataPoints.push(promptPoint);
   loadedPointCount += 1;
 
@@ -46,7 +46,10 @@ self.onmessage = (e: MessageEvent<SearchWorkerMessage>) => {
 const addPoints = (points: PromptPoint[], textKey: string | null) => {
   for (const point of points) {
     let prompt = point.prompt;
-    if (textKey !== null) {
+    if (point.searchText !== undefined) {
+      // The text of json points can be extracted when the data is generated
+      prompt = point.searchText;
+    } else if (textKey !== null) {
       try {
         const jsonData = JSON.parse(point.prompt) as Record<string, string>;
         prompt = jsonData[textKey];
@@ -61,7 +61,9 @@ export class SearchPanel {
       if (result.includes('<script')) continue;
 
       // Parse json if needed
-      if (this.searchBarStoreValue.textKey) {
+      if (resultPoint.searchText !== undefined) {
+        result = resultPoint.searchText;
+      } else if (this.searchBarStoreValue.textKey) {
         try {
           const jsonData = JSON.parse(result) as Record<string, string>;
           result = jsonData[this.searchBarStoreValue.textKey];
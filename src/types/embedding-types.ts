@@ -185,7 +185,8 @@ export enum Direction {
 export type UMAPPointStreamData =
   | [number, number, string]
   | [number, number, string, string]
-  | [number, number, string, string, number];
+  | [number, number, string, string, number]
+  | [number, number, string, string, number | null, string];
 
 export interface LevelTileMap {
   [level: string]: LevelTileDataItem[];
@@ -225,11 +226,27 @@ export interface QuadtreeNode {
   y1: number;
 }
 
-interface TopicDataJSON {
+export interface TopicDataJSON {
   extent: [[number, number], [number, number]];
   data: TopicDataMap;
 }
 
+/**
+ * Topics stored with a shared term table and base64 typed arrays for each
+ * level (see encode_topic_levels() in the Python package). Term indices start
+ * from 1, and 0 means no term.
+ */
+export interface CompactTopicDataJSON {
+  extent: [[number, number], [number, number]];
+  encoding: 'compact';
+  terms: string[];
+  termNum: number;
+  termType: 'uint16' | 'uint32';
+  data: {
+    [level: string]: { x: string; y: string; t: string; s?: string };
+  };
+}
+
 interface TopicDataMap {
   [level: string]: TopicData[];
 }
@@ -239,6 +256,18 @@ interface TopicDataMap {
  */
 export type TopicData = [number, number, string];
 
+/**
+ * A density grid stored as base64 binary values (see encode_grid() in the
+ * Python package). The original value is offset + scale * value.
+ */
+export interface EncodedGrid {
+  encoding: 'float16' | 'uint8' | 'uint16';
+  shape: [number, number];
+  scale: number;
+  offset: number;
+  data: string;
+}
+
 export interface GridData {
   grid: number[][];
   xRange: [number, number];
@@ -269,6 +298,8 @@ export interface PromptPoint extends Point {
   id: number;
   time?: string;
   groupID?: number;
+  // Pre-extracted text of a json point for the search index
+  searchText?: string;
 }
 
 export interface HighlightedPromptPoint extends PromptPoint {
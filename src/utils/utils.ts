@@ -2,6 +2,12 @@
 // License: MIT
 
 import d3 from './d3-import';
+import type {
+  CompactTopicDataJSON,
+  EncodedGrid,
+  TopicData,
+  TopicDataJSON
+} from '../types/embedding-types';
 
 // import type { SvelteComponent } from 'svelte';
 
@@ -231,6 +237,136 @@ export const parseJSONTransform = () => {
   return transform;
 };
 
+/**
+ * Convert a half-precision float to a number
+ * @param bits 16-bit representation of the float
+ * @returns number
+ */
+const float16ToNumber = (bits: number) => {
+  const sign = bits & 0x8000 ? -1 : 1;
+  const exponent = (bits >> 10) & 0x1f;
+  const fraction = bits & 0x3ff;
+
+  if (exponent === 0) {
+    return sign * 2 ** -14 * (fraction / 1024);
+  }
+
+  if (exponent === 0x1f) {
+    return fraction ? NaN : sign * Infinity;
+  }
+
+  return sign * 2 ** (exponent - 15) * (1 + fraction / 1024);
+};
+
+/**
+ * Convert a base64 string to bytes.
+ * @param data Base64 string
+ * @returns Decoded bytes
+ */
+const base64ToBytes = (data: string) => {
+  const binaryString = atob(data);
+  const bytes = new Uint8Array(binaryString.length);
+  for (let i = 0; i < binaryString.length; i++) {
+    bytes[i] = binaryString.charCodeAt(i);
+  }
+  return bytes;
+};
+
+/**
+ * Decode a density grid from grid.json. Grids can be either nested arrays or
+ * base64 encoded binary values.
+ * @param grid Density grid in grid.json
+ * @returns 2D density grid
+ */
+export const decodeGrid = (grid: number[][] | EncodedGrid): number[][] => {
+  if (Array.isArray(grid)) {
+    return grid;
+  }
+
+  // The Python package writes values in little-endian order
+  const view = new DataView(base64ToBytes(grid.data).buffer);
+  const [rowNum, colNum] = grid.shape;
+  const decodedGrid: number[][] = [];
+
+  for (let r = 0; r < rowNum; r++) {
+    const row: number[] = new Array<number>(colNum);
+    for (let c = 0; c < colNum; c++) {
+      const i = r * colNum + c;
+      let value: number;
+
+      switch (grid.encoding) {
+        case 'float16': {
+          value = float16ToNumber(view.getUint16(i * 2, true));
+          break;
+        }
+        case 'uint16': {
+          value = view.getUint16(i * 2, true);
+          break;
+        }
+        default: {
+          value = view.getUint8(i);
+          break;
+        }
+      }
+
+      row[c] = grid.offset + grid.scale * value;
+    }
+    decodedGrid.push(row);
+  }
+
+  return decodedGrid;
+};
+
+/**
+ * Decode the topics from grid.json into [x, y, label] entries. Topics can be
+ * either nested arrays or a compact term table with base64 typed arrays.
+ * @param topic Topic data in grid.json
+ * @returns Topic data with [x, y, label] entries at each level
+ */
+export const decodeTopicData = (
+  topic: TopicDataJSON | CompactTopicDataJSON
+): TopicDataJSON => {
+  if (!('encoding' in topic) || topic.encoding !== 'compact') {
+    return topic as TopicDataJSON;
+  }
+
+  // Index 0 is the empty term
+  const terms = ['', ...topic.terms];
+  const termSize = topic.termType === 'uint16' ? 2 : 4;
+  const decodedTopic: TopicDataJSON = { extent: topic.extent, data: {} };
+
+  for (const level of Object.keys(topic.data)) {
+    const levelData = topic.data[level];
+    const xView = new DataView(base64ToBytes(levelData.x).buffer);
+    const yView = new DataView(base64ToBytes(levelData.y).buffer);
+    const termView = new DataView(base64ToBytes(levelData.t).buffer);
+    const tileNum = xView.byteLength / 4;
+    const topics: TopicData[] = new Array<TopicData>(tileNum);
+
+    for (let i = 0; i < tileNum; i++) {
+      const words: string[] = [];
+      for (let j = 0; j < topic.termNum; j++) {
+        const offset = (i * topic.termNum + j) * termSize;
+        const termIndex =
+          termSize === 2
+            ? termView.getUint16(offset, true)
+            : termView.getUint32(offset, true);
+        words.push(terms[termIndex]);
+      }
+
+      topics[i] = [
+        round(xView.getFloat32(i * 4, true), 3),
+        round(yView.getFloat32(i * 4, true), 3),
+        words.join('-')
+      ];
+    }
+
+    decodedTopic.data[level] = topics;
+  }
+
+  return decodedTopic;
+};
+
 const timeitQueue = new Set();
 /**
  * Trace the execution time